@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Load-testing benchmark for the hot Flask API endpoints.
+
+Seeds a database with configurable volumes, then drives the endpoints through
+the Flask test client (in-process, with per-request SQL query counts) and/or a
+real gunicorn server (concurrent HTTP). Reports p50/p95/p99 latency and req/s
+per endpoint and can save/compare JSON baselines.
+
+Examples:
+    # Temp SQLite, small preset, test client only
+    python benchmarks/bench_api.py --preset small --mode client
+
+    # Local Postgres (dedicated database - tables are dropped and re-seeded!)
+    python benchmarks/bench_api.py --database-url postgresql://localhost/lonoy_bench \\
+        --preset large --mode both --output benchmarks/baseline.json
+
+    # Compare against a saved baseline (exit code 1 on regression)
+    python benchmarks/bench_api.py --preset small --compare benchmarks/baseline.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.seed import PRESETS
+
+# (name, method, path, form data)
+ENDPOINTS = [
+    ('tvet_materials', 'GET', '/api/tvet/inventory/materials', None),
+    ('finance_transactions', 'GET', '/api/finance/transactions', None),
+    ('students', 'GET', '/api/students', None),
+    ('login', 'POST', '/auth/login', {'username': 'admin', 'password': 'admin'}),
+]
+
+ADMIN_CREDENTIALS = {'username': 'admin', 'password': 'admin'}
+REQUEST_HEADERS = {'Accept-Encoding': 'gzip, br'}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, query_counts=None, errors=0):
+    """Build the result dict for one endpoint (latencies in seconds)"""
+    ordered = sorted(latencies)
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'req_per_sec': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'queries_per_request': None,
+    }
+    if query_counts:
+        result['queries_per_request'] = round(sum(query_counts) / len(query_counts), 2)
+    return result
+
+
+def print_results(mode, results):
+    print(f"\n[{mode}]")
+    print(f"{'endpoint':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>10}{'errors':>8}")
+    for name, r in results.items():
+        queries = '-' if r['queries_per_request'] is None else r['queries_per_request']
+        print(f"{name:<24}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['req_per_sec']:>10}{queries:>10}{r['errors']:>8}")
+
+
+def prepare_database(volumes, skip_seed):
+    """Create the app against DATABASE_URL and (re)seed it"""
+    from web import create_app
+    from web.models import db, User
+    from benchmarks.seed import seed_all
+
+    app = create_app()
+    # The login endpoint is benchmarked like any other; don't let the throttle reject it
+    app.config['LOGIN_THROTTLE_BACKEND'] = 'off'
+    if skip_seed:
+        return app
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        admin_user = User(name='System Administrator', username='admin', user_type='admin', position='System Administrator')
+        admin_user.set_password(ADMIN_CREDENTIALS['password'])
+        db.session.add(admin_user)
+        db.session.commit()
+        started = time.perf_counter()
+        seed_all(volumes)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    return app
+
+
+def run_test_client(app, requests_per_endpoint, warmup, role):
+    """Drive each endpoint sequentially through the Flask test client"""
+    from sqlalchemy import event
+    from web.models import db
+
+    with app.app_context():
+        engine = db.engine
+
+    query_counter = {'count': 0}
+
+    def count_query(*args):
+        query_counter['count'] += 1
+
+    event.listen(engine, 'before_cursor_execute', count_query)
+    results = {}
+    try:
+        client = app.test_client()
+        client.post('/auth/login', data=ADMIN_CREDENTIALS)
+        client.get(f'/auth/select-role/{role}')
+
+        for name, method, path, data in ENDPOINTS:
+            for _ in range(warmup):
+                client.open(path, method=method, data=data, headers=REQUEST_HEADERS)
+
+            latencies, query_counts, errors = [], [], 0
+            started = time.perf_counter()
+            for _ in range(requests_per_endpoint):
+                query_counter['count'] = 0
+                t0 = time.perf_counter()
+                response = client.open(path, method=method, data=data, headers=REQUEST_HEADERS)
+                latencies.append(time.perf_counter() - t0)
+                query_counts.append(query_counter['count'])
+                if response.status_code >= 400:
+                    errors += 1
+            results[name] = summarize(latencies, time.perf_counter() - started, query_counts, errors)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.25)
+    return False
+
+
+def _http_login(port, role):
+    """Log in over HTTP and return the session cookie with the role selected"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/auth/login', body=urlencode(ADMIN_CREDENTIALS),
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie', '').split(';', 1)[0]
+
+    conn.request('GET', f'/auth/select-role/{role}', headers={'Cookie': cookie})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.getheader('Set-Cookie', cookie).split(';', 1)[0]
+
+
+def run_gunicorn(database_url, requests_per_endpoint, warmup, role, workers, concurrency):
+    """Drive each endpoint concurrently against a real gunicorn server"""
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, LOGIN_THROTTLE_BACKEND='off')
+    server_log = tempfile.TemporaryFile()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'web:create_app()'],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=server_log
+    )
+    try:
+        if not _wait_for_port(port):
+            server_log.seek(0)
+            raise RuntimeError(f"gunicorn did not start: {server_log.read().decode(errors='replace')}")
+
+        cookie = _http_login(port, role)
+        local = threading.local()
+
+        def do_request(method, path, data):
+            conn = getattr(local, 'conn', None)
+            if conn is None:
+                conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            headers = dict(REQUEST_HEADERS, Cookie=cookie)
+            body = None
+            if data is not None:
+                body = urlencode(data)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                local.conn = None
+                ok = False
+            return time.perf_counter() - t0, ok
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name, method, path, data in ENDPOINTS:
+                list(pool.map(lambda _: do_request(method, path, data), range(warmup)))
+                started = time.perf_counter()
+                outcomes = list(pool.map(lambda _: do_request(method, path, data), range(requests_per_endpoint)))
+                elapsed = time.perf_counter() - started
+                latencies = [latency for latency, _ in outcomes]
+                errors = sum(1 for _, ok in outcomes if not ok)
+                results[name] = summarize(latencies, elapsed, errors=errors)
+        return results
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        server_log.close()
+
+
+def compare_with_baseline(current, baseline_path, threshold):
+    """Print per-endpoint deltas against a baseline; return True if any endpoint regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressed = False
+    print(f"\nComparison against {baseline_path} (threshold {threshold:.0%})")
+    for mode, endpoints in current['results'].items():
+        for name, result in endpoints.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            p95_delta = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0
+            rps_delta = (result['req_per_sec'] - previous['req_per_sec']) / previous['req_per_sec'] if previous['req_per_sec'] else 0
+            flag = ''
+            if p95_delta > threshold or rps_delta < -threshold:
+                flag = '  REGRESSION'
+                regressed = True
+            print(f"  [{mode}] {name:<24} p95 {p95_delta:+.1%}  req/s {rps_delta:+.1%}{flag}")
+    return regressed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the Flask API endpoints')
+    parser.add_argument('--database-url', help='Database to benchmark against (default: a temporary SQLite file). '
+                                               'Tables are dropped and re-seeded unless --skip-seed is given.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--materials', type=int, help='Override number of TVET materials')
+    parser.add_argument('--finance', type=int, help='Override number of finance transactions')
+    parser.add_argument('--students', type=int, help='Override number of students')
+    parser.add_argument('--certificates-per-student', type=int, help='Override certificates per student')
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the data already in --database-url')
+    parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='client')
+    parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured warm-up requests per endpoint')
+    parser.add_argument('--role', default='tvet', help='Role selected for the benchmark session')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent HTTP clients in gunicorn mode')
+    parser.add_argument('--output', help='Write results as a JSON baseline to this path')
+    parser.add_argument('--compare', help='Compare results with a saved JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative regression (default 0.2)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    volumes = dict(PRESETS[args.preset])
+    for key in ('materials', 'finance', 'students', 'certificates_per_student'):
+        if getattr(args, key) is not None:
+            volumes[key] = getattr(args, key)
+
+    temp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.mkdtemp(prefix='lonoy_bench_')
+        database_url = f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"
+
+    # config.Config reads DATABASE_URL at import time, so set it before importing the app
+    os.environ['DATABASE_URL'] = database_url
+    os.chdir(REPO_ROOT)
+
+    app = prepare_database(volumes, args.skip_seed)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'database': database_url.split('@')[-1],
+            'volumes': volumes,
+            'requests_per_endpoint': args.requests,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+
+    if args.mode in ('client', 'both'):
+        report['results']['client'] = run_test_client(app, args.requests, args.warmup, args.role)
+        print_results('client', report['results']['client'])
+
+    if args.mode in ('gunicorn', 'both'):
+        report['meta']['gunicorn'] = {'workers': args.workers, 'concurrency': args.concurrency}
+        report['results']['gunicorn'] = run_gunicorn(database_url, args.requests, args.warmup, args.role,
+                                                     args.workers, args.concurrency)
+        print_results('gunicorn', report['results']['gunicorn'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.output}")
+
+    if temp_dir:
+        print(f"Temporary database kept at {database_url}")
+
+    if args.compare and compare_with_baseline(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Seed data generator for the API benchmarks.
+
+Inserts materials, finance transactions, students and certificates in chunked
+executemany batches so that even the large preset (1M finance rows) seeds in a
+reasonable time on SQLite and PostgreSQL.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from web.models import (
+    db, TVETInventoryFolder, TVETCoreCompetency, TVETCategory, TVETInspectionRemark,
+    TVETInventoryMaterial, FinanceTransaction, Student, Certificate
+)
+
+CHUNK_SIZE = 10000
+
+PRESETS = {
+    'small': {'materials': 1000, 'finance': 10000, 'students': 500, 'certificates_per_student': 2},
+    'medium': {'materials': 10000, 'finance': 100000, 'students': 5000, 'certificates_per_student': 2},
+    'large': {'materials': 100000, 'finance': 1000000, 'students': 50000, 'certificates_per_student': 2},
+}
+
+
+def _insert_chunked(model, rows_iter, total):
+    """Insert rows produced by rows_iter in CHUNK_SIZE batches"""
+    chunk = []
+    inserted = 0
+    for row in rows_iter:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(insert(model), chunk)
+            inserted += len(chunk)
+            chunk = []
+            print(f"  {model.__tablename__}: {inserted}/{total}", end='\r')
+    if chunk:
+        db.session.execute(insert(model), chunk)
+        inserted += len(chunk)
+    db.session.commit()
+    print(f"  {model.__tablename__}: {inserted}/{total}")
+
+
+def _seed_lookup(model, names):
+    now = datetime.utcnow()
+    db.session.execute(insert(model), [{'name': name, 'description': '', 'created_at': now} for name in names])
+    db.session.commit()
+    return [row.id for row in db.session.query(model.id).all()]
+
+
+def seed_materials(count, rng):
+    folder_ids = _seed_lookup(TVETInventoryFolder, [f'Qualification {i}' for i in range(1, 21)])
+    competency_ids = _seed_lookup(TVETCoreCompetency, [f'Competency {i}' for i in range(1, 41)])
+    category_ids = _seed_lookup(TVETCategory, ['Tools', 'Equipment', 'Materials', 'Consumables', 'PPE'])
+    remark_ids = _seed_lookup(TVETInspectionRemark, ['Good', 'For repair', 'Condemned'])
+    now = datetime.utcnow()
+
+    def rows():
+        for i in range(count):
+            required = rng.randint(0, 50)
+            yield {
+                'folder_id': rng.choice(folder_ids),
+                'competency_id': rng.choice(competency_ids),
+                'category_id': rng.choice(category_ids),
+                'inspection_remark_id': rng.choice(remark_ids),
+                'item': f'Item {i}',
+                'specification': f'Specification for item {i}',
+                'quantity_required': required,
+                'quantity_on_site': rng.randint(0, 50),
+                'quantity_y1': rng.randint(0, 25),
+                'quantity_y2': rng.randint(0, 25),
+                'created_at': now - timedelta(seconds=count - i),
+                'updated_at': now,
+            }
+
+    _insert_chunked(TVETInventoryMaterial, rows(), count)
+
+
+def seed_finance(count, rng, departments=('TVET', 'LPAF')):
+    start = date.today() - timedelta(days=5 * 365)
+    now = datetime.utcnow()
+
+    def rows():
+        for i in range(count):
+            yield {
+                'date': start + timedelta(days=rng.randint(0, 5 * 365)),
+                'transaction_type': rng.choice(('income', 'expenses')),
+                'source': f'Source {rng.randint(1, 200)}',
+                'description': f'Transaction {i}',
+                'units': rng.randint(1, 10),
+                'amount': round(rng.uniform(10, 50000), 2),
+                'receipt': '',
+                'department': rng.choice(departments),
+                'created_at': now,
+                'updated_at': now,
+            }
+
+    _insert_chunked(FinanceTransaction, rows(), count)
+
+
+def seed_students(count, certificates_per_student, rng):
+    now = datetime.utcnow()
+
+    def student_rows():
+        for i in range(count):
+            yield {
+                'batch': f'BATCH-{2020 + i % 6}-{i // 100:03d}',
+                'name': f'Student {i}',
+                'age': rng.randint(18, 60),
+                'address': f'{i} Main St',
+                'contact_no': f'+63 9{rng.randint(100000000, 999999999)}',
+                'created_at': now,
+                'updated_at': now,
+            }
+
+    _insert_chunked(Student, student_rows(), count)
+    if not certificates_per_student:
+        return
+
+    student_ids = [row.id for row in db.session.query(Student.id).all()]
+    total = len(student_ids) * certificates_per_student
+
+    def certificate_rows():
+        for student_id in student_ids:
+            for n in range(certificates_per_student):
+                filename = f'bench_{student_id}_{n}.pdf'
+                yield {
+                    'student_id': student_id,
+                    'filename': filename,
+                    'original_name': filename,
+                    'file_path': f'web/static/uploads/certificates/{filename}',
+                    'file_size': rng.randint(50000, 2000000),
+                    'mime_type': 'application/pdf',
+                    'upload_date': now,
+                }
+
+    _insert_chunked(Certificate, certificate_rows(), total)
+
+
+def seed_all(volumes, seed=42):
+    """Seed every benchmarked table; volumes is one of PRESETS or a dict with the same keys"""
+    rng = random.Random(seed)
+    print('Seeding benchmark data...')
+    seed_materials(volumes['materials'], rng)
+    seed_finance(volumes['finance'], rng)
+    seed_students(volumes['students'], volumes['certificates_per_student'], rng)
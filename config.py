@@ -9,3 +9,93 @@ class Config:
         os.makedirs('instance', exist_ok=True)
         SQLALCHEMY_DATABASE_URI = 'sqlite:///instance/app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # JSON API responses (see web/utils/responses.py)
+    JSON_COMPRESS_MIN_SIZE = int(os.environ.get('JSON_COMPRESS_MIN_SIZE', 1024))
+    JSON_GZIP_LEVEL = 6
+    JSON_BROTLI_QUALITY = 4
+
+    # Request/query profiling (see web/utils/instrumentation.py)
+    PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', '1') == '1'
+    PERF_WINDOW_SIZE = 500
+    PERF_SLOW_QUERY_COUNT = 5
+
+    # Prometheus-style metrics (see web/utils/metrics.py). Set METRICS_MULTIPROC_DIR
+    # when running several gunicorn workers so /metrics aggregates all of them.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    # /metrics is open to admin sessions and to scrapers sending 'Authorization: Bearer <METRICS_TOKEN>'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Server-side inventory report PDFs (see web/utils/reports.py), cached per data version
+    REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', os.path.abspath(os.path.join('instance', 'reports')))
+    REPORT_PREPARED_BY = os.environ.get('REPORT_PREPARED_BY', 'Add Min')
+    REPORT_APPROVED_BY = os.environ.get('REPORT_APPROVED_BY', 'Jeb Sama')
+
+    # Certificates generated per training batch (see web/utils/certificate_pdf.py), rendered on
+    # CERTIFICATE_WORKERS processes (0: one per CPU) for batches of CERTIFICATE_POOL_MIN or more
+    CERTIFICATE_WORKERS = int(os.environ.get('CERTIFICATE_WORKERS', 0))
+    CERTIFICATE_POOL_MIN = int(os.environ.get('CERTIFICATE_POOL_MIN', 40))
+    CERTIFICATE_SIGNATORY = os.environ.get('CERTIFICATE_SIGNATORY', REPORT_APPROVED_BY)
+    CERTIFICATE_SIGNATORY_POSITION = os.environ.get('CERTIFICATE_SIGNATORY_POSITION', '')
+
+    # Content-addressed upload store (see web/utils/blobstore.py)
+    BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR', os.path.abspath(os.path.join('instance', 'blobs')))
+
+    # Where upload bytes live (see web/utils/storage.py): 'local' (BLOB_STORE_DIR) or 's3'
+    # for any S3-compatible store such as MinIO. The s3 backend requires boto3.
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_S3_BUCKET = os.environ.get('STORAGE_S3_BUCKET')
+    STORAGE_S3_ENDPOINT_URL = os.environ.get('STORAGE_S3_ENDPOINT_URL')
+    STORAGE_S3_ACCESS_KEY = os.environ.get('STORAGE_S3_ACCESS_KEY')
+    STORAGE_S3_SECRET_KEY = os.environ.get('STORAGE_S3_SECRET_KEY')
+    STORAGE_S3_REGION = os.environ.get('STORAGE_S3_REGION')
+    STORAGE_S3_PREFIX = os.environ.get('STORAGE_S3_PREFIX', '')
+    STORAGE_S3_PRESIGN_EXPIRES = int(os.environ.get('STORAGE_S3_PRESIGN_EXPIRES', 3600))
+    STORAGE_S3_PROXY_DOWNLOADS = os.environ.get('STORAGE_S3_PROXY_DOWNLOADS', '0') == '1'
+
+    # Background media work (see web/utils/media_jobs.py and web/utils/transcode.py).
+    # Study videos get faststart MP4 and HLS renditions when ffmpeg is on the PATH.
+    # MEDIA_JOBS_MODE 'thread' runs jobs inside the web process (single process only);
+    # 'worker' leaves them to scripts/media_worker.py, which gunicorn.conf.py starts.
+    MEDIA_JOBS_MODE = os.environ.get('MEDIA_JOBS_MODE', 'thread')
+    MEDIA_POLL_SECONDS = float(os.environ.get('MEDIA_POLL_SECONDS', 5))
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 1))
+    VIDEO_TRANSCODING = os.environ.get('VIDEO_TRANSCODING', '1') == '1'
+    FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+    FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+    TRANSCODE_TIMEOUT = int(os.environ.get('TRANSCODE_TIMEOUT', 6 * 3600))
+    # Work left in progress this long by a process that died is queued again;
+    # a video runs up to three steps of TRANSCODE_TIMEOUT each
+    MEDIA_STALE_SECONDS = int(os.environ.get('MEDIA_STALE_SECONDS', 3 * TRANSCODE_TIMEOUT))
+    # 'best' picks the best-scoring of several sampled frames as a video's poster, 'fixed' the frame at 1s
+    VIDEO_POSTER_SELECTION = os.environ.get('VIDEO_POSTER_SELECTION', 'best')
+
+    # Receipt photos are re-encoded in the background (see web/utils/receipts.py):
+    # downscaled to RECEIPT_MAX_DIMENSION pixels, metadata stripped, as JPEG or WEBP
+    RECEIPT_FORMAT = os.environ.get('RECEIPT_FORMAT', 'JPEG')
+    RECEIPT_MAX_DIMENSION = int(os.environ.get('RECEIPT_MAX_DIMENSION', 2000))
+    RECEIPT_QUALITY = int(os.environ.get('RECEIPT_QUALITY', 85))
+    RECEIPT_PREVIEW_DIMENSION = int(os.environ.get('RECEIPT_PREVIEW_DIMENSION', 480))
+    # Receipts have their own pool, so they are not queued behind long transcodes
+    RECEIPT_WORKERS = int(os.environ.get('RECEIPT_WORKERS', 1))
+
+    # Password hashing policy (see web/utils/passwords.py), in Werkzeug's method syntax:
+    # 'pbkdf2:sha256:<iterations>' or 'scrypt:<n>:<r>:<p>' (parameters left out take
+    # Werkzeug's defaults). A new algorithm or a higher cost rehashes each user's
+    # password at their next successful login; stronger existing hashes are kept.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+
+    # Number of reverse proxies in front of the app (e.g. 1 behind nginx) whose
+    # X-Forwarded-For/-Proto headers are trusted for the client IP and scheme. Leave 0
+    # when clients reach the app directly, or they could pick their own IP address.
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+
+    # Login throttling (see web/utils/throttle.py): token buckets per username and
+    # client IP pair, and per client IP. Backend 'memory' (per process), 'database'
+    # (shared) or 'off'.
+    LOGIN_THROTTLE_BACKEND = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+    LOGIN_THROTTLE_USER_BURST = int(os.environ.get('LOGIN_THROTTLE_USER_BURST', 5))
+    LOGIN_THROTTLE_USER_PER_MINUTE = float(os.environ.get('LOGIN_THROTTLE_USER_PER_MINUTE', 2))
+    LOGIN_THROTTLE_IP_BURST = int(os.environ.get('LOGIN_THROTTLE_IP_BURST', 30))
+    LOGIN_THROTTLE_IP_PER_MINUTE = float(os.environ.get('LOGIN_THROTTLE_IP_PER_MINUTE', 20))
@@ -0,0 +1,146 @@
+"""
+Gunicorn configuration for production.
+
+Usage (from the project root, where gunicorn picks this file up by itself):
+
+    gunicorn                         # general pool
+    GUNICORN_POOL=media gunicorn     # media pool, see below
+
+The app is created once in the master (preload_app), which also runs the
+start-up migrations in create_app() a single time; the workers are forked from
+it and share the loaded code copy-on-write. Each worker then throws away the
+database connections and thread pools it inherited and creates its own.
+
+Workers are recycled after GUNICORN_MAX_REQUESTS requests (with jitter so they
+do not all restart at once), which bounds the memory that OpenCV and Pillow
+tend to hold on to after processing large images and videos.
+
+Two pools: long uploads and video/document downloads hold a worker thread for
+minutes, so they can be given a pool of their own with more threads and a long
+timeout. Run a second instance with GUNICORN_POOL=media and let the reverse
+proxy send the slow paths to it, e.g. for nginx:
+
+    location /uploads/                 { proxy_pass http://127.0.0.1:8001; }
+    location = /api/study/videos       { proxy_pass http://127.0.0.1:8001; }
+    location ~ ^/api/(students|employees)/\\d+/(certificates|documents)$ {
+        proxy_pass http://127.0.0.1:8001;
+    }
+    location /                         { proxy_pass http://127.0.0.1:8000; }
+
+Without the second instance every request goes to the general pool, whose
+thread workers still keep a slow client from blocking a whole process.
+
+Behind the proxy, pass the client address and scheme on and set
+TRUSTED_PROXY_HOPS=1, so that login throttling sees the real client IP:
+
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+
+Background media jobs (transcodes, receipt normalization) do not run in the
+web workers, which are recycled and would cut multi-hour transcodes short.
+The master of the general pool starts scripts/media_worker.py next to its
+workers and stops it on shutdown (MEDIA_JOBS_MODE=worker). Set
+GUNICORN_MEDIA_WORKER=0 to run that script under a process manager instead.
+
+Settings can be overridden with the environment variables read below or with
+the usual command-line flags.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+
+POOL = os.environ.get('GUNICORN_POOL', 'app')
+if POOL not in ('app', 'media'):
+    raise ValueError(f"GUNICORN_POOL must be 'app' or 'media', not {POOL!r}")
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))  # respects container CPU pinning
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = 'app:app'
+# Read by create_app(); must be set before the app is loaded
+os.environ.setdefault('MEDIA_JOBS_MODE', 'worker')
+media_worker = POOL == 'app' and os.environ.get('GUNICORN_MEDIA_WORKER', '1') == '1'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+if POOL == 'app':
+    bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+    workers = _env_int('GUNICORN_WORKERS', os.environ.get('WEB_CONCURRENCY', 2 * _cpu_count() + 1))
+    threads = _env_int('GUNICORN_THREADS', 4)
+    timeout = _env_int('GUNICORN_TIMEOUT', 60)
+    max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+else:
+    bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8001')
+    workers = _env_int('GUNICORN_WORKERS', max(2, _cpu_count() // 2))
+    threads = _env_int('GUNICORN_THREADS', 16)
+    timeout = _env_int('GUNICORN_TIMEOUT', 900)
+    # Fewer requests per worker, but each one may decode a large image or video
+    max_requests = _env_int('GUNICORN_MAX_REQUESTS', 200)
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max(1, max_requests // 10))
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+# Worker heartbeat files; a disk-backed /tmp can stall them and get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+proc_name = f'inventory-{POOL}'
+
+
+_media_worker_process = None
+
+
+def on_starting(server):
+    # Snapshots left by the workers of a previous run would be counted as live
+    multiproc_dir = os.environ.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir and POOL == 'app':
+        from web.utils import metrics
+        metrics.clear_multiproc_dir(multiproc_dir)
+
+
+def when_ready(server):
+    global _media_worker_process
+    if media_worker and os.environ.get('MEDIA_JOBS_MODE') == 'worker':
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'media_worker.py')
+        # Own process group, so stopping it also stops the ffmpeg processes it started
+        _media_worker_process = subprocess.Popen([sys.executable, script], start_new_session=True)
+        server.log.info(f'Started media worker (pid {_media_worker_process.pid})')
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from web.models import db
+
+    app = worker.app.wsgi()  # the app the master preloaded
+    with app.app_context():
+        # Connections opened by the master must not be shared between processes;
+        # close=False leaves them to the master instead of closing them under it
+        db.engine.dispose(close=False)
+    # Thread pools and network clients do not survive fork; each worker makes its own
+    app.extensions.pop('media_executors', None)
+    app.extensions.pop('storage', None)
+
+
+def on_exit(server):
+    if _media_worker_process is None or _media_worker_process.poll() is not None:
+        return
+    # The worker kills its ffmpeg processes and leaves their renditions to be resumed
+    _media_worker_process.terminate()
+    try:
+        _media_worker_process.wait(timeout=graceful_timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(_media_worker_process.pid, signal.SIGKILL)
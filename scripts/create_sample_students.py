@@ -6,6 +6,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from web import create_app, db
 from web.models.student import Student
+from web.utils import student_import
 
 app = create_app()
 
@@ -54,26 +55,24 @@ with app.app_context():
         }
     ]
     
-    try:
-        for student_data in students_data:
-            # Check if student already exists
-            existing = Student.query.filter_by(name=student_data['name']).first()
-            if not existing:
-                student = Student(**student_data)
-                db.session.add(student)
-                print(f"Added student: {student_data['name']}")
-            else:
-                print(f"Student already exists: {student_data['name']}")
-        
-        db.session.commit()
+    # Enrolled through the bulk importer (see scripts/import_students.py for files),
+    # which skips students already in their batch
+    headers, rows = student_import.rows_from_dicts(students_data)
+    report = student_import.import_rows(rows, headers)
+    for row in report['rows']:
+        name = students_data[row['line'] - 1]['name']
+        if row['status'] == 'imported':
+            print(f"Added student: {name}")
+        elif row['status'] == 'duplicate':
+            print(f"Student already exists: {name}")
+        else:
+            print(f"Invalid sample student {name}: {row['message']}")
+    
+    if report['saved'] or not report['invalid']:
         print(f"\nSample students created successfully!")
-        
-        # Verify the data
-        all_students = Student.query.all()
-        print(f"Total students in database: {len(all_students)}")
-        for student in all_students:
-            print(f"- {student.name} (Batch: {student.batch})")
-            
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error creating sample students: {e}")
\ No newline at end of file
+    
+    # Verify the data
+    all_students = Student.query.all()
+    print(f"Total students in database: {len(all_students)}")
+    for student in all_students:
+        print(f"- {student.name} (Batch: {student.batch})")
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Script to generate certificate PDFs for every student of a training batch and
+attach them to the students. Students who already have a certificate with the
+same title are skipped. See web/utils/certificate_pdf.py.
+
+Usage: python scripts/generate_certificates.py BATCH --title TITLE [--date YYYY-MM-DD]
+       [--heading HEADING] [--signatory NAME] [--position POSITION] [--workers N]
+"""
+
+import sys
+import os
+import argparse
+import time
+from datetime import date, datetime
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.models import Student
+from web.utils import certificate_pdf, reports
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate certificates for a training batch')
+    parser.add_argument('batch', help='batch whose students get a certificate')
+    parser.add_argument('--title', required=True, help='course or qualification completed')
+    parser.add_argument('--date', help='date of issue, YYYY-MM-DD (default: today)')
+    parser.add_argument('--heading', default='Certificate of Completion', help='certificate heading')
+    parser.add_argument('--signatory', help='name under the signature line (default: CERTIFICATE_SIGNATORY)')
+    parser.add_argument('--position', help="signatory's position (default: CERTIFICATE_SIGNATORY_POSITION)")
+    parser.add_argument('--workers', type=int, help='render processes (default: CERTIFICATE_WORKERS)')
+    args = parser.parse_args()
+
+    issued_on = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else date.today()
+    if len(args.title) > certificate_pdf.MAX_TITLE_LENGTH:
+        print(f"❌ Title must be at most {certificate_pdf.MAX_TITLE_LENGTH} characters")
+        sys.exit(1)
+
+    app = create_app()
+    with app.app_context():
+        if not Student.query.filter_by(batch=args.batch).first():
+            print(f"❌ No students in batch {args.batch}")
+            sys.exit(1)
+
+        template = certificate_pdf.CertificateTemplate(
+            title=args.title,
+            heading=args.heading,
+            issued_on=issued_on,
+            signatory=args.signatory if args.signatory is not None else app.config.get('CERTIFICATE_SIGNATORY', ''),
+            signatory_position=args.position if args.position is not None else app.config.get('CERTIFICATE_SIGNATORY_POSITION', ''),
+            logo=reports.logo_png(os.path.join(app.static_folder, 'img', 'logo.png'))
+        )
+        started = time.perf_counter()
+        result = certificate_pdf.generate_for_batch(
+            args.batch, template,
+            workers=args.workers or app.config.get('CERTIFICATE_WORKERS') or None,
+            pool_min=app.config.get('CERTIFICATE_POOL_MIN', certificate_pdf.POOL_MIN_STUDENTS)
+        )
+        print(f"✓ Generated {result['generated']} certificate(s) in {time.perf_counter() - started:.1f}s")
+        if result['skipped']:
+            print(f"  {result['skipped']} student(s) already had a certificate titled '{args.title}'")
+
+if __name__ == '__main__':
+    main()
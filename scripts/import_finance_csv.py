@@ -0,0 +1,47 @@
+"""
+Script to import finance transactions from a cashbook or bank CSV export.
+Rows already recorded (same date, type, amount, source and description) are
+skipped, so the same export can be imported again safely. See
+web/utils/finance_import.py for the accepted columns.
+
+Usage: python scripts/import_finance_csv.py FILE --department TVET|LPAF [--source NAME] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.utils import finance_import
+from web.utils.imports import ImportFileError
+
+def main():
+    parser = argparse.ArgumentParser(description='Import finance transactions from CSV')
+    parser.add_argument('file', help='CSV file to import')
+    parser.add_argument('--department', required=True, choices=['TVET', 'LPAF'], type=str.upper)
+    parser.add_argument('--source', help='source for rows without a source column')
+    parser.add_argument('--dry-run', action='store_true', help='validate and report without saving')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        with open(args.file, 'rb') as csv_file:
+            try:
+                report = finance_import.import_transactions(
+                    csv_file, args.department, default_source=args.source, dry_run=args.dry_run
+                )
+            except ImportFileError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+
+        for row in report['rows']:
+            if row['status'] != 'imported':
+                mark = '⚠️ ' if row['status'] == 'invalid' else '-'
+                print(f"  {mark} line {row['line']}: {row['status']} ({row['message']})")
+        verb = 'Would import' if args.dry_run else 'Imported'
+        print(f"✓ {verb} {report['imported']} transaction(s); "
+              f"{report['duplicates']} duplicate(s), {report['invalid']} invalid row(s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Script to enroll students from a CSV or XLSX file (one row per student with
+batch, name, age, address and contact no. columns). Students already enrolled
+in the same batch are skipped. If any row is invalid nothing is saved unless
+--skip-invalid is given. See web/utils/student_import.py.
+
+Usage: python scripts/import_students.py FILE [--batch BATCH] [--skip-invalid] [--dry-run]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.utils import student_import
+from web.utils.imports import ImportFileError
+
+def print_report(report, dry_run=False, skip_invalid=False):
+    for row in report['rows']:
+        if row['status'] in ('invalid', 'duplicate'):
+            mark = '⚠️ ' if row['status'] == 'invalid' else '-'
+            print(f"  {mark} line {row['line']}: {row['message']}")
+    if report['saved']:
+        print(f"✓ Enrolled {report['imported']} student(s)")
+    elif dry_run:
+        print(f"✓ {report['valid']} student(s) can be enrolled")
+    elif report['invalid'] and not skip_invalid:
+        print(f"❌ Nothing saved: {report['invalid']} invalid row(s) (use --skip-invalid to enroll the rest)")
+    else:
+        print("No new students to enroll")
+    if report['duplicates']:
+        print(f"  {report['duplicates']} row(s) already enrolled or repeated")
+
+def main():
+    parser = argparse.ArgumentParser(description='Enroll students from a CSV/XLSX file')
+    parser.add_argument('file', help='CSV or XLSX file to import')
+    parser.add_argument('--batch', help='batch for rows without a batch column')
+    parser.add_argument('--skip-invalid', action='store_true', help='enroll the valid rows even if some are invalid')
+    parser.add_argument('--dry-run', action='store_true', help='validate and report without saving')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        with open(args.file, 'rb') as upload:
+            try:
+                report = student_import.import_students(
+                    upload, args.file, default_batch=args.batch,
+                    skip_invalid=args.skip_invalid, dry_run=args.dry_run
+                )
+            except ImportFileError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+        print_report(report, args.dry_run, args.skip_invalid)
+        if report['invalid'] and not (args.skip_invalid or args.dry_run):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
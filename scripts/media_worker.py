@@ -0,0 +1,27 @@
+"""
+Script that runs background media jobs (video transcodes and previews, receipt
+normalization) outside the web server, for MEDIA_JOBS_MODE=worker. It polls
+the database for unfinished work, so jobs are picked up whichever process
+recorded them, and runs until it receives SIGTERM or Ctrl+C. Run exactly one
+per database; gunicorn.conf.py starts it from the gunicorn master by default.
+See web/utils/media_jobs.py.
+
+Usage: python scripts/media_worker.py
+"""
+
+import sys
+import os
+import logging
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.utils import media_jobs
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [media-worker] %(levelname)s %(message)s')
+    app = create_app()
+    logging.info(f"Media worker started (polling every {app.config.get('MEDIA_POLL_SECONDS', 5)}s)")
+    media_jobs.run_worker(app)
+
+if __name__ == '__main__':
+    main()
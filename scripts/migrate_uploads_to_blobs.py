@@ -0,0 +1,79 @@
+"""
+Script to move existing uploads into the content-addressed blob store.
+Certificates, employee documents, study videos and finance receipts uploaded
+before the blob store existed are hashed, deduplicated and re-pointed at their
+blob. Original files are only removed with --delete-originals.
+
+Usage: python scripts/migrate_uploads_to_blobs.py [--delete-originals]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.models import db, Certificate, EmployeeDocument, StudyVideo, FinanceTransaction
+from web.utils import blobstore
+
+def migrate_rows(label, rows, get_path, attach, delete_originals):
+    """Store each row's file as a blob and point the row at it"""
+    migrated = missing = saved = 0
+    originals = []
+    seen_blobs = set()
+    for row in rows:
+        path = get_path(row)
+        if not path or not os.path.exists(path):
+            missing += 1
+            print(f"  ⚠️  {label} {row.id}: file not found ({path})")
+            continue
+        with open(path, 'rb') as f:
+            blob = blobstore.store(f, mime_type=getattr(row, 'mime_type', None))
+        if blob.id in seen_blobs:
+            saved += blob.size
+        seen_blobs.add(blob.id)
+        attach(row, blob)
+        originals.append(path)
+        migrated += 1
+    db.session.commit()
+
+    if delete_originals:
+        for path in originals:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    print(f"✓ {label}: {migrated} migrated, {missing} missing, {saved} bytes deduplicated")
+
+def attach_file(row, blob):
+    row.blob_id = blob.id
+    row.file_path = blob.storage_key
+
+def main():
+    delete_originals = '--delete-originals' in sys.argv
+    app = create_app()
+
+    with app.app_context():
+        migrate_rows('Certificates', Certificate.query.filter_by(blob_id=None).all(),
+                     lambda row: row.file_path, attach_file, delete_originals)
+        migrate_rows('Employee documents', EmployeeDocument.query.filter_by(blob_id=None).all(),
+                     lambda row: row.file_path, attach_file, delete_originals)
+        migrate_rows('Study videos', StudyVideo.query.filter_by(blob_id=None).all(),
+                     lambda row: row.file_path, attach_file, delete_originals)
+
+        def receipt_path(row):
+            return os.path.join(app.root_path, row.receipt)
+
+        def attach_receipt(row, blob):
+            row.receipt_blob_id = blob.id
+            row.receipt = f"uploads/blobs/{blob.sha256}/{os.path.basename(row.receipt)}"
+
+        receipts = FinanceTransaction.query.filter(
+            FinanceTransaction.receipt_blob_id.is_(None),
+            FinanceTransaction.receipt.like('static/uploads/finance_receipts/%')
+        ).all()
+        migrate_rows('Finance receipts', receipts, receipt_path, attach_receipt, delete_originals)
+
+if __name__ == '__main__':
+    print("Migrating uploads to the blob store...")
+    main()
+    print("\nMigration completed.")
@@ -0,0 +1,50 @@
+"""
+Script to normalize finance receipt images that were uploaded before receipt
+ingest existed (or whose background job was lost when the server stopped):
+downscale, strip metadata and add a preview. See web/utils/receipts.py.
+Receipts that are not in the blob store yet need
+scripts/migrate_uploads_to_blobs.py first.
+
+Usage: python scripts/normalize_receipts.py
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.models import db, Blob, FinanceTransaction
+from web.utils import receipts
+
+def main():
+    app = create_app()
+
+    with app.app_context():
+        todo = [
+            row.id for row in db.session.query(FinanceTransaction.id)
+            .join(Blob, Blob.id == FinanceTransaction.receipt_blob_id)
+            .filter(FinanceTransaction.receipt_preview.is_(None), Blob.mime_type.like('image/%'))
+            .order_by(FinanceTransaction.id)
+        ]
+        print(f"Found {len(todo)} receipt image(s) to normalize")
+
+        for transaction_id in todo:
+            transaction = db.session.get(FinanceTransaction, transaction_id)
+            original_size = db.session.get(Blob, transaction.receipt_blob_id).size
+            try:
+                receipts.ingest_receipt(transaction_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"  ⚠️  Transaction {transaction_id}: {e}")
+                continue
+            db.session.refresh(transaction)
+            if transaction.receipt_preview:
+                new_size = db.session.get(Blob, transaction.receipt_blob_id).size
+                print(f"  ✓ Transaction {transaction_id}: {original_size // 1024} KB -> {new_size // 1024} KB")
+            else:
+                print(f"  ⚠️  Transaction {transaction_id}: not a readable image, left as is")
+
+if __name__ == '__main__':
+    print("Normalizing receipt images...")
+    main()
+    print("\nDone.")
@@ -0,0 +1,60 @@
+"""
+Script to find upload files and database rows that no longer match.
+
+Reports orphaned files (no row points at them), missing files (a row points
+at a file that is gone), blob rows nobody references and drifted blob
+reference counts, for both the blob store and the legacy static/uploads tree.
+Nothing is changed unless --delete is given; files younger than the grace
+period are never touched. Run --delete while uploads are quiet, since reference
+counts are recomputed from a snapshot.
+
+Usage: python scripts/reconcile_uploads.py [--delete] [--grace-minutes N]
+"""
+
+import sys
+import os
+import argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.utils import reconcile
+
+def print_list(label, items, limit=20):
+    print(f"  {label}: {len(items)}")
+    for item in list(items)[:limit]:
+        print(f"    - {item}")
+    if len(items) > limit:
+        print(f"    ... and {len(items) - limit} more")
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile uploaded files with the database')
+    parser.add_argument('--delete', action='store_true', help='delete orphans and repair blob rows')
+    parser.add_argument('--grace-minutes', type=int, default=reconcile.DEFAULT_GRACE_SECONDS // 60,
+                        help='ignore files and blob rows newer than this')
+    args = parser.parse_args()
+    grace_seconds = args.grace_minutes * 60
+
+    app = create_app()
+    with app.app_context():
+        blobs = reconcile.check_blobs(grace_seconds)
+        print(f"Blob store ({app.config['STORAGE_BACKEND']}): {blobs['objects']} objects")
+        print_list('Orphaned objects', blobs['orphans'])
+        print_list('Stale temp files', blobs['stale_temp'])
+        print_list('Missing objects', blobs['missing'])
+        print_list('Unreferenced blob rows', blobs['unreferenced'])
+        print_list('Reference count drift', [f"blob {blob_id} -> {count}" for blob_id, count in blobs['ref_count_drift'].items()])
+
+        legacy = reconcile.check_legacy_uploads(grace_seconds)
+        print(f"\nLegacy uploads ({legacy['root']}): {legacy['files']} files")
+        print_list('Orphaned files', legacy['orphans'])
+        print_list('Missing files', legacy['missing'])
+
+        if args.delete:
+            reconcile.repair_blobs(blobs)
+            reconcile.remove_legacy_orphans(legacy)
+            print("\n✓ Orphans deleted and blob rows repaired")
+        elif blobs['orphans'] or blobs['stale_temp'] or blobs['unreferenced'] or blobs['ref_count_drift'] or legacy['orphans']:
+            print("\n⚠️  Run with --delete to clean up")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Script to build web-optimized renditions (faststart MP4 and HLS) and seek-preview
+sprites for study videos.
+Covers videos uploaded before transcoding existed; jobs cut short when the
+server stopped are resumed by the media worker on its own (web/utils/media_jobs.py),
+so run this while the worker is stopped. Failed renditions are only retried with
+--retry-failed.
+Videos that are not in the blob store yet need scripts/migrate_uploads_to_blobs.py
+first.
+
+Usage: python scripts/transcode_videos.py [--retry-failed]
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from web import create_app
+from web.models import db, StudyVideo, StudyVideoRendition
+from web.utils import transcode
+
+def main():
+    retry_failed = '--retry-failed' in sys.argv
+    app = create_app()
+
+    with app.app_context():
+        if not transcode.enabled():
+            print(f"⚠️  Transcoding is disabled or '{app.config['FFMPEG_BINARY']}' was not found; only building previews")
+
+        skip = {StudyVideoRendition.READY} if retry_failed else {StudyVideoRendition.READY, StudyVideoRendition.FAILED}
+        videos = StudyVideo.query.filter(StudyVideo.blob_id.isnot(None)).order_by(StudyVideo.id).all()
+        todo = []
+        for video in videos:
+            transcode.request_renditions(video)
+            if any(rendition.status not in skip for rendition in video.renditions):
+                todo.append(video.id)
+        db.session.commit()
+        print(f"Found {len(todo)} video(s) to transcode")
+
+        for video_id in todo:
+            video = db.session.get(StudyVideo, video_id)
+            if retry_failed:
+                for rendition in video.renditions:
+                    if rendition.status == StudyVideoRendition.FAILED:
+                        rendition.status = StudyVideoRendition.PENDING
+                db.session.commit()
+            print(f"  Transcoding: {video.title}")
+            transcode.transcode_video(video_id)
+            db.session.refresh(video)
+            for rendition in video.renditions:
+                mark = '✓' if rendition.status == StudyVideoRendition.READY else '⚠️ '
+                print(f"    {mark} {rendition.kind}: {rendition.status}" + (f" ({rendition.error[-200:]})" if rendition.error else ''))
+
+if __name__ == '__main__':
+    print("Building study video renditions...")
+    main()
+    print("\nDone.")
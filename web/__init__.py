@@ -1,5 +1,7 @@
 from flask import Flask
-from web.models import db, User, ActivityLog
+from werkzeug.middleware.proxy_fix import ProxyFix
+from web.models import db, User, ActivityLog, StudyFolder, StudyFolderClosure, FinanceTransaction
+from web.utils import instrumentation, media_jobs, metrics
 import logging
 from sqlalchemy import inspect
 from sqlalchemy import text
@@ -10,6 +12,11 @@ def create_app():
     # Configuration
     web.config.from_object('config.Config')
     
+    # Client IP and scheme as seen by the reverse proxy (request.remote_addr is the proxy otherwise)
+    trusted_hops = web.config.get('TRUSTED_PROXY_HOPS', 0)
+    if trusted_hops:
+        web.wsgi_app = ProxyFix(web.wsgi_app, x_for=trusted_hops, x_proto=trusted_hops)
+    
     # Initialize extensions
     db.init_app(web)
 
@@ -21,6 +28,11 @@ def create_app():
     
     # Create tables and default admin user
     with web.app_context():
+        # Per-request query counting / slow-query profiling
+        instrumentation.init_app(web, db.engine)
+        metrics.init_app(web, db.engine)
+        media_jobs.init_app(web)
+
         db.create_all()
         logging.info("Database tables created.")
         # Ensure finance_transactions has required columns (migrations for first-deploy)
@@ -33,6 +45,10 @@ def create_app():
                     alter_queries.append("ALTER TABLE finance_transactions ADD COLUMN units INTEGER NOT NULL DEFAULT 1;")
                 if 'receipt' not in existing_cols:
                     alter_queries.append("ALTER TABLE finance_transactions ADD COLUMN receipt TEXT;")
+                if 'receipt_preview' not in existing_cols:
+                    alter_queries.append("ALTER TABLE finance_transactions ADD COLUMN receipt_preview TEXT;")
+                if 'fingerprint' not in existing_cols:
+                    alter_queries.append("ALTER TABLE finance_transactions ADD COLUMN fingerprint VARCHAR(64);")
 
                 if alter_queries:
                     for q in alter_queries:
@@ -45,6 +61,101 @@ def create_app():
         except Exception as e:
             logging.error(f'Error while ensuring finance_transactions columns: {e}')
         
+        # Ensure tvet_inventory_materials has the generated difference column and its index
+        try:
+            inspector = inspect(db.engine)
+            if 'tvet_inventory_materials' in inspector.get_table_names():
+                existing_cols = [c['name'] for c in inspector.get_columns('tvet_inventory_materials')]
+                if 'difference' not in existing_cols:
+                    storage = 'STORED' if db.engine.dialect.name == 'postgresql' else 'VIRTUAL'
+                    db.session.execute(text(
+                        "ALTER TABLE tvet_inventory_materials ADD COLUMN difference INTEGER "
+                        f"GENERATED ALWAYS AS (quantity_on_site - quantity_required) {storage};"
+                    ))
+                    db.session.execute(text(
+                        "CREATE INDEX IF NOT EXISTS ix_tvet_inventory_materials_difference "
+                        "ON tvet_inventory_materials (difference);"
+                    ))
+                    db.session.commit()
+                    logging.info('Added generated difference column to tvet_inventory_materials.')
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while ensuring tvet_inventory_materials difference column: {e}')
+        
+        # Index the study folder/video parent columns used by the folder tree queries
+        try:
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_study_folders_parent_folder_id "
+                "ON study_folders (parent_folder_id);"
+            ))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_study_videos_folder_id "
+                "ON study_videos (folder_id);"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while ensuring study folder indexes: {e}')
+        
+        # Composite indexes for finance date-range listings (see FinanceTransaction.__table_args__)
+        try:
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_finance_transactions_department_date "
+                "ON finance_transactions (department, date, id);"
+            ))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_finance_transactions_department_type_date "
+                "ON finance_transactions (department, transaction_type, date, id);"
+            ))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_finance_transactions_department_fingerprint "
+                "ON finance_transactions (department, fingerprint);"
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while ensuring finance transaction indexes: {e}')
+        
+        # Fingerprint transactions created before import duplicate detection existed
+        try:
+            backfilled = FinanceTransaction.backfill_fingerprints()
+            if backfilled:
+                db.session.commit()
+                logging.info(f'Fingerprinted {backfilled} finance transactions.')
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while fingerprinting finance transactions: {e}')
+        
+        # Ensure uploads can reference deduplicated blobs
+        try:
+            inspector = inspect(db.engine)
+            blob_columns = {
+                'certificates': 'blob_id',
+                'employee_documents': 'blob_id',
+                'study_videos': 'blob_id',
+                'finance_transactions': 'receipt_blob_id',
+            }
+            for table, column in blob_columns.items():
+                if table not in inspector.get_table_names():
+                    continue
+                if column not in [c['name'] for c in inspector.get_columns(table)]:
+                    db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER REFERENCES blobs(id);"))
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column});"))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while ensuring blob reference columns: {e}')
+        
+        # Backfill the study folder closure table for folders created before it existed
+        try:
+            if StudyFolderClosure.query.first() is None and StudyFolder.query.first() is not None:
+                StudyFolderClosure.rebuild()
+                db.session.commit()
+                logging.info('Built study_folder_closure from existing folders.')
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f'Error while building study_folder_closure: {e}')
+        
         try:
             # Create default admin user if it doesn't exist
             admin_user = User.query.filter_by(username='admin').first()
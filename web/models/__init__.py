@@ -7,8 +7,11 @@ from .student import Student
 from .certificate import Certificate
 from .employee import Employee
 from .employee_document import EmployeeDocument
-from .study_folder import StudyFolder
-from .study_video import StudyVideo
+from .study_folder import StudyFolder, StudyFolderClosure
+from .study_video import StudyVideo, StudyVideoRendition
 from .finance_transaction import FinanceTransaction
+from .data_version import DataVersion
+from .blob import Blob
+from .login_throttle import LoginThrottleBucket
 
-__all__ = ['db', 'User', 'ActivityLog', 'LPAFInventoryFolder', 'LPAFProduction', 'LPAFStatus', 'LPAFInventoryMaterial', 'TVETInventoryFolder', 'TVETCoreCompetency', 'TVETCategory', 'TVETInspectionRemark', 'TVETInventoryMaterial', 'Student', 'Certificate', 'Employee', 'EmployeeDocument', 'StudyFolder', 'StudyVideo', 'FinanceTransaction']
\ No newline at end of file
+__all__ = ['db', 'User', 'ActivityLog', 'LPAFInventoryFolder', 'LPAFProduction', 'LPAFStatus', 'LPAFInventoryMaterial', 'TVETInventoryFolder', 'TVETCoreCompetency', 'TVETCategory', 'TVETInspectionRemark', 'TVETInventoryMaterial', 'Student', 'Certificate', 'Employee', 'EmployeeDocument', 'StudyFolder', 'StudyFolderClosure', 'StudyVideo', 'StudyVideoRendition', 'FinanceTransaction', 'DataVersion', 'Blob', 'LoginThrottleBucket']
\ No newline at end of file
@@ -0,0 +1,133 @@
+from datetime import datetime
+from sqlalchemy import event, inspect, update, delete, select
+from sqlalchemy.orm import Session
+
+from .user import db
+
+# (model table, blob foreign key column) pairs whose rows hold a reference to a blob
+BLOB_REFERENCES = {
+    'certificates': 'blob_id',
+    'employee_documents': 'blob_id',
+    'study_videos': 'blob_id',
+    'finance_transactions': 'receipt_blob_id',
+}
+
+class Blob(db.Model):
+    """Content-addressed upload: one row (and one file) per distinct SHA-256"""
+    __tablename__ = 'blobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(100))
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def storage_key(self):
+        """Relative location of the bytes, sharded by hash prefix"""
+        return f'{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sha256': self.sha256,
+            'size': self.size,
+            'mime_type': self.mime_type,
+            'ref_count': self.ref_count,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<Blob {self.sha256[:12]} refs={self.ref_count}>'
+
+def _blob_deltas(session):
+    """Reference count changes (blob_id -> delta) implied by the pending flush"""
+    deltas = {}
+
+    def add(blob_id, amount):
+        if blob_id is not None:
+            deltas[blob_id] = deltas.get(blob_id, 0) + amount
+
+    for obj in session.new:
+        column = BLOB_REFERENCES.get(getattr(obj, '__tablename__', None))
+        if column:
+            add(getattr(obj, column), 1)
+    for obj in session.deleted:
+        column = BLOB_REFERENCES.get(getattr(obj, '__tablename__', None))
+        if column:
+            history = inspect(obj).attrs[column].history
+            add(history.deleted[0] if history.deleted else getattr(obj, column), -1)
+    for obj in session.dirty:
+        column = BLOB_REFERENCES.get(getattr(obj, '__tablename__', None))
+        if column and obj not in session.deleted:
+            history = inspect(obj).attrs[column].history
+            if history.has_changes():
+                for old in history.deleted:
+                    add(old, -1)
+                for new in history.added:
+                    add(new, 1)
+    return {blob_id: delta for blob_id, delta in deltas.items() if delta}
+
+@event.listens_for(Session, 'before_flush')
+def _count_blob_references(session, flush_context, instances):
+    """Keep Blob.ref_count in step with the rows that reference each blob"""
+    deltas = _blob_deltas(session)
+    for blob_id, delta in deltas.items():
+        result = session.execute(update(Blob).where(Blob.id == blob_id).values(ref_count=Blob.ref_count + delta))
+        if delta > 0 and result.rowcount == 0:
+            # Deleted by another transaction after it was looked up (blobstore.store() locks
+            # the blobs it hands out, so only a blob_id taken from elsewhere gets here)
+            raise LookupError(f'Blob {blob_id} no longer exists; store the file again')
+    released = [blob_id for blob_id, delta in deltas.items() if delta < 0]
+    if released:
+        session.info.setdefault('blobs_released', set()).update(released)
+
+@event.listens_for(Session, 'after_flush')
+def _delete_unreferenced_blobs(session, flush_context):
+    """Drop blob rows whose last reference went away; their files are removed after commit"""
+    released = session.info.pop('blobs_released', None)
+    if not released:
+        return
+    rows = session.execute(
+        select(Blob.id, Blob.sha256).where(Blob.id.in_(released)).where(Blob.ref_count <= 0)
+    ).all()
+    if not rows:
+        return
+    session.execute(delete(Blob).where(Blob.id.in_([row.id for row in rows])).where(Blob.ref_count <= 0))
+    session.info.setdefault('blob_files_to_delete', set()).update(row.sha256 for row in rows)
+
+@event.listens_for(Session, 'after_commit')
+def _remove_released_blob_files(session):
+    if session.in_nested_transaction():
+        # Releasing a savepoint; files follow the outermost transaction
+        return
+    session.info.pop('blobs_written', None)
+    shas = session.info.pop('blob_files_to_delete', None)
+    paths = session.info.pop('files_to_remove', None)
+    if shas or paths:
+        from web.utils import blobstore
+        if shas:
+            blobstore.remove_files(shas)
+        if paths:
+            blobstore.remove_local_files(paths)
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted_blob_files(session, transaction):
+    """
+    Forget queued file work when the outermost transaction ends without a commit
+    (rollback or close), removing the objects it wrote
+    """
+    if transaction.parent is not None:
+        return
+    session.info.pop('blobs_released', None)
+    session.info.pop('blob_files_to_delete', None)
+    session.info.pop('files_to_remove', None)
+    shas = session.info.pop('blobs_written', None)
+    if shas:
+        from web.utils import blobstore
+        try:
+            blobstore.remove_files(shas)
+        except Exception as e:
+            # Left for scripts/reconcile_uploads.py
+            print(f"Error removing uncommitted uploads: {e}")
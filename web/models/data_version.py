@@ -0,0 +1,53 @@
+from sqlalchemy import event, update, insert
+from sqlalchemy.orm import Session
+
+from .user import db
+
+# Tables whose writes bump a named data version (used to invalidate cached aggregates/reports)
+VERSIONED_TABLES = {
+    'tvet_inventory_materials': 'tvet_inventory',
+    'tvet_inventory_folders': 'tvet_inventory',
+    'tvet_core_competencies': 'tvet_inventory',
+    'tvet_categories': 'tvet_inventory',
+    'tvet_inspection_remarks': 'tvet_inventory',
+    'lpaf_inventory_materials': 'lpaf_inventory',
+    'lpaf_inventory_folders': 'lpaf_inventory',
+    'lpaf_productions': 'lpaf_inventory',
+    'lpaf_statuses': 'lpaf_inventory',
+}
+
+class DataVersion(db.Model):
+    """Monotonic version counter per data set, bumped in the same transaction as the write"""
+    __tablename__ = 'data_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get(cls, name):
+        """Current version of a data set (0 if it was never written)"""
+        version = db.session.query(cls.version).filter(cls.name == name).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, session, name):
+        """Increment a data set version using the session's current transaction"""
+        result = session.execute(
+            update(cls).where(cls.name == name).values(version=cls.version + 1)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(cls).values(name=name, version=1))
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+@event.listens_for(Session, 'before_flush')
+def _bump_data_versions(session, flush_context, instances):
+    """Bump the version of every data set touched by this flush"""
+    touched = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        name = VERSIONED_TABLES.get(getattr(obj, '__tablename__', None))
+        if name and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+            touched.add(name)
+    for name in touched:
+        DataVersion.bump(session, name)
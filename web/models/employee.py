@@ -1,5 +1,6 @@
 from .user import db
 from datetime import datetime
+from sqlalchemy import func, select
 
 class Employee(db.Model):
     __tablename__ = 'employees'
@@ -28,5 +29,24 @@ class Employee(db.Model):
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
     
+    @classmethod
+    def listing_query(cls):
+        """Flat employee rows with documents_count from one grouped subquery (no document rows loaded)"""
+        from .employee_document import EmployeeDocument
+        document_counts = select(
+            EmployeeDocument.employee_id.label('employee_id'),
+            func.count(EmployeeDocument.id).label('documents_count')
+        ).group_by(EmployeeDocument.employee_id).subquery('document_counts')
+        return db.session.query(
+            cls.id,
+            cls.name,
+            cls.position,
+            cls.job_description,
+            cls.department,
+            func.coalesce(document_counts.c.documents_count, 0).label('documents_count'),
+            cls.created_at,
+            cls.updated_at
+        ).outerjoin(document_counts, document_counts.c.employee_id == cls.id)
+    
     def __repr__(self):
         return f'<Employee {self.name} - {self.position}>'
\ No newline at end of file
@@ -12,9 +12,11 @@ class EmployeeDocument(db.Model):
     file_size = db.Column(db.Integer)  # File size in bytes
     mime_type = db.Column(db.String(100))  # File MIME type
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), nullable=True, index=True)  # Deduplicated content (see Blob)
     
     # Relationship
     employee = db.relationship('Employee', back_populates='documents')
+    blob = db.relationship('Blob')
     
     def to_dict(self):
         return {
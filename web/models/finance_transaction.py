@@ -1,9 +1,20 @@
+import hashlib
 from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event, update
+
 from .user import db
 
 class FinanceTransaction(db.Model):
     """Model for finance transactions (income and expenses)"""
     __tablename__ = 'finance_transactions'
+    # Department listings are filtered by date range and paged newest first on (date, id)
+    __table_args__ = (
+        db.Index('ix_finance_transactions_department_date', 'department', 'date', 'id'),
+        db.Index('ix_finance_transactions_department_type_date', 'department', 'transaction_type', 'date', 'id'),
+        db.Index('ix_finance_transactions_department_fingerprint', 'department', 'fingerprint'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -13,7 +24,10 @@ class FinanceTransaction(db.Model):
     units = db.Column(db.Integer, nullable=False, default=1)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     receipt = db.Column(db.Text, nullable=True)
+    receipt_blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), nullable=True, index=True)  # Uploaded receipt content (see Blob)
+    receipt_preview = db.Column(db.Text, nullable=True)  # Small JPEG preview of an image receipt (see web/utils/receipts.py)
     department = db.Column(db.String(10), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=True)  # Duplicate detection for imports (see make_fingerprint)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
@@ -27,9 +41,70 @@ class FinanceTransaction(db.Model):
             'units': self.units or 1,
             'amount': float(self.amount) if self.amount else 0,
             'receipt': self.receipt or '',
+            'receipt_preview': self.receipt_preview or '',
             'department': self.department,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
         }
     
+    @staticmethod
+    def make_fingerprint(date, transaction_type, amount, source, description):
+        """
+        Hash identifying a transaction by its content: date, type, amount (to the
+        cent) and whitespace/case-normalized source and description
+        """
+        def normalize(text):
+            return ' '.join((text or '').split()).casefold()
+
+        amount = Decimal(str(amount or 0)).quantize(Decimal('0.01'))
+        description_hash = hashlib.sha256(normalize(description).encode('utf-8')).hexdigest()
+        key = f"{date.isoformat()}|{transaction_type}|{amount}|{normalize(source)}|{description_hash}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    def update_fingerprint(self):
+        self.fingerprint = self.make_fingerprint(self.date, self.transaction_type, self.amount, self.source, self.description)
+    
+    @classmethod
+    def backfill_fingerprints(cls, batch_size=1000):
+        """Set the fingerprint of rows that have none; returns how many were updated"""
+        updated = 0
+        while True:
+            rows = db.session.query(
+                cls.id, cls.date, cls.transaction_type, cls.amount, cls.source, cls.description, cls.updated_at
+            ).filter(cls.fingerprint.is_(None)).limit(batch_size).all()
+            if not rows:
+                return updated
+            # updated_at is passed through, or its onupdate would stamp every row with the time of the backfill
+            db.session.execute(update(cls), [
+                {
+                    'id': row.id,
+                    'fingerprint': cls.make_fingerprint(row.date, row.transaction_type, row.amount, row.source, row.description),
+                    'updated_at': row.updated_at
+                }
+                for row in rows
+            ])
+            updated += len(rows)
+    
+    @classmethod
+    def listing_query(cls):
+        """Column query matching to_dict() for list endpoints"""
+        return db.session.query(
+            cls.id,
+            cls.date,
+            cls.transaction_type,
+            cls.source,
+            cls.description,
+            cls.units,
+            cls.amount,
+            cls.receipt,
+            cls.receipt_preview,
+            cls.department,
+            cls.created_at
+        )
+    
     def __repr__(self):
         return f'<FinanceTransaction {self.transaction_type} - {self.source} - {self.amount}>'
+
+@event.listens_for(FinanceTransaction, 'before_insert')
+@event.listens_for(FinanceTransaction, 'before_update')
+def _set_fingerprint(mapper, connection, target):
+    target.update_fingerprint()
@@ -0,0 +1,12 @@
+from .user import db
+
+class LoginThrottleBucket(db.Model):
+    """Token bucket shared by all server processes (see web/utils/throttle.py)"""
+    __tablename__ = 'login_throttle_buckets'
+
+    key = db.Column(db.String(200), primary_key=True)  # 'user:<address>:<name>' or 'ip:<address>'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # time.time() of the last refill
+
+    def __repr__(self):
+        return f'<LoginThrottleBucket {self.key}={self.tokens:.2f}>'
@@ -86,6 +86,26 @@ class LPAFInventoryMaterial(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    @classmethod
+    def listing_query(cls):
+        """Flat column query for list endpoints (joins lookup names instead of lazy-loading them per row)"""
+        return db.session.query(
+            cls.id,
+            cls.folder_id,
+            cls.production_id,
+            cls.status_id,
+            cls.item_name,
+            cls.item_code,
+            cls.description,
+            LPAFInventoryFolder.name.label('folder_name'),
+            LPAFProduction.name.label('production_name'),
+            LPAFStatus.name.label('status_name'),
+            cls.created_at,
+            cls.updated_at
+        ).outerjoin(LPAFInventoryFolder, cls.folder_id == LPAFInventoryFolder.id) \
+         .outerjoin(LPAFProduction, cls.production_id == LPAFProduction.id) \
+         .outerjoin(LPAFStatus, cls.status_id == LPAFStatus.id)
+    
     def __repr__(self):
 
         return f'<LPAFInventoryMaterial {self.item_name}>'
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import func, select
 
 # Import the db instance from user.py
 from .user import db
@@ -33,5 +34,25 @@ class Student(db.Model):
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
     
+    @classmethod
+    def listing_query(cls):
+        """Flat student rows with certificates_count from one grouped subquery (no certificate rows loaded)"""
+        from .certificate import Certificate
+        certificate_counts = select(
+            Certificate.student_id.label('student_id'),
+            func.count(Certificate.id).label('certificates_count')
+        ).group_by(Certificate.student_id).subquery('certificate_counts')
+        return db.session.query(
+            cls.id,
+            cls.batch,
+            cls.name,
+            cls.age,
+            cls.address,
+            cls.contact_no,
+            func.coalesce(certificate_counts.c.certificates_count, 0).label('certificates_count'),
+            cls.created_at,
+            cls.updated_at
+        ).outerjoin(certificate_counts, certificate_counts.c.student_id == cls.id)
+    
     def __repr__(self):
         return f'<Student {self.name} - {self.batch}>'
\ No newline at end of file
@@ -1,5 +1,9 @@
 from datetime import datetime
+from sqlalchemy import delete, event, func, insert, inspect, literal, select
 from .user import db
+from .study_video import StudyVideo
+
+MAX_FOLDER_DEPTH = 64  # guards the recursive rebuild query against runaway (cyclic) parent chains
 
 class StudyFolder(db.Model):
     __tablename__ = 'study_folders'
@@ -7,7 +11,7 @@ class StudyFolder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    parent_folder_id = db.Column(db.Integer, db.ForeignKey('study_folders.id'), nullable=True)
+    parent_folder_id = db.Column(db.Integer, db.ForeignKey('study_folders.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -17,14 +21,205 @@ class StudyFolder(db.Model):
     # Relationship with videos
     videos = db.relationship('StudyVideo', backref='folder', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
+    def to_dict(self, subfolder_count=None, video_count=None):
+        """Folder fields; counts are only included when passed in (see listing_query())"""
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'parent_folder_id': self.parent_folder_id,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'subfolder_count': len(self.subfolders),
-            'video_count': len(self.videos)
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
+        if subfolder_count is not None:
+            data['subfolder_count'] = subfolder_count
+        if video_count is not None:
+            data['video_count'] = video_count
+        return data
+    
+    @staticmethod
+    def _video_stats():
+        """Direct video count and total size per folder"""
+        return select(
+            StudyVideo.folder_id.label('folder_id'),
+            func.count(StudyVideo.id).label('video_count'),
+            func.coalesce(func.sum(StudyVideo.file_size), 0).label('video_size')
+        ).group_by(StudyVideo.folder_id).subquery('video_stats')
+    
+    @classmethod
+    def _subfolder_stats(cls):
+        """Direct subfolder count per folder"""
+        return select(
+            cls.parent_folder_id.label('folder_id'),
+            func.count(cls.id).label('subfolder_count')
+        ).where(cls.parent_folder_id.isnot(None)).group_by(cls.parent_folder_id).subquery('subfolder_stats')
+    
+    @classmethod
+    def listing_query(cls):
+        """Flat folder rows with direct subfolder/video counts from grouped subqueries"""
+        video_stats = cls._video_stats()
+        subfolder_stats = cls._subfolder_stats()
+        return db.session.query(
+            cls.id,
+            cls.name,
+            cls.description,
+            cls.parent_folder_id,
+            cls.created_at,
+            cls.updated_at,
+            func.coalesce(subfolder_stats.c.subfolder_count, 0).label('subfolder_count'),
+            func.coalesce(video_stats.c.video_count, 0).label('video_count')
+        ).outerjoin(subfolder_stats, subfolder_stats.c.folder_id == cls.id) \
+         .outerjoin(video_stats, video_stats.c.folder_id == cls.id)
+    
+    @classmethod
+    def tree_query(cls, root_id=None, max_depth=None):
+        """
+        One statement returning every folder of a (sub)tree with its depth, direct
+        counts and recursive video count/size.
+
+        Subtree membership, depth and the recursive totals all come from the
+        closure table (see StudyFolderClosure), summing per-folder video stats
+        over each folder's descendants.
+        """
+        closure = StudyFolderClosure
+        if root_id is not None:
+            tree = select(closure.descendant_id.label('id'), closure.depth.label('depth')) \
+                .where(closure.ancestor_id == root_id)
+            if max_depth is not None:
+                tree = tree.where(closure.depth <= max_depth)
+        else:
+            # Depth below the top-level folder = distance to the farthest ancestor
+            tree = select(closure.descendant_id.label('id'), func.max(closure.depth).label('depth')) \
+                .group_by(closure.descendant_id)
+            if max_depth is not None:
+                tree = tree.having(func.max(closure.depth) <= max_depth)
+        tree = tree.subquery('folder_tree')
+        
+        video_stats = cls._video_stats()
+        subfolder_stats = cls._subfolder_stats()
+        totals = select(
+            closure.ancestor_id.label('folder_id'),
+            func.sum(video_stats.c.video_count).label('total_video_count'),
+            func.sum(video_stats.c.video_size).label('total_video_size')
+        ).join(video_stats, video_stats.c.folder_id == closure.descendant_id) \
+         .group_by(closure.ancestor_id).subquery('folder_totals')
+        
+        return db.session.query(
+            cls.id,
+            cls.name,
+            cls.description,
+            cls.parent_folder_id,
+            cls.created_at,
+            cls.updated_at,
+            tree.c.depth,
+            func.coalesce(subfolder_stats.c.subfolder_count, 0).label('subfolder_count'),
+            func.coalesce(video_stats.c.video_count, 0).label('video_count'),
+            func.coalesce(video_stats.c.video_size, 0).label('video_size'),
+            func.coalesce(totals.c.total_video_count, 0).label('total_video_count'),
+            func.coalesce(totals.c.total_video_size, 0).label('total_video_size')
+        ).join(tree, tree.c.id == cls.id) \
+         .outerjoin(subfolder_stats, subfolder_stats.c.folder_id == cls.id) \
+         .outerjoin(video_stats, video_stats.c.folder_id == cls.id) \
+         .outerjoin(totals, totals.c.folder_id == cls.id) \
+         .order_by(tree.c.depth, cls.name, cls.id)
+    
+    @classmethod
+    def breadcrumbs(cls, folder_id):
+        """Path from the root folder down to folder_id as [{'id', 'name'}]"""
+        rows = db.session.query(cls.id, cls.name) \
+            .join(StudyFolderClosure, StudyFolderClosure.ancestor_id == cls.id) \
+            .filter(StudyFolderClosure.descendant_id == folder_id) \
+            .order_by(StudyFolderClosure.depth.desc()).all()
+        return [{'id': row.id, 'name': row.name} for row in rows]
+    
+    @classmethod
+    def subtree_videos_query(cls, folder_id, search=None):
+        """Videos in folder_id or any of its subfolders, optionally matching search in title/description"""
+        query = StudyVideo.query \
+            .join(StudyFolderClosure, StudyFolderClosure.descendant_id == StudyVideo.folder_id) \
+            .filter(StudyFolderClosure.ancestor_id == folder_id)
+        return StudyVideo.search_filter(query, search)
+    
+    def is_ancestor_of(self, folder_id):
+        """True if folder_id is this folder or one of its descendants"""
+        return db.session.query(
+            StudyFolderClosure.query.filter_by(ancestor_id=self.id, descendant_id=folder_id).exists()
+        ).scalar()
+
+class StudyFolderClosure(db.Model):
+    """
+    Closure table for the folder hierarchy: one row per (ancestor, descendant)
+    pair, including each folder paired with itself at depth 0. Maintained by the
+    mapper events below whenever a folder is created, moved or deleted.
+    """
+    __tablename__ = 'study_folder_closure'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('study_folders.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('study_folders.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_study_folder_closure_descendant', 'descendant_id', 'depth'),
+    )
+    
+    @classmethod
+    def rebuild(cls, connection=None):
+        """Recompute the whole table from parent_folder_id (used to backfill existing data)"""
+        folders = StudyFolder.__table__
+        pairs = select(folders.c.id.label('ancestor_id'), folders.c.id.label('descendant_id'), literal(0).label('depth')) \
+            .cte('folder_pairs', recursive=True)
+        pairs = pairs.union_all(
+            select(pairs.c.ancestor_id, folders.c.id, pairs.c.depth + 1)
+            .join(pairs, folders.c.parent_folder_id == pairs.c.descendant_id)
+            .where(pairs.c.depth < MAX_FOLDER_DEPTH)
+        )
+        connection = connection or db.session.connection()
+        connection.execute(delete(cls.__table__))
+        connection.execute(insert(cls.__table__).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(pairs.c.ancestor_id, pairs.c.descendant_id, pairs.c.depth)
+        ))
+    
+    def __repr__(self):
+        return f'<StudyFolderClosure {self.ancestor_id}->{self.descendant_id} ({self.depth})>'
+
+def _link_to_parent(connection, folder_id, parent_id):
+    """Add paths from every ancestor of parent_id to every folder in folder_id's subtree"""
+    if parent_id is None:
+        return
+    closure = StudyFolderClosure.__table__
+    above = closure.alias('above')
+    below = closure.alias('below')
+    connection.execute(insert(closure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(above.c.ancestor_id, below.c.descendant_id, above.c.depth + below.c.depth + 1)
+        .select_from(above.join(below, below.c.ancestor_id == folder_id))
+        .where(above.c.descendant_id == parent_id)
+    ))
+
+@event.listens_for(StudyFolder, 'after_insert')
+def _closure_after_insert(mapper, connection, target):
+    closure = StudyFolderClosure.__table__
+    connection.execute(insert(closure).values(ancestor_id=target.id, descendant_id=target.id, depth=0))
+    _link_to_parent(connection, target.id, target.parent_folder_id)
+
+@event.listens_for(StudyFolder, 'after_update')
+def _closure_after_update(mapper, connection, target):
+    if not inspect(target).attrs.parent_folder_id.history.has_changes():
+        return
+    closure = StudyFolderClosure.__table__
+    subtree = select(closure.c.descendant_id).where(closure.c.ancestor_id == target.id).scalar_subquery()
+    # Drop the paths from the old ancestors into the moved subtree, keep the paths inside it
+    connection.execute(
+        delete(closure)
+        .where(closure.c.descendant_id.in_(subtree))
+        .where(closure.c.ancestor_id.not_in(subtree))
+    )
+    _link_to_parent(connection, target.id, target.parent_folder_id)
+
+@event.listens_for(StudyFolder, 'after_delete')
+def _closure_after_delete(mapper, connection, target):
+    closure = StudyFolderClosure.__table__
+    connection.execute(
+        delete(closure).where((closure.c.ancestor_id == target.id) | (closure.c.descendant_id == target.id))
+    )
@@ -14,10 +14,22 @@ class StudyVideo(db.Model):
     duration = db.Column(db.String(50))  # Store as "HH:MM:SS" or seconds
     mime_type = db.Column(db.String(100))
     thumbnail_path = db.Column(db.String(500))
-    folder_id = db.Column(db.Integer, db.ForeignKey('study_folders.id'), nullable=True)
+    folder_id = db.Column(db.Integer, db.ForeignKey('study_folders.id'), nullable=True, index=True)
+    blob_id = db.Column(db.Integer, db.ForeignKey('blobs.id'), nullable=True, index=True)  # Deduplicated content (see Blob)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    blob = db.relationship('Blob')
+    # Loaded with one extra query per listing rather than one per video
+    renditions = db.relationship('StudyVideoRendition', backref='video', lazy='selectin', cascade='all, delete-orphan')
+    
+    def rendition(self, kind, ready=True):
+        """This video's rendition of the given kind (only if ready, by default)"""
+        for rendition in self.renditions:
+            if rendition.kind == kind and (not ready or rendition.status == StudyVideoRendition.READY):
+                return rendition
+        return None
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -31,6 +43,56 @@ class StudyVideo(db.Model):
             'mime_type': self.mime_type,
             'thumbnail_path': self.thumbnail_path,
             'folder_id': self.folder_id,
+            'renditions': {rendition.kind: rendition.status for rendition in self.renditions},
+            'hls_url': f'/uploads/study_videos/{self.id}/hls/master.m3u8' if self.rendition('hls') else None,
+            'preview_url': f'/uploads/study_videos/{self.id}/preview/sprite.vtt' if self.rendition('preview') else None,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
+    
+    @classmethod
+    def search_filter(cls, query, search):
+        """Restrict query to videos whose title or description contains every word of search"""
+        for term in (search or '').split():
+            query = query.filter(db.or_(
+                cls.title.icontains(term, autoescape=True),
+                cls.description.icontains(term, autoescape=True)
+            ))
+        return query
+
+class StudyVideoRendition(db.Model):
+    """Web-optimized variant of a study video, produced in the background (see web/utils/transcode.py)"""
+    __tablename__ = 'study_video_renditions'
+    __table_args__ = (db.UniqueConstraint('video_id', 'kind', name='uq_study_video_renditions_video_kind'),)
+    
+    MP4 = 'mp4'  # H.264/AAC with the index up front (faststart), for progressive playback
+    HLS = 'hls'  # Multi-bitrate HLS ladder; storage_key is the master playlist
+    PREVIEW = 'preview'  # Seek-preview sprite sheet; storage_key is its WebVTT index
+    KINDS = (MP4, HLS, PREVIEW)
+    
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('study_videos.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=PENDING)
+    storage_key = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'video_id': self.video_id,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<StudyVideoRendition {self.video_id} {self.kind} {self.status}>'
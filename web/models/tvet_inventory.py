@@ -84,15 +84,14 @@ class TVETInventoryMaterial(db.Model):
     quantity_y1 = db.Column(db.Integer, nullable=False, default=0)
     quantity_y2 = db.Column(db.Integer, nullable=False, default=0)
     
+    # Difference between on-site and required quantities, computed by the database
+    # so shortages can be filtered and aggregated in SQL
+    difference = db.Column(db.Integer, db.Computed('quantity_on_site - quantity_required', persisted=True), index=True)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    @property
-    def difference(self):
-        """Calculate the difference between required and on-site quantities"""
-        return self.quantity_on_site - self.quantity_required
-    
     def to_dict(self):
         """Convert to dictionary for JSON serialization"""
         return {
@@ -116,5 +115,32 @@ class TVETInventoryMaterial(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    @classmethod
+    def listing_query(cls):
+        """Flat column query for list endpoints (joins lookup names instead of lazy-loading them per row)"""
+        return db.session.query(
+            cls.id,
+            cls.folder_id,
+            cls.competency_id,
+            cls.category_id,
+            cls.inspection_remark_id,
+            cls.item,
+            cls.specification,
+            cls.quantity_required,
+            cls.quantity_on_site,
+            cls.quantity_y1,
+            cls.quantity_y2,
+            cls.difference,
+            TVETInventoryFolder.name.label('folder_name'),
+            TVETCoreCompetency.name.label('competency_name'),
+            TVETCategory.name.label('category_name'),
+            TVETInspectionRemark.name.label('inspection_remark'),
+            cls.created_at,
+            cls.updated_at
+        ).outerjoin(TVETInventoryFolder, cls.folder_id == TVETInventoryFolder.id) \
+         .outerjoin(TVETCoreCompetency, cls.competency_id == TVETCoreCompetency.id) \
+         .outerjoin(TVETCategory, cls.category_id == TVETCategory.id) \
+         .outerjoin(TVETInspectionRemark, cls.inspection_remark_id == TVETInspectionRemark.id)
+    
     def __repr__(self):
         return f'<TVETInventoryMaterial {self.item}>'
\ No newline at end of file
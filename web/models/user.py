@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+
+from web.utils import passwords
 
 db = SQLAlchemy()
 
@@ -15,11 +16,15 @@ class User(db.Model):
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
         """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """True if the stored hash predates the current hashing policy"""
+        return passwords.needs_rehash(self.password_hash)
     
     def can_access_role(self, role):
         """Check if user can access a specific role"""
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session, jsonify
-from web.models import User, ActivityLog
+from web.models import db, User, ActivityLog
+from web.utils import metrics, passwords, throttle
 from functools import wraps
 
 auth_bp = Blueprint('auth', __name__)
@@ -15,10 +16,13 @@ def login_required(f):
 
 def role_required(required_role):
     """Decorator to require specific role for routes"""
+    required_role_label = ','.join(required_role) if isinstance(required_role, list) else required_role
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if 'user_id' not in session:
+                metrics.role_checks_total.inc(role=required_role_label, result='unauthenticated')
                 return redirect(url_for('main.index'))
             
             current_user = get_current_user()
@@ -37,13 +41,16 @@ def role_required(required_role):
                 role_name = required_role
             
             if not current_user or not role_check:
+                metrics.role_checks_total.inc(role=required_role_label, result='denied')
                 flash('You do not have permission to access this page.', 'error')
                 return redirect(url_for('auth.role_selection'))
             
             if not role_selected:
+                metrics.role_checks_total.inc(role=required_role_label, result='not_selected')
                 flash(f'Please select the {role_name} role to access this page.', 'warning')
                 return redirect(url_for('auth.role_selection'))
-                
+            
+            metrics.role_checks_total.inc(role=required_role_label, result='allowed')
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -62,27 +69,46 @@ def login():
         password = request.form.get('password')
         
         if not username or not password:
+            metrics.login_attempts_total.inc(result='invalid_request')
             return jsonify({'success': False, 'message': 'Username and password are required'})
         
+        # Rejected before the user lookup and the hash check, which is the expensive part
+        retry_after = throttle.check_login(username, request.remote_addr)
+        if retry_after:
+            metrics.login_attempts_total.inc(result='throttled')
+            response = jsonify({'success': False, 'message': 'Too many login attempts. Please try again later.'})
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response, 429
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        if user is None:
+            passwords.verify(None, password)  # same cost as a wrong password for a real user
+        elif user.check_password(password):
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            throttle.login_succeeded(username, request.remote_addr)
+            
             session['user_id'] = user.id
             session['user_type'] = user.user_type
             session['username'] = user.username
             
             # Log login activity
             ActivityLog.log_activity(user, 'login')
+            metrics.login_attempts_total.inc(result='success')
             
             return jsonify({
                 'success': True, 
                 'message': 'Login successful',
                 'redirect': url_for('auth.role_selection')
             })
-        else:
-            return jsonify({'success': False, 'message': 'Invalid username or password'})
+        
+        metrics.login_attempts_total.inc(result='failure')
+        return jsonify({'success': False, 'message': 'Invalid username or password'})
             
     except Exception as e:
+        metrics.login_attempts_total.inc(result='error')
         return jsonify({'success': False, 'message': 'An error occurred during login'})
 
 @auth_bp.route('/role')
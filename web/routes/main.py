@@ -1,9 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify, flash, send_from_directory, current_app, session
+from flask import Blueprint, render_template, request, jsonify, flash, send_from_directory, send_file, current_app, session, Response, stream_with_context
 from web.routes.auth import login_required, role_required
-from web.models import db, User, ActivityLog, Student, Certificate, Employee, EmployeeDocument, LPAFInventoryFolder, LPAFProduction, LPAFStatus, LPAFInventoryMaterial, TVETInventoryFolder, TVETCoreCompetency, TVETCategory, TVETInspectionRemark, TVETInventoryMaterial, StudyFolder, StudyVideo, FinanceTransaction
+from web.models import db, User, ActivityLog, Student, Certificate, Employee, EmployeeDocument, LPAFInventoryFolder, LPAFProduction, LPAFStatus, LPAFInventoryMaterial, TVETInventoryFolder, TVETCoreCompetency, TVETCategory, TVETInspectionRemark, TVETInventoryMaterial, StudyFolder, StudyVideo, StudyVideoRendition, FinanceTransaction, DataVersion, Blob
 from web.models.lpaf_inventory import LPAFInventoryMaterial
-from sqlalchemy import desc
+from web.utils import instrumentation, metrics, reports, blobstore, transcode, video_previews, receipts, finance_import, student_import, certificate_batch, certificate_pdf, zipstream
+from web.utils.imports import ImportFileError
+from web.utils.responses import json_response, serialize_rows, DATE_FORMAT, DATETIME_FORMAT
+from web.utils.cache import VersionedCache
+from web.utils.storage import get_storage
+from sqlalchemy import desc, func, case, or_, and_
+from sqlalchemy.orm import joinedload
 import os
+import hmac
 from werkzeug.utils import secure_filename
 import uuid
 from PIL import Image
@@ -11,6 +18,7 @@ import io
 from datetime import datetime
 import mimetypes
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 main_bp = Blueprint('main', __name__)
@@ -42,6 +50,35 @@ def admin_users():
     users = User.query.all()
     return render_template('admin/user.html', users=users)
 
+@main_bp.route('/admin/perf')
+@role_required('admin')
+def admin_perf():
+    routes = instrumentation.recorder.snapshot()
+    return render_template('admin/perf.html', routes=routes)
+
+@main_bp.route('/api/admin/perf', methods=['GET'])
+@role_required('admin')
+def get_perf_stats():
+    """Get rolling per-endpoint request/query statistics"""
+    return jsonify({'success': True, 'routes': instrumentation.recorder.snapshot()})
+
+@main_bp.route('/api/admin/perf', methods=['DELETE'])
+@role_required('admin')
+def reset_perf_stats():
+    """Clear the collected request/query statistics"""
+    instrumentation.recorder.reset()
+    return jsonify({'success': True, 'message': 'Performance statistics cleared'})
+
+@main_bp.route('/metrics')
+def prometheus_metrics():
+    """Expose application metrics in the Prometheus text format (admins and METRICS_TOKEN holders only)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not scraper and session.get('user_type') != 'admin':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain', headers={'WWW-Authenticate': 'Bearer'})
+    return metrics.render_metrics(db.engine)
+
 @main_bp.route('/api/users', methods=['GET'])
 @role_required('admin')
 def get_users():
@@ -194,18 +231,65 @@ def get_logs():
     except Exception as e:
         return jsonify({'success': False, 'message': 'An error occurred while fetching logs'})
 
+# Inventory material paging
+INVENTORY_FIRST_PAGE_SIZE = 100  # materials embedded in the inventory page itself
+INVENTORY_MAX_PAGE_SIZE = 1000
+
+def _material_cursor(row):
+    """Opaque keyset cursor for a material row ordered by (created_at desc, id desc)"""
+    return f"{row.created_at.isoformat()}|{row.id}"
+
+def _paginate_materials(query, model, limit, cursor=None):
+    """
+    Apply newest-first keyset pagination to a material listing query.
+    
+    Returns:
+        tuple: (rows, next_cursor) - next_cursor is None on the last page
+    """
+    if cursor:
+        created_at_str, last_id = cursor.rsplit('|', 1)
+        created_at = datetime.fromisoformat(created_at_str)
+        query = query.filter(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < int(last_id))
+        ))
+    
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if not limit:
+        return query.all(), None
+    
+    rows = query.limit(limit + 1).all()
+    next_cursor = _material_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _lookup_rows(model):
+    return [
+        {'id': item.id, 'name': item.name, 'description': item.description or ''}
+        for item in db.session.query(model.id, model.name, model.description).order_by(model.id).all()
+    ]
+
 # TVET Routes
 @main_bp.route('/tvet/inventory')
 @role_required('tvet')
 def tvet_inventory():
-    # Get folders for the dropdown using new TVET models
-    folders = TVETInventoryFolder.query.all()
-    materials = TVETInventoryMaterial.query.order_by(
-    TVETInventoryMaterial.created_at.desc(),
-    TVETInventoryMaterial.id.desc()
-).all()
+    # Embed only the first page of materials plus lookup data; the page streams the rest from the API
+    materials, next_cursor = _paginate_materials(
+        TVETInventoryMaterial.listing_query(), TVETInventoryMaterial, INVENTORY_FIRST_PAGE_SIZE
+    )
+    bootstrap = {
+        'materials': serialize_rows(
+            materials,
+            formats={'created_at': 'iso', 'updated_at': 'iso'},
+            defaults={'specification': ''}
+        ),
+        'next_cursor': next_cursor,
+        'folders': _lookup_rows(TVETInventoryFolder),
+        'competencies': _lookup_rows(TVETCoreCompetency),
+        'categories': _lookup_rows(TVETCategory),
+        'remarks': _lookup_rows(TVETInspectionRemark)
+    }
     user_type = session.get('user_type', 'user')
-    return render_template('tvet/inventory.html', folders=folders, materials=materials, user_type=user_type)
+    return render_template('tvet/inventory.html', bootstrap=bootstrap, user_type=user_type)
 
 @main_bp.route('/tvet/students')
 @role_required('tvet')
@@ -254,7 +338,7 @@ def get_students():
     try:
         search = request.args.get('search', '').strip()
         
-        query = Student.query
+        query = Student.listing_query()
         if search:
             # Search in name, batch, or certificate fields
             search_term = f'%{search}%'
@@ -265,10 +349,11 @@ def get_students():
                 )
             )
         
+        # Certificate counts come from a grouped subquery instead of loading every certificate
         students = query.order_by(Student.batch, Student.name).all()
-        students_data = [student.to_dict() for student in students]
+        students_data = serialize_rows(students, formats={'created_at': DATETIME_FORMAT, 'updated_at': DATETIME_FORMAT})
         
-        return jsonify({'success': True, 'students': students_data})
+        return json_response({'success': True, 'students': students_data})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -314,6 +399,50 @@ def create_student():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'An error occurred while creating the student: {str(e)}'})
 
+@main_bp.route('/api/students/import', methods=['POST'])
+@role_required('tvet')
+def import_students():
+    """
+    Enroll students from a CSV/XLSX file (see web/utils/student_import.py).
+    
+    Form fields: file, batch (for files without a batch column), skip_invalid=1
+    to save the valid rows of a file that has errors, dry_run=1 to only validate.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'success': False, 'message': 'No file selected'})
+        
+        dry_run = request.form.get('dry_run') in ('1', 'true')
+        skip_invalid = request.form.get('skip_invalid') in ('1', 'true')
+        try:
+            report = student_import.import_students(
+                upload.stream, upload.filename,
+                default_batch=request.form.get('batch', '').strip() or None,
+                skip_invalid=skip_invalid,
+                dry_run=dry_run
+            )
+        except ImportFileError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        rejected = report['invalid'] and not (skip_invalid or dry_run)
+        if report['saved']:
+            message = f"Enrolled {report['imported']} student(s)"
+        elif dry_run:
+            message = f"{report['valid']} student(s) can be enrolled"
+        elif rejected:
+            message = f"No students were enrolled: {report['invalid']} row(s) have errors"
+        else:
+            message = 'No new students to enroll'
+        if report['invalid'] and not rejected:
+            message += f"; {report['invalid']} invalid row(s)"
+        if report['duplicates']:
+            message += f"; {report['duplicates']} already enrolled or repeated"
+        return json_response({'success': not rejected, 'message': message, **report})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'An error occurred while importing students: {str(e)}'})
+
 @main_bp.route('/api/students/<int:student_id>', methods=['PUT'])
 @role_required('tvet')
 def update_student(student_id):
@@ -379,20 +508,47 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def generate_thumbnail(file_path, mime_type):
-    """Generate thumbnail for image files"""
-    try:
-        if mime_type.startswith('image/'):
-            with Image.open(file_path) as img:
-                img.thumbnail((200, 200))
-                thumb_filename = f"thumb_{os.path.basename(file_path)}"
-                thumb_path = os.path.join(os.path.dirname(file_path), thumb_filename)
-                img.save(thumb_path)
-                return thumb_filename
-    except Exception as e:
+def generate_thumbnail(file_path, mime_type, thumb_path=None):
+    """Generate thumbnail for image files (next to the file, or at thumb_path as PNG)"""
+    try:
+        if mime_type and mime_type.startswith('image/'):
+            with metrics.thumbnail_duration_seconds.time(kind='image'):
+                with Image.open(file_path) as img:
+                    img.thumbnail((200, 200))
+                    if thumb_path:
+                        if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                            img = img.convert('RGB')
+                        img.save(thumb_path, 'PNG')
+                    else:
+                        thumb_path = os.path.join(os.path.dirname(file_path), f"thumb_{os.path.basename(file_path)}")
+                        img.save(thumb_path)
+            metrics.thumbnails_total.inc(kind='image', result='success')
+            return os.path.basename(thumb_path)
+    except Exception as e:
+        metrics.thumbnails_total.inc(kind='image', result='failure')
         print(f"Error generating thumbnail: {e}")
     return None
 
+def generate_blob_thumbnail(blob, mime_type):
+    """Thumbnail an image blob once; later uploads of the same content reuse it"""
+    if not (mime_type and mime_type.startswith('image/')):
+        return
+
+    def build(thumb_path):
+        with blobstore.local_copy(blob) as source_path:
+            return generate_thumbnail(source_path, mime_type, thumb_path) is not None
+
+    blobstore.put_derived(blobstore.thumbnail_key(blob.sha256), build, suffix='.png', content_type='image/png')
+
+def _upload_thumbnail_url(upload, legacy_url):
+    """Thumbnail URL for a certificate/document image, if one was generated"""
+    if not (upload.mime_type and upload.mime_type.startswith('image/')):
+        return None
+    if upload.blob is not None:
+        # The thumbnail route falls back to the image itself, so no storage lookup per row
+        return f"/uploads/thumbnails/{upload.blob.sha256}"
+    return legacy_url if os.path.exists(f"web{legacy_url}") else None
+
 @main_bp.route('/api/students/<int:student_id>/certificates', methods=['GET'])
 @role_required(['tvet'])
 def get_student_certificates(student_id):
@@ -402,17 +558,15 @@ def get_student_certificates(student_id):
         if not student:
             return jsonify({'success': False, 'message': 'Student not found'})
         
-        certificates = Certificate.query.filter_by(student_id=student_id).all()
+        certificates = Certificate.query.options(joinedload(Certificate.blob)).filter_by(student_id=student_id).all()
         certificates_data = []
         
         for cert in certificates:
             cert_dict = cert.to_dict()
             # Add thumbnail path for images
-            if cert.mime_type and cert.mime_type.startswith('image/'):
-                thumb_filename = f"thumb_{cert.filename}"
-                thumb_path = f"/static/uploads/certificates/{thumb_filename}"
-                if os.path.exists(f"web{thumb_path}"):
-                    cert_dict['thumbnail'] = thumb_path
+            thumbnail = _upload_thumbnail_url(cert, f"/static/uploads/certificates/thumb_{cert.filename}")
+            if thumbnail:
+                cert_dict['thumbnail'] = thumbnail
             certificates_data.append(cert_dict)
         
         return jsonify({'success': True, 'certificates': certificates_data})
@@ -438,47 +592,202 @@ def upload_certificate(student_id):
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'message': 'File type not allowed'})
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
+        # Get MIME type
+        mime_type = file.content_type
         
-        if file_size > MAX_FILE_SIZE:
+        # Stream into the deduplicated blob store (size is checked while streaming)
+        try:
+            blob = blobstore.store(file.stream, mime_type=mime_type, max_size=MAX_FILE_SIZE)
+        except blobstore.UploadTooLarge:
+            metrics.uploads_total.inc(kind='certificate', result='rejected')
             return jsonify({'success': False, 'message': 'File size exceeds 16MB limit'})
+        file_size = blob.size
         
         # Generate unique filename
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
-        
-        # Ensure upload directory exists
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        
-        # Save file
-        file.save(file_path)
-        
-        # Get MIME type
-        mime_type = file.content_type
         
         # Generate thumbnail for images
-        generate_thumbnail(file_path, mime_type)
+        generate_blob_thumbnail(blob, mime_type)
         
         # Save to database
         certificate = Certificate(
             student_id=student_id,
             filename=unique_filename,
             original_name=filename,
-            file_path=file_path,
+            file_path=blob.storage_key,
             file_size=file_size,
-            mime_type=mime_type
+            mime_type=mime_type,
+            blob_id=blob.id
         )
         
         db.session.add(certificate)
         db.session.commit()
         
+        metrics.uploads_total.inc(kind='certificate', result='success')
+        metrics.upload_bytes_total.inc(file_size, kind='certificate')
         return jsonify({'success': True, 'message': 'Certificate uploaded successfully'})
         
     except Exception as e:
+        db.session.rollback()
+        metrics.uploads_total.inc(kind='certificate', result='error')
+        return jsonify({'success': False, 'message': str(e)})
+
+THUMBNAIL_WORKERS = min(4, os.cpu_count() or 1)
+
+def _generate_blob_thumbnails(items):
+    """generate_blob_thumbnail() for many (blob, mime_type) pairs on a thread pool (PIL releases the GIL)"""
+    app = current_app._get_current_object()
+
+    def generate(item):
+        with app.app_context():
+            generate_blob_thumbnail(*item)
+
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail') as pool:
+        list(pool.map(generate, items))
+
+@main_bp.route('/api/certificates/batch', methods=['POST'])
+@role_required(['tvet'])
+def upload_certificate_batch():
+    """
+    Upload many certificates at once (see web/utils/certificate_batch.py for matching).
+    
+    Form fields: file (a ZIP archive) or files (several files), and batch to only
+    match students of that batch. Matched files are stored, thumbnailed on a
+    thread pool and registered in one transaction; every file gets a result.
+    """
+    try:
+        batch = request.form.get('batch', '').strip()
+        archive = request.files.get('file')
+        uploads = [upload for upload in request.files.getlist('files') if upload and upload.filename]
+        
+        manifest = None
+        try:
+            if archive and archive.filename:
+                if not archive.filename.lower().endswith('.zip'):
+                    return jsonify({'success': False, 'message': 'Upload a ZIP archive or select several files'})
+                entries, manifest = certificate_batch.read_zip(archive.stream)
+            elif uploads:
+                entries = [
+                    certificate_batch.Entry(os.path.basename(upload.filename), None, lambda upload=upload: upload.stream)
+                    for upload in uploads
+                ]
+            else:
+                return jsonify({'success': False, 'message': 'No file selected'})
+        except ImportFileError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        students = db.session.query(Student.id, Student.name)
+        if batch:
+            students = students.filter(Student.batch == batch)
+        matcher = certificate_batch.StudentMatcher(students.all())
+        
+        results = []
+        matched = []
+        for entry in entries:
+            if not allowed_file(entry.name):
+                results.append({'name': entry.name, 'status': 'skipped', 'message': 'File type not allowed'})
+            elif entry.size is not None and entry.size > MAX_FILE_SIZE:
+                results.append({'name': entry.name, 'status': 'skipped', 'message': 'File size exceeds 16MB limit'})
+            else:
+                student_id, reason = matcher.match(entry.name, manifest)
+                if reason:
+                    results.append({'name': entry.name, 'status': 'skipped', 'message': reason})
+                else:
+                    matched.append((entry, student_id))
+        
+        # Each entry is streamed from the archive straight into the blob store
+        certificates = []
+        thumbnails = {}
+        for entry, student_id in matched:
+            mime_type = certificate_batch.mime_type_of(entry.name)
+            try:
+                with entry.open() as stream:
+                    blob = blobstore.store(stream, mime_type=mime_type, max_size=MAX_FILE_SIZE)
+            except blobstore.UploadTooLarge:
+                metrics.uploads_total.inc(kind='certificate', result='rejected')
+                results.append({'name': entry.name, 'status': 'skipped', 'message': 'File size exceeds 16MB limit'})
+                continue
+            filename = secure_filename(entry.name)
+            certificates.append(Certificate(
+                student_id=student_id,
+                filename=f"{uuid.uuid4()}_{filename}",
+                original_name=filename,
+                file_path=blob.storage_key,
+                file_size=blob.size,
+                mime_type=mime_type,
+                blob_id=blob.id
+            ))
+            if mime_type.startswith('image/'):
+                thumbnails[blob.sha256] = (blob, mime_type)
+            results.append({'name': entry.name, 'status': 'uploaded', 'message': '', 'student_id': student_id})
+        
+        _generate_blob_thumbnails(list(thumbnails.values()))
+        
+        db.session.add_all(certificates)
+        db.session.commit()
+        
+        for certificate in certificates:
+            metrics.uploads_total.inc(kind='certificate', result='success')
+            metrics.upload_bytes_total.inc(certificate.file_size, kind='certificate')
+        skipped = len(results) - len(certificates)
+        return jsonify({
+            'success': True,
+            'message': f"Uploaded {len(certificates)} certificate(s)" + (f"; {skipped} file(s) skipped" if skipped else ''),
+            'uploaded': len(certificates),
+            'skipped': skipped,
+            'files': results
+        })
+    except Exception as e:
+        db.session.rollback()
+        metrics.uploads_total.inc(kind='certificate', result='error')
+        return jsonify({'success': False, 'message': str(e)})
+
+@main_bp.route('/api/certificates/generate', methods=['POST'])
+@role_required(['tvet'])
+def generate_batch_certificates():
+    """
+    Generate a certificate PDF for every student of a batch (see web/utils/certificate_pdf.py).
+    
+    JSON fields: batch and title (required), issued_on (YYYY-MM-DD, default
+    today), heading, signatory and signatory_position (defaults from config).
+    Students who already have a certificate with this title are skipped.
+    """
+    try:
+        data = request.get_json() or {}
+        batch = (data.get('batch') or '').strip()
+        title = ' '.join((data.get('title') or '').split())
+        if not batch or not title:
+            return jsonify({'success': False, 'message': 'Batch and title are required'})
+        if len(title) > certificate_pdf.MAX_TITLE_LENGTH:
+            return jsonify({'success': False, 'message': f'Title must be at most {certificate_pdf.MAX_TITLE_LENGTH} characters'})
+        try:
+            issued_on = datetime.strptime(data['issued_on'], '%Y-%m-%d').date() if data.get('issued_on') else datetime.now().date()
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid issued_on date (use YYYY-MM-DD)'})
+        if not Student.query.filter_by(batch=batch).first():
+            return jsonify({'success': False, 'message': f'No students in batch {batch}'})
+        
+        config = current_app.config
+        template = certificate_pdf.CertificateTemplate(
+            title=title,
+            heading=(data.get('heading') or '').strip() or 'Certificate of Completion',
+            issued_on=issued_on,
+            signatory=(data.get('signatory') or config.get('CERTIFICATE_SIGNATORY', '')).strip(),
+            signatory_position=(data.get('signatory_position') or config.get('CERTIFICATE_SIGNATORY_POSITION', '')).strip(),
+            logo=reports.logo_png(os.path.join(current_app.static_folder, 'img', 'logo.png'))
+        )
+        result = certificate_pdf.generate_for_batch(
+            batch, template,
+            workers=config.get('CERTIFICATE_WORKERS') or None,
+            pool_min=config.get('CERTIFICATE_POOL_MIN', certificate_pdf.POOL_MIN_STUDENTS)
+        )
+        message = f"Generated {result['generated']} certificate(s)"
+        if result['skipped']:
+            message += f"; {result['skipped']} student(s) already had one"
+        return jsonify({'success': True, 'message': message, **result})
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
 @main_bp.route('/api/certificates/<int:certificate_id>', methods=['DELETE'])
@@ -490,15 +799,9 @@ def delete_certificate(certificate_id):
         if not certificate:
             return jsonify({'success': False, 'message': 'Certificate not found'})
         
-        # Delete file from filesystem
-        if os.path.exists(certificate.file_path):
-            os.remove(certificate.file_path)
-        
-        # Delete thumbnail if it exists
-        thumb_filename = f"thumb_{certificate.filename}"
-        thumb_path = os.path.join(os.path.dirname(certificate.file_path), thumb_filename)
-        if os.path.exists(thumb_path):
-            os.remove(thumb_path)
+        # Blob-backed files are freed when their last reference is deleted
+        if certificate.blob_id is None:
+            _remove_legacy_upload(certificate)
         
         # Delete from database
         db.session.delete(certificate)
@@ -510,11 +813,112 @@ def delete_certificate(certificate_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
+def _remove_legacy_upload(upload):
+    """Delete a pre-blob-store upload file and its thumbnail once the delete commits"""
+    blobstore.remove_after_commit(upload.file_path)
+    blobstore.remove_after_commit(os.path.join(os.path.dirname(upload.file_path), f"thumb_{upload.filename}"))
+
+def _upload_members(uploads, folder_of=None):
+    """zipstream members for certificates/documents, read from the blob store or the legacy upload path"""
+    storage = get_storage()
+    for upload in uploads:
+        name = zipstream.safe_component(upload.original_name)
+        if folder_of is not None:
+            name = f"{folder_of(upload)}/{name}"
+        if upload.blob is not None:
+            opener = lambda key=upload.blob.storage_key: storage.open(key)
+        else:
+            opener = lambda path=upload.file_path: open(path, 'rb')
+        yield zipstream.Member(name, upload.upload_date, opener)
+
+def _zip_response(members, download_name):
+    """Stream a ZIP of members; nothing is buffered beyond one chunk"""
+    response = Response(stream_with_context(zipstream.stream_zip(members)), mimetype='application/zip',
+                        direct_passthrough=True)
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@main_bp.route('/api/students/<int:student_id>/certificates/download', methods=['GET'])
+@role_required(['tvet'])
+def download_student_certificates(student_id):
+    """Download all certificates of a student as one ZIP"""
+    student = Student.query.get(student_id)
+    if not student:
+        return jsonify({'success': False, 'message': 'Student not found'}), 404
+    certificates = (Certificate.query.options(joinedload(Certificate.blob))
+                    .filter_by(student_id=student_id).order_by(Certificate.id).all())
+    if not certificates:
+        return jsonify({'success': False, 'message': 'This student has no certificates'}), 404
+    download_name = f"{zipstream.safe_component(student.name, 'student')} certificates.zip"
+    return _zip_response(_upload_members(certificates), download_name)
+
+@main_bp.route('/api/certificates/download', methods=['GET'])
+@role_required(['tvet'])
+def download_batch_certificates():
+    """Download the certificates of every student in a batch as one ZIP, one folder per student"""
+    batch = request.args.get('batch', '').strip()
+    if not batch:
+        return jsonify({'success': False, 'message': 'Batch is required'}), 400
+    certificates = (Certificate.query.join(Student).options(joinedload(Certificate.blob), joinedload(Certificate.student))
+                    .filter(Student.batch == batch).order_by(Student.name, Student.id, Certificate.id).all())
+    if not certificates:
+        return jsonify({'success': False, 'message': 'No certificates found for this batch'}), 404
+
+    def folder_of(certificate):
+        # The id keeps students who share a name apart
+        return f"{zipstream.safe_component(certificate.student.name, 'student')} ({certificate.student_id})"
+
+    download_name = f"Batch {zipstream.safe_component(batch, 'batch')} certificates.zip"
+    return _zip_response(_upload_members(certificates, folder_of), download_name)
+
 @main_bp.route('/uploads/certificates/<filename>')
 def uploaded_file(filename):
     """Serve uploaded files"""
+    certificate = Certificate.query.options(joinedload(Certificate.blob)).filter_by(filename=filename).first()
+    if certificate and certificate.blob:
+        return blobstore.send_blob(certificate.blob, download_name=certificate.original_name, mimetype=certificate.mime_type)
     return send_from_directory('../static/uploads/certificates', filename)
 
+@main_bp.route('/uploads/thumbnails/<name>')
+def uploaded_thumbnail(name):
+    """Serve the thumbnail of an image blob (<sha256>) or video blob (<sha256>.jpg)"""
+    sha256, _, extension = name.partition('.')
+    if len(sha256) != 64 or not all(c in '0123456789abcdef' for c in sha256) or extension not in ('', 'jpg'):
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    video = extension == 'jpg'
+    storage = get_storage()
+    thumb_key = blobstore.thumbnail_key(sha256, video=video)
+    if storage.exists(thumb_key):
+        return storage.send(thumb_key, mimetype='image/jpeg' if video else 'image/png', etag=sha256, max_age=86400)
+    blob = None if video else Blob.query.filter_by(sha256=sha256).first()
+    if blob is None:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    # No thumbnail could be generated; the image itself is the best preview
+    return blobstore.send_blob(blob)
+
+@main_bp.route('/uploads/previews/<sha256>.jpg')
+def uploaded_preview(sha256):
+    """Serve the JPEG preview of an image blob (finance receipts)"""
+    if len(sha256) != 64 or not all(c in '0123456789abcdef' for c in sha256):
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    storage = get_storage()
+    key = blobstore.preview_key(sha256)
+    if storage.exists(key):
+        return storage.send(key, mimetype='image/jpeg', etag=f'{sha256}-preview', max_age=86400)
+    blob = Blob.query.filter_by(sha256=sha256).first()
+    if blob is None:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    return blobstore.send_blob(blob)
+
+@main_bp.route('/uploads/blobs/<sha256>/<path:download_name>')
+def uploaded_blob(sha256, download_name):
+    """Serve blob content by hash (used for finance receipts)"""
+    blob = Blob.query.filter_by(sha256=sha256).first()
+    if not blob:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    return blobstore.send_blob(blob, download_name=download_name)
+
 # Employee Management Routes
 EMPLOYEE_UPLOAD_FOLDER = 'web/static/uploads/employee_documents'
 
@@ -527,7 +931,7 @@ def get_employees():
         department = session.get('selected_role', '').upper()
         search = request.args.get('search', '').strip()
         
-        query = Employee.query.filter_by(department=department)
+        query = Employee.listing_query().filter(Employee.department == department)
         if search:
             query = query.filter(
                 Employee.name.contains(search) | 
@@ -535,10 +939,11 @@ def get_employees():
                 Employee.job_description.contains(search)
             )
         
+        # Document counts come from a grouped subquery instead of loading every document
         employees = query.order_by(Employee.name).all()
-        employees_data = [employee.to_dict() for employee in employees]
+        employees_data = serialize_rows(employees, formats={'created_at': DATETIME_FORMAT, 'updated_at': DATETIME_FORMAT})
         
-        return jsonify({'success': True, 'employees': employees_data})
+        return json_response({'success': True, 'employees': employees_data})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -623,15 +1028,10 @@ def delete_employee(employee_id):
         if not employee:
             return jsonify({'success': False, 'message': 'Employee not found'})
         
-        # Delete all associated documents first
+        # Delete all associated legacy document files first (blobs are released with the rows)
         for document in employee.documents:
-            if os.path.exists(document.file_path):
-                os.remove(document.file_path)
-            # Delete thumbnail if it exists
-            thumb_filename = f"thumb_{document.filename}"
-            thumb_path = os.path.join(os.path.dirname(document.file_path), thumb_filename)
-            if os.path.exists(thumb_path):
-                os.remove(thumb_path)
+            if document.blob_id is None:
+                _remove_legacy_upload(document)
         
         db.session.delete(employee)
         db.session.commit()
@@ -655,23 +1055,36 @@ def get_employee_documents(employee_id):
         if not employee:
             return jsonify({'success': False, 'message': 'Employee not found'})
         
-        documents = EmployeeDocument.query.filter_by(employee_id=employee_id).all()
+        documents = EmployeeDocument.query.options(joinedload(EmployeeDocument.blob)).filter_by(employee_id=employee_id).all()
         documents_data = []
         
         for doc in documents:
             doc_dict = doc.to_dict()
             # Add thumbnail path for images
-            if doc.mime_type and doc.mime_type.startswith('image/'):
-                thumb_filename = f"thumb_{doc.filename}"
-                thumb_path = f"/static/uploads/employee_documents/{department.lower()}/{thumb_filename}"
-                if os.path.exists(f"web{thumb_path}"):
-                    doc_dict['thumbnail'] = thumb_path
+            thumbnail = _upload_thumbnail_url(doc, f"/static/uploads/employee_documents/{department.lower()}/thumb_{doc.filename}")
+            if thumbnail:
+                doc_dict['thumbnail'] = thumbnail
             documents_data.append(doc_dict)
         
         return jsonify({'success': True, 'documents': documents_data})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@main_bp.route('/api/employees/<int:employee_id>/documents/download', methods=['GET'])
+@role_required(['tvet', 'lpaf'])
+def download_employee_documents(employee_id):
+    """Download all documents of an employee as one ZIP"""
+    department = session.get('selected_role', '').upper()
+    employee = Employee.query.filter_by(id=employee_id, department=department).first()
+    if not employee:
+        return jsonify({'success': False, 'message': 'Employee not found'}), 404
+    documents = (EmployeeDocument.query.options(joinedload(EmployeeDocument.blob))
+                 .filter_by(employee_id=employee_id).order_by(EmployeeDocument.id).all())
+    if not documents:
+        return jsonify({'success': False, 'message': 'This employee has no documents'}), 404
+    download_name = f"{zipstream.safe_component(employee.name, 'employee')} documents.zip"
+    return _zip_response(_upload_members(documents), download_name)
+
 @main_bp.route('/api/employees/<int:employee_id>/documents', methods=['POST'])
 @role_required(['tvet', 'lpaf'])
 def upload_employee_document(employee_id):
@@ -694,47 +1107,45 @@ def upload_employee_document(employee_id):
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'message': 'File type not allowed'})
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
+        # Get MIME type
+        mime_type = file.content_type
         
-        if file_size > MAX_FILE_SIZE:
+        # Stream into the deduplicated blob store (size is checked while streaming)
+        try:
+            blob = blobstore.store(file.stream, mime_type=mime_type, max_size=MAX_FILE_SIZE)
+        except blobstore.UploadTooLarge:
+            metrics.uploads_total.inc(kind='employee_document', result='rejected')
             return jsonify({'success': False, 'message': 'File size exceeds 16MB limit'})
+        file_size = blob.size
         
         # Generate unique filename
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(EMPLOYEE_UPLOAD_FOLDER, unique_filename)
-        
-        # Ensure upload directory exists
-        os.makedirs(EMPLOYEE_UPLOAD_FOLDER, exist_ok=True)
-        
-        # Save file
-        file.save(file_path)
-        
-        # Get MIME type
-        mime_type = file.content_type
         
         # Generate thumbnail for images
-        generate_thumbnail(file_path, mime_type)
+        generate_blob_thumbnail(blob, mime_type)
         
         # Save to database
         document = EmployeeDocument(
             employee_id=employee_id,
             filename=unique_filename,
             original_name=filename,
-            file_path=file_path,
+            file_path=blob.storage_key,
             file_size=file_size,
-            mime_type=mime_type
+            mime_type=mime_type,
+            blob_id=blob.id
         )
         
         db.session.add(document)
         db.session.commit()
         
+        metrics.uploads_total.inc(kind='employee_document', result='success')
+        metrics.upload_bytes_total.inc(file_size, kind='employee_document')
         return jsonify({'success': True, 'message': 'Document uploaded successfully'})
         
     except Exception as e:
+        db.session.rollback()
+        metrics.uploads_total.inc(kind='employee_document', result='error')
         return jsonify({'success': False, 'message': str(e)})
 
 @main_bp.route('/api/employee_documents/<int:document_id>', methods=['DELETE'])
@@ -752,15 +1163,9 @@ def delete_employee_document(document_id):
         if not document:
             return jsonify({'success': False, 'message': 'Document not found'})
         
-        # Delete file from filesystem
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        
-        # Delete thumbnail if it exists
-        thumb_filename = f"thumb_{document.filename}"
-        thumb_path = os.path.join(os.path.dirname(document.file_path), thumb_filename)
-        if os.path.exists(thumb_path):
-            os.remove(thumb_path)
+        # Blob-backed files are freed when their last reference is deleted
+        if document.blob_id is None:
+            _remove_legacy_upload(document)
         
         # Delete from database
         db.session.delete(document)
@@ -1087,19 +1492,22 @@ def get_lpaf_materials():
     """Get LPAF materials"""
     try:
         folder_id = request.args.get('folder_id', type=int)
+        limit = max(0, min(request.args.get('limit', 0, type=int), INVENTORY_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
         
-        query = LPAFInventoryMaterial.query
+        query = LPAFInventoryMaterial.listing_query()
         if folder_id:
-            query = query.filter_by(folder_id=folder_id)
+            query = query.filter(LPAFInventoryMaterial.folder_id == folder_id)
         
-        materials = query.order_by(
-            LPAFInventoryMaterial.created_at.desc(),
-            LPAFInventoryMaterial.id.desc()
-        ).all()
+        materials, next_cursor = _paginate_materials(query, LPAFInventoryMaterial, limit, cursor)
 
-        materials_data = [material.to_dict() for material in materials]
+        materials_data = serialize_rows(
+            materials,
+            formats={'created_at': 'iso', 'updated_at': 'iso'},
+            defaults={'item_code': '', 'description': ''}
+        )
         
-        return jsonify({'success': True, 'materials': materials_data})
+        return json_response({'success': True, 'materials': materials_data, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -1638,24 +2046,25 @@ def delete_tvet_remark(remark_id):
 @main_bp.route('/api/tvet/inventory/materials', methods=['GET'])
 @role_required('tvet')
 def get_tvet_materials():
-    """Get TVET materials"""
+    """Get TVET materials (all of them, or one page when limit is given)"""
     try:
         folder_id = request.args.get('folder_id')
+        limit = max(0, min(request.args.get('limit', 0, type=int), INVENTORY_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
         
-        query = TVETInventoryMaterial.query
+        query = TVETInventoryMaterial.listing_query()
         if folder_id:
-            query = query.filter_by(folder_id=folder_id)
+            query = query.filter(TVETInventoryMaterial.folder_id == folder_id)
         
-        materials = query.order_by(
-            TVETInventoryMaterial.created_at.desc(),
-            TVETInventoryMaterial.id.desc()
-        ).all()
+        materials, next_cursor = _paginate_materials(query, TVETInventoryMaterial, limit, cursor)
 
-        materials_data = []
-        for material in materials:
-            materials_data.append(material.to_dict())
+        materials_data = serialize_rows(
+            materials,
+            formats={'created_at': 'iso', 'updated_at': 'iso'},
+            defaults={'specification': ''}
+        )
         
-        return jsonify({'success': True, 'materials': materials_data})
+        return json_response({'success': True, 'materials': materials_data, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -1812,9 +2221,130 @@ def delete_tvet_material(material_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
+# TVET Inventory Dashboard
+tvet_dashboard_cache = VersionedCache()
+
+def _tvet_inventory_totals(key_column=None, lookup_model=None, folder_id=None):
+    """Aggregate required / on-site / Y1 / Y2 quantities and shortages, optionally grouped by a lookup"""
+    material = TVETInventoryMaterial
+    columns = [
+        func.count(material.id).label('materials'),
+        func.coalesce(func.sum(material.quantity_required), 0).label('quantity_required'),
+        func.coalesce(func.sum(material.quantity_on_site), 0).label('quantity_on_site'),
+        func.coalesce(func.sum(material.quantity_y1), 0).label('quantity_y1'),
+        func.coalesce(func.sum(material.quantity_y2), 0).label('quantity_y2'),
+        func.coalesce(func.sum(material.difference), 0).label('difference'),
+        func.coalesce(func.sum(case((material.difference < 0, 1), else_=0)), 0).label('shortage_items'),
+        func.coalesce(func.sum(case((material.difference < 0, -material.difference), else_=0)), 0).label('shortage_quantity')
+    ]
+    
+    if key_column is None:
+        query = db.session.query(*columns)
+    else:
+        query = db.session.query(key_column.label('id'), lookup_model.name.label('name'), *columns) \
+            .outerjoin(lookup_model, key_column == lookup_model.id) \
+            .group_by(key_column, lookup_model.name) \
+            .order_by(desc('shortage_quantity'), lookup_model.name)
+    
+    if folder_id:
+        query = query.filter(material.folder_id == folder_id)
+    
+    return serialize_rows(query.all())
+
+def _build_tvet_dashboard(folder_id):
+    totals = _tvet_inventory_totals(folder_id=folder_id)
+    return {
+        'totals': totals[0] if totals else {},
+        'by_folder': _tvet_inventory_totals(TVETInventoryMaterial.folder_id, TVETInventoryFolder, folder_id),
+        'by_competency': _tvet_inventory_totals(TVETInventoryMaterial.competency_id, TVETCoreCompetency, folder_id),
+        'by_category': _tvet_inventory_totals(TVETInventoryMaterial.category_id, TVETCategory, folder_id)
+    }
+
+@main_bp.route('/api/tvet/inventory/dashboard', methods=['GET'])
+@role_required('tvet')
+def get_tvet_inventory_dashboard():
+    """Get TVET inventory totals and shortages grouped by folder, competency and category"""
+    try:
+        folder_id = request.args.get('folder_id', type=int)
+        
+        # Served from cache until the next write to TVET inventory data
+        version = DataVersion.get('tvet_inventory')
+        dashboard = tvet_dashboard_cache.get_or_compute(
+            ('dashboard', folder_id), version, lambda: _build_tvet_dashboard(folder_id)
+        )
+        
+        return json_response({'success': True, 'version': version, **dashboard})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+# Inventory Report PDFs
+REPORT_GROUP_COLUMNS = {
+    'tvet': {
+        'competency': (TVETCoreCompetency.name, TVETInventoryMaterial.item),
+        'folder': (TVETInventoryFolder.name, TVETInventoryMaterial.item),
+        'category': (TVETCategory.name, TVETInventoryMaterial.item),
+    },
+    'lpaf': {
+        'production': (LPAFProduction.name, LPAFInventoryMaterial.item_name),
+        'folder': (LPAFInventoryFolder.name, LPAFInventoryMaterial.item_name),
+        'status': (LPAFStatus.name, LPAFInventoryMaterial.item_name),
+    },
+}
+
+def _inventory_report_response(department, model, default_group):
+    """Serve the cached inventory report PDF for the current data version, building it on a miss"""
+    group_by = request.args.get('group_by', default_group)
+    folder_id = request.args.get('folder_id', type=int)
+    if group_by not in REPORT_GROUP_COLUMNS[department]:
+        return jsonify({'success': False, 'message': f'Invalid group_by: {group_by}'}), 400
+
+    def build(path):
+        group_column, item_column = REPORT_GROUP_COLUMNS[department][group_by]
+        # Unassigned rows last, then alphabetical within each group
+        query = model.listing_query().order_by(group_column.is_(None), group_column, item_column, model.id)
+        if folder_id:
+            query = query.filter(model.folder_id == folder_id)
+        reports.build_inventory_report(
+            path, department,
+            (row._mapping for row in query.yield_per(500)),
+            group_by,
+            logo_path=os.path.join(current_app.static_folder, 'img', 'logo.png'),
+            prepared_by=current_app.config.get('REPORT_PREPARED_BY', ''),
+            approved_by=current_app.config.get('REPORT_APPROVED_BY', '')
+        )
+
+    version = DataVersion.get(f'{department}_inventory')
+    key = f'{department}_{group_by}_{folder_id or "all"}'
+    path = reports.cached_report_path(current_app.config['REPORT_CACHE_DIR'], key, version, build)
+
+    download_name = f'{department.upper()}_Inventory_Report_{datetime.now().strftime("%Y-%m-%d")}.pdf'
+    return send_file(path, mimetype='application/pdf', as_attachment=True,
+                     download_name=download_name, max_age=0)
+
+@main_bp.route('/api/tvet/inventory/report', methods=['GET'])
+@role_required('tvet')
+def tvet_inventory_report():
+    """Download the TVET inventory report PDF (group_by: competency, folder or category)"""
+    try:
+        return _inventory_report_response('tvet', TVETInventoryMaterial, 'competency')
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@main_bp.route('/api/lpaf/inventory/report', methods=['GET'])
+@role_required('lpaf')
+def lpaf_inventory_report():
+    """Download the LPAF inventory report PDF (group_by: production, folder or status)"""
+    try:
+        return _inventory_report_response('lpaf', LPAFInventoryMaterial, 'production')
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @main_bp.route('/uploads/employee_documents/<filename>')
 def uploaded_employee_document(filename):
     """Serve uploaded employee document files"""
+    document = EmployeeDocument.query.options(joinedload(EmployeeDocument.blob)).filter_by(filename=filename).first()
+    if document and document.blob:
+        return blobstore.send_blob(document.blob, download_name=document.original_name, mimetype=document.mime_type)
     return send_from_directory('../static/uploads/employee_documents', filename)
 
 # Study Folder and Video Management Routes
@@ -1826,18 +2356,43 @@ MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500MB
 def allowed_video_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_VIDEO_EXTENSIONS
 
-def generate_video_thumbnail(video_path, thumbnail_path, timestamp=1.0):
+def generate_video_thumbnail(video_path, thumbnail_path, timestamp=None):
     """
-    Generate a thumbnail from a video file at a specific timestamp.
+    Generate a thumbnail from a video file.
     
     Args:
         video_path: Path to the video file
         thumbnail_path: Path where thumbnail should be saved
-        timestamp: Time in seconds to capture the frame (default: 1 second)
+        timestamp: Time in seconds to capture the frame. By default the best-scoring
+            of several sampled frames is used (VIDEO_POSTER_SELECTION='best'), falling
+            back to the frame at 1 second.
     
     Returns:
         bool: True if successful, False otherwise
     """
+    with metrics.thumbnail_duration_seconds.time(kind='video'):
+        success = False
+        if timestamp is None and current_app.config.get('VIDEO_POSTER_SELECTION', 'best') == 'best':
+            success = _capture_best_video_frame(video_path, thumbnail_path)
+        if not success:
+            success = _capture_video_frame(video_path, thumbnail_path, timestamp if timestamp is not None else 1.0)
+    metrics.thumbnails_total.inc(kind='video', result='success' if success else 'failure')
+    return success
+
+def _capture_best_video_frame(video_path, thumbnail_path):
+    """Save the best-looking sampled frame as a JPEG thumbnail"""
+    try:
+        frame = video_previews.select_poster_frame(video_path)
+        if frame is None:
+            return False
+        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).save(thumbnail_path, 'JPEG', quality=85, optimize=True)
+        return True
+    except Exception as e:
+        print(f"Error selecting poster frame: {str(e)}")
+        return False
+
+def _capture_video_frame(video_path, thumbnail_path, timestamp):
+    """Grab the frame at timestamp and save it as a JPEG thumbnail"""
     try:
         # Open the video file
         video = cv2.VideoCapture(video_path)
@@ -1893,18 +2448,71 @@ def get_study_folders():
     try:
         parent_id = request.args.get('parent_id', type=int)
         
+        # Counts come from grouped subqueries instead of loading every child row
+        query = StudyFolder.listing_query()
         if parent_id is not None:
             # Get folders in specific parent
-            folders = StudyFolder.query.filter_by(parent_folder_id=parent_id).all()
+            query = query.filter(StudyFolder.parent_folder_id == parent_id)
         elif request.args.get('root_only') == 'true':
             # Get only root folders (no parent)
-            folders = StudyFolder.query.filter_by(parent_folder_id=None).all()
+            query = query.filter(StudyFolder.parent_folder_id.is_(None))
+        
+        folders_data = serialize_rows(
+            query.order_by(StudyFolder.name, StudyFolder.id).all(),
+            formats={'created_at': DATETIME_FORMAT, 'updated_at': DATETIME_FORMAT}
+        )
+        return json_response({'success': True, 'folders': folders_data})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+def _nest_folders(rows, root_id=None):
+    """Turn flat tree rows (ordered by depth) into nested dicts with 'children'"""
+    nodes = {}
+    roots = []
+    for row in rows:
+        node = dict(row, children=[])
+        nodes[node['id']] = node
+        parent = nodes.get(node['parent_folder_id'])
+        if parent is not None and node['id'] != root_id:
+            parent['children'].append(node)
         else:
-            # Get all folders
-            folders = StudyFolder.query.all()
+            roots.append(node)
+    return roots
+
+@main_bp.route('/api/study/folders/tree', methods=['GET'])
+@role_required('lpaf')
+def get_study_folder_tree():
+    """Get the folder hierarchy (or the subtree under root_id) with breadcrumbs and recursive video totals"""
+    try:
+        root_id = request.args.get('root_id', type=int)
+        max_depth = request.args.get('max_depth', type=int)
         
-        folders_data = [folder.to_dict() for folder in folders]
-        return jsonify({'success': True, 'folders': folders_data})
+        breadcrumbs = []
+        if root_id is not None:
+            breadcrumbs = StudyFolder.breadcrumbs(root_id)
+            if not breadcrumbs:
+                return jsonify({'success': False, 'message': 'Folder not found'})
+        
+        rows = serialize_rows(
+            StudyFolder.tree_query(root_id, max_depth).all(),
+            formats={'created_at': DATETIME_FORMAT, 'updated_at': DATETIME_FORMAT}
+        )
+        folders = _nest_folders(rows, root_id)
+        
+        totals = {
+            'folders': len(rows),
+            'video_count': sum(folder['total_video_count'] for folder in folders),
+            'video_size': sum(folder['total_video_size'] for folder in folders)
+        }
+        if root_id is None:
+            # Videos outside any folder belong to the root level
+            loose_count, loose_size = db.session.query(
+                func.count(StudyVideo.id), func.coalesce(func.sum(StudyVideo.file_size), 0)
+            ).filter(StudyVideo.folder_id.is_(None)).one()
+            totals['video_count'] += loose_count
+            totals['video_size'] += int(loose_size)
+        
+        return json_response({'success': True, 'breadcrumbs': breadcrumbs, 'folders': folders, 'totals': totals})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -1937,7 +2545,7 @@ def create_study_folder():
         db.session.add(folder)
         db.session.commit()
         
-        return jsonify({'success': True, 'message': 'Folder created successfully', 'folder': folder.to_dict()})
+        return jsonify({'success': True, 'message': 'Folder created successfully', 'folder': folder.to_dict(subfolder_count=0, video_count=0)})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
@@ -1958,12 +2566,28 @@ def update_study_folder(folder_id):
         if not name:
             return jsonify({'success': False, 'message': 'Folder name is required'})
         
+        # Moving the folder: the closure table is updated by the model's mapper events
+        if 'parent_folder_id' in data:
+            parent_folder_id = data.get('parent_folder_id')
+            if parent_folder_id:
+                parent = StudyFolder.query.get(parent_folder_id)
+                if not parent:
+                    return jsonify({'success': False, 'message': 'Parent folder not found'})
+                if folder.is_ancestor_of(parent.id):
+                    return jsonify({'success': False, 'message': 'Cannot move a folder into itself or one of its subfolders'})
+            folder.parent_folder_id = parent_folder_id or None
+        
         folder.name = name
         folder.description = description
         
         db.session.commit()
         
-        return jsonify({'success': True, 'message': 'Folder updated successfully', 'folder': folder.to_dict()})
+        # Read back through the listing query so the folder keeps its subfolder/video counts
+        folder_data = serialize_rows(
+            [StudyFolder.listing_query().filter(StudyFolder.id == folder.id).one()],
+            formats={'created_at': DATETIME_FORMAT, 'updated_at': DATETIME_FORMAT}
+        )[0]
+        return jsonify({'success': True, 'message': 'Folder updated successfully', 'folder': folder_data})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)})
@@ -1996,21 +2620,30 @@ def delete_study_folder(folder_id):
 @main_bp.route('/api/study/videos', methods=['GET'])
 @role_required('lpaf')
 def get_study_videos():
-    """Get all study videos with optional folder filter"""
+    """Get study videos with optional folder filter, subtree scope (recursive=true) and title/description search (q)"""
     try:
         folder_id = request.args.get('folder_id')
-        
-        if folder_id == 'null' or folder_id == 'root':
+        recursive = request.args.get('recursive') == 'true'
+        search = request.args.get('q', '').strip()
+        is_root = folder_id == 'null' or folder_id == 'root'
+        
+        if folder_id and not is_root and recursive:
+            # Videos anywhere under the folder, one indexed join on the closure table
+            query = StudyFolder.subtree_videos_query(int(folder_id))
+        elif is_root and not recursive:
             # Get videos in root (no folder)
-            videos = StudyVideo.query.filter_by(folder_id=None).all()
-        elif folder_id:
+            query = StudyVideo.query.filter_by(folder_id=None)
+        elif folder_id and not is_root:
             # Get videos in specific folder
-            videos = StudyVideo.query.filter_by(folder_id=int(folder_id)).all()
+            query = StudyVideo.query.filter_by(folder_id=int(folder_id))
         else:
             # Get all videos
-            videos = StudyVideo.query.all()
+            query = StudyVideo.query
+        
+        if search:
+            query = StudyVideo.search_filter(query, search).order_by(StudyVideo.title, StudyVideo.id)
         
-        videos_data = [video.to_dict() for video in videos]
+        videos_data = [video.to_dict() for video in query.all()]
         return jsonify({'success': True, 'videos': videos_data})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
@@ -2047,33 +2680,29 @@ def upload_study_video():
         else:
             folder_id = None
         
-        # Check file size
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > MAX_VIDEO_SIZE:
+        # Stream into the deduplicated blob store (size is checked while streaming)
+        try:
+            blob = blobstore.store(file.stream, mime_type=file.content_type, max_size=MAX_VIDEO_SIZE)
+        except blobstore.UploadTooLarge:
+            metrics.uploads_total.inc(kind='study_video', result='rejected')
             return jsonify({'success': False, 'message': 'File size exceeds 500MB limit'})
+        file_size = blob.size
         
         # Generate unique filename
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(STUDY_VIDEO_FOLDER, unique_filename)
         
-        # Ensure upload directories exist
-        os.makedirs(STUDY_VIDEO_FOLDER, exist_ok=True)
-        os.makedirs(STUDY_THUMBNAIL_FOLDER, exist_ok=True)
+        # Generate thumbnail (stored next to the blob, so re-uploads of the same video reuse it)
+        def build_thumbnail(thumbnail_path):
+            with blobstore.local_copy(blob) as video_path:
+                return generate_video_thumbnail(video_path, thumbnail_path)
         
-        # Save file
-        file.save(file_path)
-        
-        # Generate thumbnail
-        thumbnail_filename = f"thumb_{unique_filename.rsplit('.', 1)[0]}.jpg"
-        thumbnail_path = os.path.join(STUDY_THUMBNAIL_FOLDER, thumbnail_filename)
-        thumbnail_generated = generate_video_thumbnail(file_path, thumbnail_path)
+        thumbnail_generated = blobstore.put_derived(
+            blobstore.thumbnail_key(blob.sha256, video=True), build_thumbnail, suffix='.jpg', content_type='image/jpeg'
+        )
         
-        # Store relative path for database
-        db_thumbnail_path = f"/static/uploads/study_videos/thumbnails/{thumbnail_filename}" if thumbnail_generated else None
+        # Store thumbnail URL for database
+        db_thumbnail_path = f"/uploads/thumbnails/{blob.sha256}.jpg" if thumbnail_generated else None
         
         # Get MIME type - prefer file extension detection for better compatibility
         mime_type = file.content_type
@@ -2108,20 +2737,29 @@ def upload_study_video():
             description=description,
             filename=unique_filename,
             original_name=filename,
-            file_path=file_path,
+            file_path=blob.storage_key,
             file_size=file_size,
             mime_type=mime_type,
             thumbnail_path=db_thumbnail_path,
-            folder_id=folder_id
+            folder_id=folder_id,
+            blob_id=blob.id
         )
         
+        # Web-optimized renditions and seek previews are built in the background once the upload is committed
+        transcode.request_renditions(video)
+        
         db.session.add(video)
         db.session.commit()
         
+        transcode.submit(video.id)
+        
+        metrics.uploads_total.inc(kind='study_video', result='success')
+        metrics.upload_bytes_total.inc(file_size, kind='study_video')
         return jsonify({'success': True, 'message': 'Video uploaded successfully', 'video': video.to_dict()})
         
     except Exception as e:
         db.session.rollback()
+        metrics.uploads_total.inc(kind='study_video', result='error')
         return jsonify({'success': False, 'message': str(e)})
 
 @main_bp.route('/api/study/videos/<int:video_id>', methods=['PUT'])
@@ -2159,13 +2797,13 @@ def delete_study_video(video_id):
         if not video:
             return jsonify({'success': False, 'message': 'Video not found'})
         
-        # Delete file from filesystem
-        if os.path.exists(video.file_path):
-            os.remove(video.file_path)
+        # Delete file from filesystem after commit (blob-backed files are freed with their last reference)
+        if video.blob_id is None:
+            blobstore.remove_after_commit(video.file_path)
         
-        # Delete thumbnail if it exists
-        if video.thumbnail_path and os.path.exists(video.thumbnail_path):
-            os.remove(video.thumbnail_path)
+        # Delete legacy thumbnail too (blob thumbnails go with the blob)
+        if video.thumbnail_path and video.thumbnail_path.startswith('/static/'):
+            blobstore.remove_after_commit(os.path.join(current_app.root_path, video.thumbnail_path.lstrip('/')))
         
         # Delete from database
         db.session.delete(video)
@@ -2181,7 +2819,14 @@ def delete_study_video(video_id):
 def uploaded_study_video(filename):
     """Serve uploaded video files with proper MIME type"""
     # Get the video from database to retrieve stored MIME type
-    video = StudyVideo.query.filter_by(filename=filename).first()
+    video = StudyVideo.query.options(joinedload(StudyVideo.blob)).filter_by(filename=filename).first()
+    if video and video.blob:
+        # Prefer the faststart MP4 rendition (plays in every browser, starts before it's fully loaded);
+        # the storage backend answers Range requests for seeking
+        mp4 = video.rendition(StudyVideoRendition.MP4)
+        if mp4:
+            return get_storage().send(mp4.storage_key, mimetype='video/mp4', etag=f'{video.blob.sha256}-mp4')
+        return blobstore.send_blob(video.blob, mimetype=video.mime_type)
     
     # Use absolute path from Flask's static folder
     upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'study_videos')
@@ -2201,20 +2846,111 @@ def uploaded_study_video(filename):
     
     return response
 
+@main_bp.route('/uploads/study_videos/<int:video_id>/hls/<path:name>')
+def uploaded_study_video_hls(video_id, name):
+    """Serve the HLS playlists and segments of a video's hls rendition"""
+    video = StudyVideo.query.get(video_id)
+    hls = video.rendition(StudyVideoRendition.HLS) if video else None
+    if not hls or '..' in name.split('/'):
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    key = transcode.hls_prefix(video.blob.sha256) + name
+    storage = get_storage()
+    if not storage.exists(key):
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    extension = os.path.splitext(name)[1]
+    if extension == '.m3u8':
+        # Playlists are tiny and use relative URIs, so they are always served from here
+        playlist = storage.open(key)
+        try:
+            return current_app.response_class(playlist.read(), mimetype=transcode.CONTENT_TYPES[extension])
+        finally:
+            playlist.close()
+    return storage.send(key, mimetype=transcode.CONTENT_TYPES.get(extension), max_age=86400)
+
+@main_bp.route('/uploads/study_videos/<int:video_id>/preview/<name>')
+def uploaded_study_video_preview(video_id, name):
+    """Serve a video's seek-preview sprite sheet (sprite.jpg) and its WebVTT index (sprite.vtt)"""
+    video = StudyVideo.query.get(video_id)
+    if not video or not video.rendition(StudyVideoRendition.PREVIEW) or name not in ('sprite.jpg', 'sprite.vtt'):
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    key = transcode.preview_key(video.blob.sha256, name)
+    if name == 'sprite.vtt':
+        # Served from here so the relative sprite URL in the cues resolves to this route
+        index = get_storage().open(key)
+        try:
+            return current_app.response_class(index.read(), mimetype='text/vtt')
+        finally:
+            index.close()
+    return get_storage().send(key, mimetype='image/jpeg', etag=f'{video.blob.sha256}-sprite', max_age=86400)
+
 # Finance Transaction API Routes
+def _store_receipt(receipt_file):
+    """Store an uploaded receipt in the blob store; returns (receipt URL path, blob id)"""
+    blob = blobstore.store(receipt_file.stream, mime_type=receipt_file.content_type)
+    metrics.uploads_total.inc(kind='finance_receipt', result='success')
+    metrics.upload_bytes_total.inc(blob.size, kind='finance_receipt')
+    return f"uploads/blobs/{blob.sha256}/{secure_filename(receipt_file.filename)}", blob.id
+
+FINANCE_MAX_PAGE_SIZE = 1000
+
+def _finance_cursor(row):
+    """Opaque keyset cursor for a transaction row ordered by (date desc, id desc)"""
+    return f"{row.date.isoformat()}|{row.id}"
+
+def _paginate_finance(query, limit, cursor=None):
+    """
+    Apply newest-first keyset pagination to a finance listing query.
+    
+    Returns:
+        tuple: (rows, next_cursor) - next_cursor is None on the last page
+    """
+    if cursor:
+        date_str, last_id = cursor.rsplit('|', 1)
+        cursor_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        query = query.filter(or_(
+            FinanceTransaction.date < cursor_date,
+            and_(FinanceTransaction.date == cursor_date, FinanceTransaction.id < int(last_id))
+        ))
+    
+    query = query.order_by(FinanceTransaction.date.desc(), FinanceTransaction.id.desc())
+    if not limit:
+        return query.all(), None
+    
+    rows = query.limit(limit + 1).all()
+    next_cursor = _finance_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
 @main_bp.route('/api/finance/transactions', methods=['GET'])
 @role_required(['tvet', 'lpaf'])
 def get_finance_transactions():
-    """Get finance transactions with optional filters"""
+    """
+    Get finance transactions with optional filters.
+    
+    Query args: transaction_type, search, from/to (YYYY-MM-DD, inclusive) and
+    limit/cursor for newest-first keyset paging (no limit returns every match).
+    Totals are only included in the first page (no cursor).
+    """
     try:
         department = session.get('selected_role', '').upper()
         transaction_type = request.args.get('transaction_type')  # 'income' or 'expenses'
         search = request.args.get('search', '').strip()
+        limit = max(0, min(request.args.get('limit', 0, type=int), FINANCE_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        
+        try:
+            date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+            date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid date format. Use YYYY-MM-DD'})
         
-        query = FinanceTransaction.query.filter_by(department=department)
+        query = FinanceTransaction.listing_query().filter(FinanceTransaction.department == department)
         
         if transaction_type:
-            query = query.filter_by(transaction_type=transaction_type)
+            query = query.filter(FinanceTransaction.transaction_type == transaction_type)
+        if date_from:
+            query = query.filter(FinanceTransaction.date >= date_from)
+        if date_to:
+            query = query.filter(FinanceTransaction.date <= date_to)
         
         if search:
             search_term = f'%{search}%'
@@ -2226,22 +2962,36 @@ def get_finance_transactions():
                 )
             )
         
-        transactions = query.order_by(desc(FinanceTransaction.date)).all()
-        transactions_data = [t.to_dict() for t in transactions]
-        
-        # Calculate totals from ALL transactions (not just filtered ones)
-        all_transactions = FinanceTransaction.query.filter_by(department=department).all()
-        total_income = sum(float(t.amount) for t in all_transactions if t.transaction_type == 'income')
-        total_expenses = sum(float(t.amount) for t in all_transactions if t.transaction_type == 'expenses')
-        net_income = total_income - total_expenses
+        transactions, next_cursor = _paginate_finance(query, limit, cursor)
+        transactions_data = serialize_rows(
+            transactions,
+            formats={'date': DATE_FORMAT, 'created_at': DATETIME_FORMAT},
+            defaults={'description': '', 'units': 1, 'amount': 0, 'receipt': '', 'receipt_preview': ''}
+        )
         
-        return jsonify({
+        result = {
             'success': True,
             'transactions': transactions_data,
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_income': net_income
-        })
+            'next_cursor': next_cursor
+        }
+        
+        # Totals cover ALL transactions in the from/to range (not just the type/search
+        # matches); later pages of the same listing already have them
+        if not cursor:
+            totals_query = (
+                db.session.query(FinanceTransaction.transaction_type, func.sum(FinanceTransaction.amount))
+                .filter(FinanceTransaction.department == department)
+            )
+            if date_from:
+                totals_query = totals_query.filter(FinanceTransaction.date >= date_from)
+            if date_to:
+                totals_query = totals_query.filter(FinanceTransaction.date <= date_to)
+            totals = dict(totals_query.group_by(FinanceTransaction.transaction_type).all())
+            result['total_income'] = float(totals.get('income') or 0)
+            result['total_expenses'] = float(totals.get('expenses') or 0)
+            result['net_income'] = result['total_income'] - result['total_expenses']
+        
+        return json_response(result)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
@@ -2292,12 +3042,9 @@ def create_finance_transaction():
                 return jsonify({'success': False, 'message': 'Units must be a non-negative integer'})
 
             receipt_path = None
+            receipt_blob_id = None
             if receipt_file and receipt_file.filename:
-                filename = secure_filename(f"{uuid.uuid4()}_{receipt_file.filename}")
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'finance_receipts')
-                os.makedirs(upload_dir, exist_ok=True)
-                receipt_path = os.path.join('static', 'uploads', 'finance_receipts', filename)
-                receipt_file.save(os.path.join(upload_dir, filename))
+                receipt_path, receipt_blob_id = _store_receipt(receipt_file)
 
             transaction = FinanceTransaction(
                 date=transaction_date,
@@ -2307,11 +3054,15 @@ def create_finance_transaction():
                 units=units,
                 amount=amount,
                 receipt=receipt_path,
+                receipt_blob_id=receipt_blob_id,
                 department=department
             )
 
             db.session.add(transaction)
             db.session.commit()
+            metrics.finance_transactions_total.inc(operation='create', department=department)
+            if receipt_blob_id:
+                receipts.submit(transaction.id)
 
             return jsonify({'success': True, 'message': 'Transaction created successfully', 'transaction': transaction.to_dict()})
         else:
@@ -2368,6 +3119,7 @@ def create_finance_transaction():
 
             db.session.add(transaction)
             db.session.commit()
+            metrics.finance_transactions_total.inc(operation='create', department=department)
 
             return jsonify({'success': True, 'message': 'Transaction created successfully', 'transaction': transaction.to_dict()})
 
@@ -2375,6 +3127,46 @@ def create_finance_transaction():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'An error occurred: {str(e)}'})
 
+@main_bp.route('/api/finance/transactions/import', methods=['POST'])
+@role_required(['tvet', 'lpaf'])
+def import_finance_transactions():
+    """
+    Import transactions from a cashbook/bank CSV export (see web/utils/finance_import.py).
+    
+    Form fields: file, source (used for rows without a source column) and
+    dry_run=1 to validate and find duplicates without saving anything.
+    """
+    try:
+        department = session.get('selected_role', '').upper()
+        csv_file = request.files.get('file')
+        if not csv_file or not csv_file.filename:
+            return jsonify({'success': False, 'message': 'No file selected'})
+        if not csv_file.filename.lower().endswith('.csv'):
+            return jsonify({'success': False, 'message': 'Only CSV files can be imported'})
+        
+        dry_run = request.form.get('dry_run') in ('1', 'true')
+        try:
+            report = finance_import.import_transactions(
+                csv_file.stream, department,
+                default_source=request.form.get('source', '').strip() or None,
+                dry_run=dry_run
+            )
+        except ImportFileError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        if report['imported'] and not dry_run:
+            metrics.finance_transactions_total.inc(report['imported'], operation='import', department=department)
+        verb = 'Would import' if dry_run else 'Imported'
+        return json_response({
+            'success': True,
+            'message': f"{verb} {report['imported']} transaction(s); {report['duplicates']} duplicate(s) and {report['invalid']} invalid row(s) skipped",
+            'dry_run': dry_run,
+            **report
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'An error occurred: {str(e)}'})
+
 @main_bp.route('/api/finance/transactions/<int:transaction_id>', methods=['PUT'])
 @role_required(['tvet', 'lpaf'])
 def update_finance_transaction(transaction_id):
@@ -2422,20 +3214,15 @@ def update_finance_transaction(transaction_id):
                 return jsonify({'success': False, 'message': 'Units must be a non-negative integer'})
 
             if receipt_file and receipt_file.filename:
-                filename = secure_filename(f"{uuid.uuid4()}_{receipt_file.filename}")
-                upload_dir = os.path.join(current_app.root_path, 'static', 'uploads', 'finance_receipts')
-                os.makedirs(upload_dir, exist_ok=True)
-                receipt_path = os.path.join('static', 'uploads', 'finance_receipts', filename)
-                receipt_file.save(os.path.join(upload_dir, filename))
-
-                # Delete old receipt file if exists
-                if transaction.receipt and os.path.exists(transaction.receipt):
-                    try:
-                        os.remove(transaction.receipt)
-                    except:
-                        pass
+                receipt_path, receipt_blob_id = _store_receipt(receipt_file)
+
+                # Delete old legacy receipt file after commit (an old receipt blob is released on commit)
+                if transaction.receipt_blob_id is None and transaction.receipt:
+                    blobstore.remove_after_commit(os.path.join(current_app.root_path, transaction.receipt))
 
                 transaction.receipt = receipt_path
+                transaction.receipt_blob_id = receipt_blob_id
+                transaction.receipt_preview = None
 
             transaction.date = transaction_date
             transaction.transaction_type = transaction_type
@@ -2445,6 +3232,9 @@ def update_finance_transaction(transaction_id):
             transaction.amount = amount
 
             db.session.commit()
+            metrics.finance_transactions_total.inc(operation='update', department=department)
+            if receipt_file and receipt_file.filename:
+                receipts.submit(transaction.id)
 
             return jsonify({'success': True, 'message': 'Transaction updated successfully', 'transaction': transaction.to_dict()})
         else:
@@ -2490,9 +3280,13 @@ def update_finance_transaction(transaction_id):
             transaction.description = description
             transaction.units = units
             transaction.amount = amount
+            if receipt != (transaction.receipt or ''):
+                transaction.receipt_blob_id = None
+                transaction.receipt_preview = None
             transaction.receipt = receipt
 
             db.session.commit()
+            metrics.finance_transactions_total.inc(operation='update', department=department)
 
             return jsonify({'success': True, 'message': 'Transaction updated successfully', 'transaction': transaction.to_dict()})
 
@@ -2513,6 +3307,7 @@ def delete_finance_transaction(transaction_id):
         
         db.session.delete(transaction)
         db.session.commit()
+        metrics.finance_transactions_total.inc(operation='delete', department=department)
         
         return jsonify({'success': True, 'message': 'Transaction deleted successfully'})
         
@@ -0,0 +1,198 @@
+"""
+Content-addressed, deduplicated storage for uploaded files.
+
+Uploads are streamed to a temporary file while their SHA-256 is computed, then
+handed to the storage backend (web/utils/storage.py) under the key
+<aa>/<bb>/<sha256>. Identical content is stored once: a second upload of the
+same bytes reuses the existing Blob row. Reference counts are maintained by the
+session listeners in web/models/blob.py, and a blob's object (and the files
+derived from it, such as thumbnails) is removed after the commit that drops its
+last reference.
+
+File changes follow the transaction outcome: objects written by a transaction
+that rolls back are removed again, and files queued with remove_after_commit()
+are only deleted once the commit succeeded. scripts/reconcile_uploads.py finds
+anything left behind by crashed processes.
+"""
+
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from web.models import db, Blob
+from web.utils.storage import get_storage
+
+CHUNK_SIZE = 1024 * 1024
+THUMBNAIL_SUFFIX = '.thumb.png'
+VIDEO_THUMBNAIL_SUFFIX = '.thumb.jpg'
+MP4_SUFFIX = '.mp4'
+HLS_PREFIX = '.hls/'
+SPRITE_SUFFIX = '.sprite.jpg'
+SPRITE_VTT_SUFFIX = '.sprite.vtt'
+PREVIEW_SUFFIX = '.preview.jpg'
+# Objects derived from a blob, stored next to it and removed with it
+DERIVED_SUFFIXES = (THUMBNAIL_SUFFIX, VIDEO_THUMBNAIL_SUFFIX, MP4_SUFFIX, SPRITE_SUFFIX, SPRITE_VTT_SUFFIX, PREVIEW_SUFFIX)
+DERIVED_PREFIXES = (HLS_PREFIX,)
+
+
+class UploadTooLarge(ValueError):
+    """Raised while streaming an upload that exceeds the allowed size"""
+
+
+def blob_key(sha256):
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def thumbnail_key(sha256, video=False):
+    return blob_key(sha256) + (VIDEO_THUMBNAIL_SUFFIX if video else THUMBNAIL_SUFFIX)
+
+
+def preview_key(sha256):
+    """Larger JPEG preview of an image blob (finance receipts)"""
+    return blob_key(sha256) + PREVIEW_SUFFIX
+
+
+def sha256_of_key(key):
+    """The blob hash a stored key belongs to (its own object or a derived one), else None"""
+    parts = key.split('/')
+    if len(parts) < 3:
+        return None
+    return parts[2].split('.', 1)[0]
+
+
+def _stream_to_temp(stream, max_size):
+    """Copy stream to a scratch file; returns (temp path, sha256, size)"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=get_storage().temp_dir())
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise UploadTooLarge(f'File exceeds {max_size} bytes')
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def store(stream, mime_type=None, max_size=None):
+    """
+    Store the bytes of stream (e.g. a werkzeug FileStorage) and return its Blob.
+
+    The returned blob is flushed (it has an id) but holds no reference yet; the
+    reference is counted when a row pointing at it (blob_id) is flushed. An
+    existing blob stays locked until the transaction ends, so a concurrent
+    request dropping its last reference cannot delete it in the meantime.
+    """
+    tmp_path, sha256, size = _stream_to_temp(stream, max_size)
+    try:
+        # A no-op UPDATE rather than SELECT ... FOR UPDATE, which SQLite ignores: it
+        # takes the row lock (the database write lock on SQLite) that the
+        # ref_count <= 0 delete in web/models/blob.py has to wait for. No row
+        # means it is absent or was just deleted, and the content is stored again.
+        locked = db.session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if locked:
+            return Blob.query.filter_by(sha256=sha256).one()
+
+        get_storage().put_file(blob_key(sha256), tmp_path, content_type=mime_type)
+        # Removed again if this transaction rolls back (see web/models/blob.py)
+        db.session.info.setdefault('blobs_written', set()).add(sha256)
+
+        try:
+            with db.session.begin_nested():
+                blob = Blob(sha256=sha256, size=size, mime_type=mime_type, ref_count=0)
+                db.session.add(blob)
+        except IntegrityError:
+            # Another request stored the same content concurrently
+            blob = Blob.query.filter_by(sha256=sha256).one()
+        return blob
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@contextmanager
+def local_copy(blob):
+    """Local file path holding the blob's bytes, for tools that need one (PIL, OpenCV)"""
+    with get_storage().local_copy(blob.storage_key) as path:
+        yield path
+
+
+def put_derived(key, build, suffix='', content_type=None):
+    """
+    Create a derived object (e.g. a thumbnail) at key unless it already exists.
+
+    build(path) writes the object to a local scratch file and returns True on
+    success. Returns whether the object exists afterwards.
+    """
+    storage = get_storage()
+    if storage.exists(key):
+        return True
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix, dir=storage.temp_dir())
+    os.close(fd)
+    try:
+        if not build(tmp_path):
+            return False
+        storage.put_file(key, tmp_path, content_type=content_type)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_after_commit(path):
+    """Delete a local (pre-blob-store) upload file once the current transaction commits"""
+    db.session.info.setdefault('files_to_remove', set()).add(path)
+
+
+def remove_local_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing {path}: {e}")
+
+
+def remove_files(shas):
+    """Delete the objects of blobs that no longer have a row (called after commit)"""
+    # The session can't emit SQL inside after_commit, so re-check on a separate connection
+    # in case the same content was uploaded again in the meantime
+    with db.engine.connect() as connection:
+        still_used = set(connection.execute(select(Blob.sha256).where(Blob.sha256.in_(list(shas)))).scalars())
+    storage = get_storage()
+    for sha256 in set(shas) - still_used:
+        key = blob_key(sha256)
+        try:
+            for object_key in (key,) + tuple(key + suffix for suffix in DERIVED_SUFFIXES):
+                storage.delete(object_key)
+            for prefix in DERIVED_PREFIXES:
+                storage.delete_prefix(key + prefix)
+        except Exception as e:
+            print(f"Error removing {key}: {e}")
+
+
+def send_blob(blob, download_name=None, mimetype=None, as_attachment=False):
+    """Serve a blob's bytes through the storage backend (with conditional and range support)"""
+    return get_storage().send(
+        blob.storage_key,
+        mimetype=mimetype or blob.mime_type,
+        download_name=download_name,
+        as_attachment=as_attachment,
+        etag=blob.sha256
+    )
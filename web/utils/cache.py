@@ -0,0 +1,46 @@
+"""
+Small in-process cache for values derived from versioned data.
+
+Entries are stored together with the DataVersion they were computed from and
+are recomputed as soon as the version moves on, so a cached aggregate or report
+is served until the next write to its data set.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """LRU cache whose entries are valid for a single data version"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, version, compute):
+        """Return the cached value for (key, version), computing and storing it on a miss"""
+        value = self.get(key, version)
+        if value is None:
+            value = compute()
+            self.set(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
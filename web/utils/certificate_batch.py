@@ -0,0 +1,145 @@
+"""
+Matching the files of a batch certificate upload to students.
+
+A batch upload is a ZIP archive (or several files in one request). Entries are
+listed from the archive's central directory and opened one at a time as
+decompressing streams, so nothing is extracted to disk; each stream goes
+straight into the blob store.
+
+Files are matched to students by, in order:
+
+1. manifest.csv at the top of the archive, with a filename column and either a
+   student id column or a student name column;
+2. the filename: a leading student id ('12_nc2.pdf', '12-nc2.pdf'), or the
+   student's name, optionally followed by '__' and anything else
+   ('Juan_Dela_Cruz.jpg', 'juan dela cruz__nc2.pdf'). Names compare case- and
+   spacing-insensitively; a name shared by several students is ambiguous and
+   the file is not matched (limit the upload to one batch to avoid this).
+"""
+
+import mimetypes
+import os
+import re
+import zipfile
+from collections import namedtuple
+
+from web.utils.imports import ImportFileError, find_column, open_csv
+
+MANIFEST_NAME = 'manifest.csv'
+MAX_ENTRIES = 2000
+
+MANIFEST_COLUMNS = {
+    'filename': ('filename', 'file', 'file name'),
+    'student_id': ('student id', 'id'),
+    'name': ('student name', 'name', 'student'),
+}
+
+# name: file name without directories; open(): binary stream of the content
+Entry = namedtuple('Entry', 'name size open')
+
+_LEADING_ID = re.compile(r'^(\d+)[_\-\s]')
+
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[_\-.]+', ' ', name or '').split()).casefold()
+
+
+def mime_type_of(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def _skipped(path):
+    parts = path.replace('\\', '/').split('/')
+    return parts[0] == '__MACOSX' or any(part.startswith('.') for part in parts)
+
+
+def read_zip(stream):
+    """
+    List the files of a ZIP archive; returns (entries, manifest) where manifest
+    maps file name -> {'student_id', 'name'} or is None without a manifest.csv.
+
+    The archive must stay open while entries are read.
+    """
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ImportFileError('The file is not a valid ZIP archive')
+
+    infos = [info for info in archive.infolist() if not info.is_dir() and not _skipped(info.filename)]
+    manifest_info = next((info for info in infos if info.filename.casefold() == MANIFEST_NAME), None)
+    infos = [info for info in infos if info is not manifest_info]
+    if len(infos) > MAX_ENTRIES:
+        raise ImportFileError(f'The archive has {len(infos)} files; at most {MAX_ENTRIES} can be uploaded at once')
+    if any(info.flag_bits & 0x1 for info in infos):
+        raise ImportFileError('Encrypted archives are not supported')
+
+    entries = [
+        Entry(os.path.basename(info.filename), info.file_size, lambda info=info: archive.open(info))
+        for info in infos
+    ]
+    manifest = None
+    if manifest_info is not None:
+        with archive.open(manifest_info) as manifest_file:
+            manifest = read_manifest(manifest_file)
+    return entries, manifest
+
+
+def read_manifest(stream):
+    headers, rows = open_csv(stream)
+    columns = {field: find_column(headers, aliases) for field, aliases in MANIFEST_COLUMNS.items()}
+    if not columns['filename'] or not (columns['student_id'] or columns['name']):
+        raise ImportFileError(f'{MANIFEST_NAME} needs a filename column and a student id or student name column')
+    manifest = {}
+    for _, row in rows:
+        filename = os.path.basename(row.get(columns['filename'], '').replace('\\', '/'))
+        if filename:
+            manifest[filename] = {
+                'student_id': row.get(columns['student_id'], '') if columns['student_id'] else '',
+                'name': row.get(columns['name'], '') if columns['name'] else '',
+            }
+    return manifest
+
+
+class StudentMatcher:
+    """Finds the student a file belongs to among (id, name) pairs"""
+
+    def __init__(self, students):
+        self.ids = {student_id for student_id, _ in students}
+        self.names = {}
+        for student_id, name in students:
+            self.names.setdefault(normalize_name(name), []).append(student_id)
+
+    def by_id(self, value):
+        try:
+            student_id = int(value)
+        except (TypeError, ValueError):
+            return None, f'Invalid student id: {value}'
+        if student_id not in self.ids:
+            return None, f'No student with id {student_id}'
+        return student_id, None
+
+    def by_name(self, name):
+        matches = self.names.get(normalize_name(name), [])
+        if len(matches) > 1:
+            return None, f'Several students are named {name}'
+        if not matches:
+            return None, f'No student named {name}'
+        return matches[0], None
+
+    def match(self, filename, manifest=None):
+        """(student_id, None) or (None, reason)"""
+        if manifest is not None:
+            row = manifest.get(filename)
+            if row is None:
+                return None, f'Not listed in {MANIFEST_NAME}'
+            if row['student_id']:
+                return self.by_id(row['student_id'])
+            return self.by_name(row['name'])
+
+        stem = os.path.splitext(filename)[0]
+        leading_id = _LEADING_ID.match(stem)
+        if leading_id:
+            student_id, _ = self.by_id(leading_id.group(1))
+            if student_id is not None:
+                return student_id, None
+        return self.by_name(stem.split('__', 1)[0])
@@ -0,0 +1,227 @@
+"""
+Certificates generated for a whole training batch with reportlab.
+
+Every student of the batch gets a one-page landscape PDF drawn straight onto a
+reportlab canvas (no platypus layout pass). Large batches are rendered on a
+process pool, since rendering is CPU-bound and a thread pool would be held to
+one core by the GIL; small batches are rendered in-process where starting the
+workers would cost more than it saves. Workers only render: they receive plain
+(id, name, batch) tuples and return PDF bytes, so they never touch the
+database. The parent stores each PDF in the blob store and registers all
+Certificate rows with one add_all() and a single commit.
+
+PDFs are written with reportlab's invariant mode, so generating the same
+certificate again yields identical bytes and the blob store keeps one copy.
+Students who already have a certificate with the same file name (same title)
+are skipped, which makes re-running a batch harmless.
+"""
+
+import io
+import multiprocessing
+import os
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+
+from web.models import db, Certificate, Student
+from web.utils import blobstore
+from web.utils.reports import ORGANIZATION_ADDRESS, ORGANIZATION_NAME
+
+PAGE_SIZE = landscape(A4)
+BORDER_COLOR = colors.HexColor('#2E7D32')
+POOL_MIN_STUDENTS = 40  # below this, starting worker processes costs more than it saves
+MAX_TITLE_LENGTH = 200  # keeps the file name within Certificate.original_name
+
+# Everything but the student that goes on a certificate; logo is PNG bytes or None
+CertificateTemplate = namedtuple(
+    'CertificateTemplate', 'title heading issued_on signatory signatory_position logo',
+    defaults=('Certificate of Completion', None, '', '', None)
+)
+
+# Set in each pool worker by _init_worker() (the logo is decoded once per process)
+_worker_template = None
+_worker_logo = None
+
+
+def certificate_filename(title):
+    """File name of the generated certificate for title (also used to skip students who have one)"""
+    return secure_filename(f'Certificate - {title}.pdf') or 'Certificate.pdf'
+
+
+def certificate_number(student_id, issued_on):
+    return f'{issued_on:%Y}-{student_id:06d}'
+
+
+def _fitted_font_size(text, font, size, max_width, min_size=10):
+    """Largest font size up to size at which text fits max_width"""
+    while size > min_size and stringWidth(text, font, size) > max_width:
+        size -= 1
+    return size
+
+
+def _draw_centered(pdf, text, font, size, y, max_width):
+    size = _fitted_font_size(text, font, size, max_width)
+    pdf.setFont(font, size)
+    pdf.drawCentredString(PAGE_SIZE[0] / 2, y, text)
+
+
+def render_certificate(output, student, template, logo=None):
+    """
+    Draw one certificate.
+
+    Args:
+        output: File path or binary file object to write to
+        student: (id, name, batch)
+        template: CertificateTemplate
+        logo: ImageReader of template.logo (decoded by the caller to reuse it)
+    """
+    student_id, name, batch = student
+    width, height = PAGE_SIZE
+    center = width / 2
+    text_width = width - 70 * mm
+
+    pdf = canvas.Canvas(output, pagesize=PAGE_SIZE, invariant=1, pageCompression=1)
+    pdf.setTitle(f'{template.heading} - {name}')
+    pdf.setAuthor(ORGANIZATION_NAME)
+    pdf.setSubject(template.title)
+
+    pdf.setStrokeColor(BORDER_COLOR)
+    pdf.setLineWidth(4)
+    pdf.rect(10 * mm, 10 * mm, width - 20 * mm, height - 20 * mm)
+    pdf.setLineWidth(1)
+    pdf.rect(14 * mm, 14 * mm, width - 28 * mm, height - 28 * mm)
+
+    if logo is None and template.logo:
+        logo = ImageReader(io.BytesIO(template.logo))
+    if logo is not None:
+        pdf.drawImage(logo, center - 12 * mm, height - 46 * mm, width=24 * mm, height=24 * mm,
+                      preserveAspectRatio=True, mask='auto')
+
+    pdf.setFillColor(colors.black)
+    _draw_centered(pdf, ORGANIZATION_NAME, 'Helvetica-Bold', 16, height - 54 * mm, text_width)
+    _draw_centered(pdf, ORGANIZATION_ADDRESS, 'Helvetica', 10, height - 60 * mm, text_width)
+
+    pdf.setFillColor(BORDER_COLOR)
+    _draw_centered(pdf, template.heading.upper(), 'Times-Bold', 32, height - 80 * mm, text_width)
+    pdf.setFillColor(colors.black)
+    _draw_centered(pdf, 'This certificate is proudly presented to', 'Times-Italic', 14, height - 93 * mm, text_width)
+
+    _draw_centered(pdf, name, 'Times-BoldItalic', 30, height - 110 * mm, text_width)
+    pdf.setLineWidth(0.8)
+    pdf.setStrokeColor(colors.black)
+    pdf.line(center - 85 * mm, height - 113 * mm, center + 85 * mm, height - 113 * mm)
+
+    _draw_centered(pdf, 'for having successfully completed', 'Times-Italic', 14, height - 124 * mm, text_width)
+    _draw_centered(pdf, template.title, 'Helvetica-Bold', 18, height - 134 * mm, text_width)
+    _draw_centered(pdf, f'Batch {batch}  •  Given on {template.issued_on:%B %d, %Y}', 'Helvetica', 11,
+                   height - 143 * mm, text_width)
+
+    if template.signatory:
+        signature_x = width - 80 * mm
+        pdf.line(signature_x - 45 * mm, 38 * mm, signature_x + 45 * mm, 38 * mm)
+        pdf.setFont('Helvetica-Bold', 11)
+        pdf.drawCentredString(signature_x, 33 * mm, template.signatory)
+        if template.signatory_position:
+            pdf.setFont('Helvetica', 9)
+            pdf.drawCentredString(signature_x, 28 * mm, template.signatory_position)
+
+    pdf.setFont('Helvetica', 8)
+    pdf.setFillColor(colors.grey)
+    pdf.drawString(20 * mm, 20 * mm, f'Certificate No. {certificate_number(student_id, template.issued_on)}')
+
+    pdf.showPage()
+    pdf.save()
+
+
+def _init_worker(template):
+    global _worker_template, _worker_logo
+    # reportlab ASCII85-encodes every stream in pure Python, which makes re-embedding
+    # the logo in each PDF cost more than drawing the rest of it; binary streams are
+    # just as valid. This is a process-wide setting, so it is only changed in workers.
+    rl_config.useA85 = 0
+    _worker_template = template
+    _worker_logo = ImageReader(io.BytesIO(template.logo)) if template.logo else None
+
+
+def _render_bytes(student, template, logo):
+    output = io.BytesIO()
+    render_certificate(output, student, template, logo)
+    return student[0], output.getvalue()
+
+
+def _render(student):
+    """(student id, PDF bytes) for one (id, name, batch) in a process initialized by _init_worker()"""
+    return _render_bytes(student, _worker_template, _worker_logo)
+
+
+def render_all(students, template, workers=None, pool_min=POOL_MIN_STUDENTS):
+    """
+    Yield (student id, PDF bytes) for every (id, name, batch) in students, in order.
+
+    Uses a process pool of workers processes (default: one per CPU) when there
+    are at least pool_min students; even a single worker process renders a
+    large batch much faster than the calling process (see _init_worker()).
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(students) < pool_min:
+        logo = ImageReader(io.BytesIO(template.logo)) if template.logo else None
+        for student in students:
+            yield _render_bytes(student, template, logo)
+        return
+
+    # spawn, not fork: the web process has threads and open database connections
+    context = multiprocessing.get_context('spawn')
+    chunksize = max(1, len(students) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=min(workers, len(students)), mp_context=context,
+                             initializer=_init_worker, initargs=(template,)) as pool:
+        yield from pool.map(_render, students, chunksize=chunksize)
+
+
+def generate_for_batch(batch, template, workers=None, pool_min=POOL_MIN_STUDENTS):
+    """
+    Generate and register certificates for every student in batch.
+
+    Returns {'generated', 'skipped', 'students'}; skipped counts students who
+    already have a certificate with this title.
+    """
+    students = (db.session.query(Student.id, Student.name, Student.batch)
+                .filter(Student.batch == batch).order_by(Student.name, Student.id).all())
+    filename = certificate_filename(template.title)
+    existing = set(db.session.scalars(
+        select(Certificate.student_id)
+        .join(Student, Student.id == Certificate.student_id)
+        .where(Student.batch == batch, Certificate.original_name == filename)
+    ))
+    todo = [tuple(student) for student in students if student.id not in existing]
+
+    certificates = []
+    try:
+        for student_id, pdf in render_all(todo, template, workers=workers, pool_min=pool_min):
+            blob = blobstore.store(io.BytesIO(pdf), mime_type='application/pdf')
+            certificates.append(Certificate(
+                student_id=student_id,
+                filename=f'{uuid.uuid4()}_{filename}',
+                original_name=filename,
+                file_path=blob.storage_key,
+                file_size=blob.size,
+                mime_type='application/pdf',
+                blob_id=blob.id
+            ))
+        # add_all (not a bulk insert) so blob references are counted
+        db.session.add_all(certificates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {'generated': len(certificates), 'skipped': len(existing), 'students': len(students)}
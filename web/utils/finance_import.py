@@ -0,0 +1,241 @@
+"""
+Bulk import of finance transactions from cashbook or bank CSV exports.
+
+Rows are streamed from the file and handled in batches of BATCH_SIZE:
+
+1. Parse and validate the batch. The date format is detected once per batch
+   (the DATE_FORMATS entry that fits the most dates in it), so day-first and
+   month-first exports are told apart without guessing row by row.
+2. Look up the fingerprints of the whole batch in one indexed query
+   (department, fingerprint). Rows matching an existing transaction or an
+   earlier row of the same file are reported as duplicates, so importing the
+   same export twice adds nothing.
+3. Insert the new rows with one bulk insert.
+
+Everything is committed at the end; a dry run reports without inserting.
+Every data row gets a result: imported, duplicate or invalid (with the reason).
+
+Columns are matched by name (see COLUMNS). The type of a row comes from a type
+column, from separate debit/credit columns, or from the sign of the amount
+(negative amounts are expenses).
+"""
+
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import select
+
+from web.models import db, FinanceTransaction
+from web.utils.imports import ImportFileError, chunked, find_column, open_csv
+
+BATCH_SIZE = 1000
+
+# Two-digit years first: '%Y' would also read '24' as the year 24
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%m/%d/%y', '%d/%m/%y', '%m/%d/%Y', '%d/%m/%Y',
+                '%d-%m-%Y', '%d-%b-%Y', '%d %b %Y', '%b %d, %Y')
+
+COLUMNS = {
+    'date': ('date', 'transaction date', 'posting date', 'value date', 'txn date'),
+    'description': ('description', 'items', 'particulars', 'details', 'narration', 'memo', 'remarks'),
+    'source': ('source', 'group', 'payee', 'category', 'account', 'counterparty'),
+    'amount': ('amount', 'value', 'total'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'money out', 'paid out'),
+    'credit': ('credit', 'deposit', 'deposits', 'money in', 'paid in'),
+    'type': ('transaction type', 'type'),
+    'units': ('units', 'qty', 'quantity'),
+}
+
+TYPE_VALUES = {
+    'income': 'income', 'credit': 'income', 'cr': 'income', 'deposit': 'income', 'in': 'income',
+    'expenses': 'expenses', 'expense': 'expenses', 'debit': 'expenses', 'dr': 'expenses',
+    'withdrawal': 'expenses', 'out': 'expenses',
+}
+
+_AMOUNT_JUNK = re.compile(r'[^\d.\-]')
+
+
+class RowError(ValueError):
+    pass
+
+
+def _parse_amount(text):
+    """
+    Decimal from '1,234.50', '₱1,234.50', '(1,234.50)', '-1234.5' or '1.234,50';
+    None if empty
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    # A comma is the decimal separator if it comes after the last dot, or is the
+    # only separator and is not followed by exactly three digits ('1,5' but not '1,500')
+    comma, dot = text.rfind(','), text.rfind('.')
+    if comma > dot and (dot >= 0 or len(text) - comma - 1 != 3 or not text[comma + 1:].isdigit()):
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        amount = Decimal(_AMOUNT_JUNK.sub('', text))
+    except InvalidOperation:
+        raise RowError(f'Invalid amount: {text}')
+    return -amount if negative else amount
+
+
+def _date_format(values):
+    """The DATE_FORMATS entry that parses the most values (earliest on a tie), else None"""
+    best, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = 0
+        for value in values:
+            try:
+                datetime.strptime(value, date_format)
+                count += 1
+            except ValueError:
+                pass
+        if count > best_count:
+            best, best_count = date_format, count
+            if count == len(values):
+                break
+    return best
+
+
+def _parse_date(value, batch_format):
+    for date_format in ((batch_format,) if batch_format else DATE_FORMATS):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise RowError(f'Invalid date: {value}')
+
+
+class _Columns:
+    """Which file column holds each field"""
+
+    def __init__(self, headers):
+        for field, aliases in COLUMNS.items():
+            setattr(self, field, find_column(headers, aliases))
+        missing = []
+        if not self.date:
+            missing.append('date')
+        if not self.description:
+            missing.append('description')
+        if not (self.amount or self.debit or self.credit):
+            missing.append('amount (or debit/credit)')
+        if missing:
+            raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+
+
+def _parse_row(row, columns, batch_format, department, default_source):
+    def value(column):
+        return row.get(column, '') if column else ''
+
+    if not value(columns.date):
+        raise RowError('Date is required')
+    transaction_date = _parse_date(value(columns.date), batch_format)
+
+    description = value(columns.description)
+    if not description:
+        raise RowError('Description is required')
+    source = value(columns.source) or default_source
+    if not source:
+        raise RowError('Source is required')
+
+    debit, credit = _parse_amount(value(columns.debit)), _parse_amount(value(columns.credit))
+    amount = _parse_amount(value(columns.amount))
+    transaction_type = None
+    if value(columns.type):
+        transaction_type = TYPE_VALUES.get(value(columns.type).casefold())
+        if not transaction_type:
+            raise RowError(f'Invalid transaction type: {value(columns.type)}')
+    if amount is None and (debit or credit):
+        if debit and credit:
+            raise RowError('Both debit and credit are set')
+        amount = debit or credit
+        transaction_type = transaction_type or ('expenses' if debit else 'income')
+    if not amount:
+        raise RowError('Amount is required')
+    if transaction_type is None:
+        transaction_type = 'expenses' if amount < 0 else 'income'
+    amount = abs(amount).quantize(Decimal('0.01'))
+    if amount > Decimal('9999999999999.99'):
+        raise RowError('Amount is too large')
+
+    units = 1
+    if value(columns.units):
+        try:
+            units = int(value(columns.units))
+            if units < 0:
+                raise ValueError()
+        except ValueError:
+            raise RowError('Units must be a non-negative integer')
+
+    return {
+        'date': transaction_date,
+        'transaction_type': transaction_type,
+        'source': source[:200],
+        'description': description,
+        'units': units,
+        'amount': amount,
+        'department': department,
+        'fingerprint': FinanceTransaction.make_fingerprint(transaction_date, transaction_type, amount, source[:200], description),
+    }
+
+
+def import_transactions(stream, department, default_source=None, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Import a CSV file of transactions into department.
+
+    Returns {'imported', 'duplicates', 'invalid', 'rows'} where rows holds one
+    {'line', 'status', 'message'} entry per data row. Raises ImportFileError if
+    the file as a whole cannot be read.
+    """
+    headers, rows = open_csv(stream)
+    columns = _Columns(headers)
+    results = []
+    counts = {'imported': 0, 'duplicate': 0, 'invalid': 0}
+    seen = set()
+
+    try:
+        for batch in chunked(rows, batch_size):
+            batch_format = _date_format([row.get(columns.date) for _, row in batch if row.get(columns.date)])
+            parsed = []
+            for line, row in batch:
+                try:
+                    parsed.append((line, _parse_row(row, columns, batch_format, department, default_source)))
+                except RowError as e:
+                    results.append({'line': line, 'status': 'invalid', 'message': str(e)})
+                    counts['invalid'] += 1
+
+            fingerprints = {mapping['fingerprint'] for _, mapping in parsed}
+            existing = set(db.session.scalars(
+                select(FinanceTransaction.fingerprint)
+                .where(FinanceTransaction.department == department)
+                .where(FinanceTransaction.fingerprint.in_(fingerprints))
+            )) if fingerprints else set()
+
+            new_rows = []
+            for line, mapping in parsed:
+                fingerprint = mapping['fingerprint']
+                if fingerprint in existing or fingerprint in seen:
+                    message = 'Already recorded' if fingerprint in existing else 'Repeats an earlier row of this file'
+                    results.append({'line': line, 'status': 'duplicate', 'message': message})
+                    counts['duplicate'] += 1
+                else:
+                    seen.add(fingerprint)
+                    new_rows.append(mapping)
+                    results.append({'line': line, 'status': 'imported', 'message': ''})
+                    counts['imported'] += 1
+            if new_rows and not dry_run:
+                db.session.bulk_insert_mappings(FinanceTransaction, new_rows)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    results.sort(key=lambda result: result['line'])
+    return {
+        'imported': counts['imported'],
+        'duplicates': counts['duplicate'],
+        'invalid': counts['invalid'],
+        'rows': results,
+    }
@@ -0,0 +1,128 @@
+"""
+Shared pieces of the bulk importers (finance CSV, students).
+
+Files are read lazily, one row at a time, so an upload is never loaded into
+memory as a whole; importers validate and insert the rows in fixed-size batches
+(chunked()). Headers are normalized (case, spaces, underscores) so 'Contact No',
+'contact_no' and 'CONTACT NO' name the same column.
+
+XLSX files are read with openpyxl in read-only mode, which streams the sheet
+XML instead of building the workbook in memory. openpyxl is only needed for
+XLSX imports.
+"""
+
+import csv
+import io
+import itertools
+import os
+from datetime import datetime, time
+
+CSV_DELIMITERS = ',;\t|'
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported (unreadable, missing columns)"""
+
+
+def normalize_header(name):
+    return ' '.join(str(name or '').replace('_', ' ').split()).casefold()
+
+
+def open_csv(stream, encoding='utf-8-sig'):
+    """
+    Read a CSV file from a binary stream.
+
+    Returns (headers, rows) where rows lazily yields (line_number, {header: value})
+    with normalized headers and stripped values; blank lines are skipped. The
+    delimiter (comma, semicolon, tab or pipe) is detected from the header line.
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    try:
+        header_line = text.readline()
+    except UnicodeDecodeError:
+        raise ImportFileError(f'The file is not {encoding.replace("-sig", "").upper()} text')
+    if not header_line.strip():
+        raise ImportFileError('The file is empty')
+    try:
+        dialect = csv.Sniffer().sniff(header_line, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(itertools.chain([header_line], text), dialect)
+    headers = [normalize_header(name) for name in next(reader)]
+
+    def rows():
+        try:
+            for values in reader:
+                if not any(value.strip() for value in values):
+                    continue
+                yield reader.line_num, dict(zip(headers, (value.strip() for value in values)))
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ImportFileError(f'Line {reader.line_num + 1}: {e}')
+
+    return headers, rows()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # numbers typed into cells come back as 22.0
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == time() else value.isoformat(sep=' ')
+    return str(value).strip()
+
+
+def open_xlsx(stream):
+    """Read the first sheet of an XLSX workbook; same return value as open_csv()"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('XLSX import requires the openpyxl package; upload a CSV file instead')
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'Could not read the workbook: {e}')
+    sheet = workbook.worksheets[0]
+    cells = sheet.iter_rows(values_only=True)
+    header_row = next(cells, None)
+    if not header_row or not any(header_row):
+        workbook.close()
+        raise ImportFileError('The file is empty')
+    headers = [normalize_header(name) for name in header_row]
+
+    def rows():
+        try:
+            for line, values in enumerate(cells, start=2):
+                texts = [_cell_text(value) for value in values]
+                if any(texts):
+                    yield line, dict(zip(headers, texts))
+        finally:
+            workbook.close()
+
+    return headers, rows()
+
+
+def open_table(stream, filename):
+    """open_csv() or open_xlsx() depending on the file extension"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return open_csv(stream)
+    if extension == '.xlsx':
+        return open_xlsx(stream)
+    raise ImportFileError('Only CSV and XLSX files can be imported')
+
+
+def find_column(headers, aliases):
+    """First of aliases present in headers, else None"""
+    return next((alias for alias in aliases if alias in headers), None)
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,182 @@
+"""
+Per-request SQL query counting and slow-query profiling.
+
+Hooks SQLAlchemy cursor events and Flask request signals to record, for each
+request, the number of queries, total DB time and the slowest statements.
+Results are written as one structured log line per request, exposed as a
+Server-Timing header in debug, and aggregated into a rolling in-memory window
+per endpoint that admins can view at /admin/perf.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, has_request_context, request, request_finished, request_started
+from sqlalchemy import event
+
+logger = logging.getLogger('web.perf')
+
+DEFAULT_WINDOW_SIZE = 500  # samples kept per endpoint
+DEFAULT_SLOW_QUERY_COUNT = 5  # slowest statements kept per request
+MAX_STATEMENT_LENGTH = 300
+
+# Latency histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class RouteStats:
+    """Rolling window of request samples for a single endpoint"""
+
+    def __init__(self, window_size):
+        self.samples = deque(maxlen=window_size)
+        self.total_requests = 0
+        self.slowest_queries = []  # (duration_ms, statement), kept sorted descending
+
+    def add(self, sample, slow_query_count):
+        self.samples.append(sample)
+        self.total_requests += 1
+        merged = self.slowest_queries + sample['slow_queries']
+        merged.sort(key=lambda q: q[0], reverse=True)
+        self.slowest_queries = merged[:slow_query_count]
+
+    def summary(self):
+        durations = sorted(s['duration_ms'] for s in self.samples)
+        count = len(durations)
+        buckets = []
+        remaining = durations
+        for bound in LATENCY_BUCKETS_MS:
+            in_bucket = sum(1 for d in remaining if d <= bound)
+            buckets.append({'le': 'inf' if bound == float('inf') else bound, 'count': in_bucket})
+            remaining = remaining[in_bucket:]
+        return {
+            'total_requests': self.total_requests,
+            'window': count,
+            'p50_ms': round(_percentile(durations, 50), 2),
+            'p95_ms': round(_percentile(durations, 95), 2),
+            'p99_ms': round(_percentile(durations, 99), 2),
+            'max_ms': round(durations[-1], 2) if durations else 0,
+            'avg_queries': round(sum(s['queries'] for s in self.samples) / count, 2) if count else 0,
+            'max_queries': max((s['queries'] for s in self.samples), default=0),
+            'avg_db_ms': round(sum(s['db_ms'] for s in self.samples) / count, 2) if count else 0,
+            'histogram': buckets,
+            'slowest_queries': [{'duration_ms': round(d, 2), 'statement': stmt} for d, stmt in self.slowest_queries],
+        }
+
+
+class PerfRecorder:
+    """Collects per-request query statistics and keeps rolling per-endpoint windows"""
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE, slow_query_count=DEFAULT_SLOW_QUERY_COUNT):
+        self.window_size = window_size
+        self.slow_query_count = slow_query_count
+        self._routes = defaultdict(lambda: RouteStats(self.window_size))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, sample):
+        with self._lock:
+            self._routes[endpoint].add(sample, self.slow_query_count)
+
+    def snapshot(self):
+        """Return summaries for every endpoint, slowest p95 first"""
+        with self._lock:
+            summaries = {endpoint: stats.summary() for endpoint, stats in self._routes.items()}
+        return dict(sorted(summaries.items(), key=lambda item: item[1]['p95_ms'], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+recorder = PerfRecorder()
+
+
+# The start time is kept on the statement's execution context, which is discarded
+# with the statement; a statement that fails never reaches after_cursor_execute
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._perf_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    start = getattr(context, '_perf_start', None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    perf = g.get('_perf')
+    if perf is None:
+        return
+    perf['queries'] += 1
+    perf['db_ms'] += duration_ms
+
+    slow = perf['slow_queries']
+    if len(slow) < recorder.slow_query_count or duration_ms > slow[-1][0]:
+        slow.append((duration_ms, ' '.join(statement.split())[:MAX_STATEMENT_LENGTH]))
+        slow.sort(key=lambda q: q[0], reverse=True)
+        del slow[recorder.slow_query_count:]
+
+
+def _request_started(sender, **extra):
+    g._perf = {'start': time.perf_counter(), 'queries': 0, 'db_ms': 0.0, 'slow_queries': []}
+
+
+def _request_finished(sender, response, **extra):
+    perf = g.pop('_perf', None)
+    if perf is None:
+        return
+    duration_ms = (time.perf_counter() - perf['start']) * 1000
+    endpoint = request.endpoint or 'unmatched'
+
+    sample = {
+        'duration_ms': duration_ms,
+        'queries': perf['queries'],
+        'db_ms': perf['db_ms'],
+        'slow_queries': perf['slow_queries'],
+    }
+    recorder.record(endpoint, sample)
+
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 2),
+        'queries': perf['queries'],
+        'db_ms': round(perf['db_ms'], 2),
+        'slowest_query_ms': round(perf['slow_queries'][0][0], 2) if perf['slow_queries'] else 0,
+    }))
+
+    if sender.config.get('PERF_SERVER_TIMING', sender.debug):
+        response.headers['Server-Timing'] = (
+            f'db;dur={perf["db_ms"]:.2f};desc="{perf["queries"]} queries", '
+            f'app;dur={duration_ms - perf["db_ms"]:.2f}, '
+            f'total;dur={duration_ms:.2f}'
+        )
+
+
+def init_app(app, engine):
+    """Attach query/request instrumentation to the app and its SQLAlchemy engine"""
+    if not app.config.get('PERF_INSTRUMENTATION', True):
+        return
+    recorder.window_size = app.config.get('PERF_WINDOW_SIZE', DEFAULT_WINDOW_SIZE)
+    recorder.slow_query_count = app.config.get('PERF_SLOW_QUERY_COUNT', DEFAULT_SLOW_QUERY_COUNT)
+
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    request_started.connect(_request_started, app)
+    request_finished.connect(_request_finished, app)
@@ -0,0 +1,235 @@
+"""
+Background work for slow media jobs (transcoding, preview generation, receipts).
+
+Every kind of job is a queue registered with register(): a function that does
+the work for one job id, and a find() function that lists the work still to be
+done according to the database. The database is the source of truth, so a job
+lost with its process is found again later. Queues whose jobs mark their rows
+as in progress also register a reset() function, which puts rows left in
+progress by a process that died back to pending.
+
+Jobs run in one of two modes (MEDIA_JOBS_MODE):
+
+thread   Jobs run on small thread pools inside the web process (the heavy
+         lifting happens in ffmpeg subprocesses or in C code that releases the
+         GIL, so threads are enough). Meant for a single process such as the
+         development server; the first request after a start resets and queues
+         the work left unfinished by the previous run.
+worker   Web processes only record the work; scripts/media_worker.py polls the
+         database every MEDIA_POLL_SECONDS and runs it. gunicorn.conf.py starts
+         that process from the gunicorn master, so it is not recycled with the
+         web workers and multi-hour transcodes are not cut short. Run exactly
+         one worker per database: on start it resets all work in progress, and
+         while running it resets work nobody has touched for MEDIA_STALE_SECONDS.
+"""
+
+import logging
+import signal
+import subprocess
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from web.models import db
+
+THREAD, WORKER = 'thread', 'worker'
+
+# run(job_id) does the work; find() returns [(job_id, token)] for unfinished work,
+# where token changes when the work changes (e.g. a new upload for the same row);
+# reset(exclude, stale_before) puts work in progress back to pending, except for
+# the job ids in exclude and work updated after stale_before, and returns the count
+JobQueue = namedtuple('JobQueue', 'run find reset workers_setting')
+
+_queues = {}
+_stopping = threading.Event()
+_processes = set()
+_processes_lock = threading.Lock()
+
+
+class Interrupted(Exception):
+    """The worker is stopping; the job is left unfinished for the next start"""
+
+
+def register(name, run, find, reset=None, workers_setting='MEDIA_WORKERS'):
+    _queues[name] = JobQueue(run, find, reset, workers_setting)
+
+
+def _executor(app, name):
+    executors = app.extensions.setdefault('media_executors', {})
+    executor = executors.get(name)
+    if executor is None:
+        # Created lazily so forked server workers each start their own threads
+        executor = executors[name] = ThreadPoolExecutor(
+            max_workers=app.config.get(_queues[name].workers_setting, 1), thread_name_prefix=f'media-{name}'
+        )
+    return executor
+
+
+def _run(app, fn, args):
+    with app.app_context():
+        try:
+            fn(*args)
+        except Interrupted:
+            logging.info(f'Media job {fn.__name__}{args} interrupted; it will be resumed')
+            db.session.rollback()
+        except Exception:
+            logging.exception(f'Media job {fn.__name__}{args} failed')
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def submit(name, job_id):
+    """
+    Queue a job whose work has been committed. In worker mode this is a no-op:
+    the media worker finds the work in the database.
+    """
+    app = current_app._get_current_object()
+    if app.config.get('MEDIA_JOBS_MODE', THREAD) == WORKER:
+        return None
+    return _executor(app, name).submit(_run, app, _queues[name].run, (job_id,))
+
+
+def run_process(args, timeout):
+    """
+    subprocess.run() for the commands of a job (capturing text output). The
+    process is killed when the worker stops, and Interrupted is raised instead
+    of reporting the command as failed.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    with _processes_lock:
+        _processes.add(process)
+    try:
+        if _stopping.is_set():
+            process.kill()
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+    finally:
+        with _processes_lock:
+            _processes.discard(process)
+    if _stopping.is_set():
+        raise Interrupted()
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+def shutdown(app, wait=True):
+    """
+    Stop the pools. Without wait, queued jobs are cancelled; running jobs still
+    keep the process alive until they return (the interpreter joins pool threads
+    at exit), so their commands are killed to make them return promptly.
+    """
+    if not wait:
+        _stopping.set()
+        with _processes_lock:
+            for process in _processes:
+                process.kill()
+    for executor in app.extensions.pop('media_executors', {}).values():
+        executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _reset(app, exclude=None, stale_before=None):
+    for name, queue in _queues.items():
+        if queue.reset is None:
+            continue
+        try:
+            with app.app_context():
+                count = queue.reset((exclude or {}).get(name, ()), stale_before)
+                db.session.remove()
+        except Exception:
+            logging.exception(f'Could not reset unfinished {name} jobs')
+            continue
+        if count:
+            logging.info(f'Reset {count} unfinished {name} item(s) to pending')
+
+
+def init_app(app):
+    """In thread mode, resume the work left unfinished by the previous run on the first request"""
+    if app.config.get('MEDIA_JOBS_MODE', THREAD) != THREAD:
+        return
+    lock = threading.Lock()
+    resumed = []
+
+    # Not at startup: scripts create the app too, and so does the reloader's parent process
+    @app.before_request
+    def resume_media_jobs():
+        if resumed:
+            return
+        with lock:
+            if resumed:
+                return
+            resumed.append(True)
+        _reset(app)
+        for name, queue in _queues.items():
+            try:
+                with app.app_context():
+                    work = queue.find()
+                    db.session.remove()
+            except Exception:
+                logging.exception(f'Could not look up {name} jobs')
+                continue
+            for job_id, _ in work:
+                _executor(app, name).submit(_run, app, queue.run, (job_id,))
+
+
+def run_worker(app, poll_seconds=None):
+    """Run queued work until SIGTERM/SIGINT (the loop of scripts/media_worker.py)"""
+    poll_seconds = poll_seconds or app.config.get('MEDIA_POLL_SECONDS', 5)
+    wake = threading.Event()
+
+    def stop(signum, frame):
+        _stopping.set()
+        wake.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    in_flight = {name: set() for name in _queues}
+    # Work that was attempted stays out until its token changes, so a job that
+    # cannot complete (e.g. an unreadable file) is not retried in a loop
+    attempted = {name: set() for name in _queues}
+
+    def finished(name, key):
+        in_flight[name].discard(key)
+        attempted[name].add(key)
+        wake.set()
+
+    # Jobs only run here, so whatever is in progress was cut short by the last stop
+    _reset(app)
+    stale_seconds = app.config.get('MEDIA_STALE_SECONDS', 18 * 3600)
+
+    while not _stopping.is_set():
+        # Work left in progress by a process that died since (e.g. a killed script)
+        _reset(app, {name: {job_id for job_id, _ in keys} for name, keys in in_flight.items()},
+               datetime.utcnow() - timedelta(seconds=stale_seconds))
+        for name, queue in _queues.items():
+            try:
+                with app.app_context():
+                    work = queue.find()
+                    db.session.remove()
+            except Exception:
+                logging.exception(f'Could not look up {name} jobs')
+                continue
+            capacity = 2 * app.config.get(queue.workers_setting, 1) - len(in_flight[name])
+            running = {job_id for job_id, _ in in_flight[name]}
+            for key in work:
+                if capacity <= 0:
+                    break
+                if key[0] in running or key in attempted[name]:
+                    continue
+                in_flight[name].add(key)
+                running.add(key[0])
+                future = _executor(app, name).submit(_run, app, queue.run, (key[0],))
+                future.add_done_callback(lambda _, name=name, key=key: finished(name, key))
+                capacity -= 1
+        wake.wait(poll_seconds)
+        wake.clear()
+
+    logging.info('Media worker stopping')
+    shutdown(app, wait=False)
@@ -0,0 +1,354 @@
+"""
+Prometheus-style metrics registry and text exposition.
+
+Counters, gauges and histograms live in process memory. When
+METRICS_MULTIPROC_DIR is configured (e.g. under gunicorn with several workers)
+each process also snapshots its values to <dir>/metrics_<pid>.json, and the
+/metrics endpoint merges every snapshot so the scrape covers all workers:
+counters and histograms are summed across all files (including exited
+workers), gauges are summed across live processes only.
+
+The multiprocess directory should be emptied when the server starts
+(see clear_multiproc_dir()).
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request, request_finished, request_started
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FLUSH_INTERVAL = 1.0  # seconds between snapshot writes in multiprocess mode
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self):
+        return {
+            'type': self.metric_type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'samples': [[list(key), value] for key, value in self._values.items()],
+        }
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.changed()
+
+
+class Gauge(_Metric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = value
+        self._registry.changed()
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.changed()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data['buckets'][i] += 1
+                    break
+            data['sum'] += value
+            data['count'] += 1
+        self._registry.changed()
+
+    def time(self, **labels):
+        """Context manager that observes the elapsed time of its block"""
+        return _Timer(self, labels)
+
+    def state(self):
+        state = super().state()
+        state['buckets'] = list(self.buckets)
+        return state
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and handles multiprocess snapshots"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metrics = {}
+        self.multiproc_dir = None
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric {metric.name} already registered')
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return Gauge(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    def state(self):
+        with self.lock:
+            return {name: metric.state() for name, metric in self.metrics.items()}
+
+    # Multiprocess mode
+
+    def enable_multiprocess(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.multiproc_dir = directory
+        atexit.register(self.flush)
+
+    def changed(self):
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write this process' values to its snapshot file (atomic replace)"""
+        if not self.multiproc_dir:
+            return
+        self._last_flush = time.monotonic()
+        pid = os.getpid()
+        path = os.path.join(self.multiproc_dir, f'metrics_{pid}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'pid': pid, 'metrics': self.state()}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def collect(self):
+        """Return the merged state of all processes (or just this one)"""
+        if not self.multiproc_dir:
+            return self.state()
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(snapshot.get('pid'))
+            for name, state in snapshot['metrics'].items():
+                if state['type'] == 'gauge' and not alive:
+                    continue
+                target = merged.setdefault(name, dict(state, samples={}))
+                for labels, value in state['samples']:
+                    key = tuple(labels)
+                    target['samples'][key] = _merge_value(target['samples'].get(key), value)
+
+        for state in merged.values():
+            state['samples'] = [[list(key), value] for key, value in state['samples'].items()]
+        return merged
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge_value(current, value):
+    if current is None:
+        return value
+    if isinstance(value, dict):
+        return {
+            'buckets': [a + b for a, b in zip(current['buckets'], value['buckets'])],
+            'sum': current['sum'] + value['sum'],
+            'count': current['count'] + value['count'],
+        }
+    return current + value
+
+
+def clear_multiproc_dir(directory):
+    """Remove stale snapshot files; call once when the server (master) starts"""
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+def generate_latest(state):
+    """Render merged metric state in the Prometheus text exposition format"""
+    lines = []
+    for name in sorted(state):
+        metric = state[name]
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        labelnames = metric['labelnames']
+        for labels, value in sorted(metric['samples']):
+            if metric['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric['buckets'], value['buckets']):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f'{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}')
+                le = 'le="+Inf"'
+                lines.append(f'{name}_bucket{_format_labels(labelnames, labels, le)} {value["count"]}')
+                lines.append(f'{name}_sum{_format_labels(labelnames, labels)} {_format_number(value["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labelnames, labels)} {value["count"]}')
+            else:
+                lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Application metrics
+http_requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests by endpoint, method and status', ('endpoint', 'method', 'status'))
+http_request_duration_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint',))
+http_requests_in_progress = registry.gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled')
+login_attempts_total = registry.counter(
+    'login_attempts_total', 'Login attempts by result', ('result',))
+role_checks_total = registry.counter(
+    'role_checks_total', 'role_required checks by role and result', ('role', 'result'))
+uploads_total = registry.counter(
+    'uploads_total', 'File uploads by kind and result', ('kind', 'result'))
+upload_bytes_total = registry.counter(
+    'upload_bytes_total', 'Bytes accepted by upload handlers', ('kind',))
+thumbnails_total = registry.counter(
+    'thumbnails_total', 'Thumbnail generation attempts by kind and result', ('kind', 'result'))
+thumbnail_duration_seconds = registry.histogram(
+    'thumbnail_duration_seconds', 'Thumbnail generation time by kind', ('kind',))
+transcodes_total = registry.counter(
+    'transcodes_total', 'Study video rendition builds by kind and result', ('kind', 'result'))
+transcode_duration_seconds = registry.histogram(
+    'transcode_duration_seconds', 'Study video rendition build time by kind', ('kind',),
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+finance_transactions_total = registry.counter(
+    'finance_transactions_total', 'Finance transaction writes by operation and department', ('operation', 'department'))
+db_pool_connections = registry.gauge(
+    'db_pool_connections', 'SQLAlchemy connection pool usage by state', ('state',))
+
+
+def _update_pool_gauges(engine):
+    pool = engine.pool
+    for state, getter in (('size', 'size'), ('checked_out', 'checkedout'), ('overflow', 'overflow'), ('checked_in', 'checkedin')):
+        method = getattr(pool, getter, None)
+        if method is not None:
+            db_pool_connections.set(method(), state=state)
+
+
+def init_app(app, engine):
+    """Record request metrics for the app (the /metrics route lives in main_bp)"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir and not registry.multiproc_dir:
+        registry.enable_multiprocess(multiproc_dir)
+
+    def on_request_started(sender, **extra):
+        g._metrics_start = time.perf_counter()
+        http_requests_in_progress.inc()
+
+    def on_request_finished(sender, response, **extra):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        http_requests_in_progress.dec()
+        endpoint = request.endpoint or 'unmatched'
+        http_requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_request_duration_seconds.observe(time.perf_counter() - start, endpoint=endpoint)
+        _update_pool_gauges(engine)
+
+    request_started.connect(on_request_started, app, weak=False)
+    request_finished.connect(on_request_finished, app, weak=False)
+
+
+def render_metrics(engine):
+    """Build the /metrics response for all (live and exited) worker processes"""
+    _update_pool_gauges(engine)
+    return Response(generate_latest(registry.collect()), content_type=CONTENT_TYPE)
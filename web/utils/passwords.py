@@ -0,0 +1,80 @@
+"""
+Password hashing policy.
+
+The algorithm and cost come from PASSWORD_HASH_METHOD, in Werkzeug's method
+syntax: 'pbkdf2:sha256:<iterations>' or 'scrypt:<n>:<r>:<p>'. Every stored hash
+records the parameters it was made with ('pbkdf2:sha256:1000000$salt$hash'), so
+a hash made with another algorithm or a lower cost than the policy's is
+recognised and replaced with a new one the next time its user logs in
+successfully (the only moment the plain password is available). Hashes that
+cost more than the policy asks for are kept, so lowering the policy never
+weakens existing hashes.
+
+Unknown usernames are checked against a dummy hash made with the same policy,
+so a failed login takes the same time whether or not the user exists.
+"""
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256'  # Werkzeug's default iterations, which rise with new releases
+
+_dummy_hashes = {}
+
+
+def normalize_method(method):
+    """Spell out the parameters Werkzeug would otherwise fill in with its defaults"""
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', '32768', '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        raise ValueError(f'Unsupported password hash method: {method}')
+    if len(parts) > len(defaults):
+        raise ValueError(f'Unsupported password hash method: {method}')
+    return ':'.join(parts + defaults[len(parts):])
+
+
+def policy_method():
+    """The configured hash method with all of its parameters"""
+    try:
+        method = current_app.config.get('PASSWORD_HASH_METHOD') or DEFAULT_METHOD
+    except RuntimeError:  # outside an app context (e.g. one-off scripts)
+        method = DEFAULT_METHOD
+    return normalize_method(method)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=policy_method())
+
+
+def verify(password_hash, password):
+    """Check a password; a missing hash is checked against a dummy one so the timing matches"""
+    if not password_hash:
+        method = policy_method()
+        if method not in _dummy_hashes:
+            _dummy_hashes[method] = generate_password_hash('', method=method)
+        check_password_hash(_dummy_hashes[method], password)
+        return False
+    return check_password_hash(password_hash, password)
+
+
+def _algorithm_and_cost(method):
+    """('pbkdf2:<hash>', iterations) or ('scrypt', n * r * p) of a method"""
+    parts = normalize_method(method).split(':')
+    if parts[0] == 'scrypt':
+        n, r, p = (int(part) for part in parts[1:])
+        return 'scrypt', n * r * p
+    return f'pbkdf2:{parts[1]}', int(parts[2])
+
+
+def needs_rehash(password_hash):
+    """True if the hash uses another algorithm than the policy, or a lower cost"""
+    method = password_hash.split('$', 1)[0]
+    try:
+        algorithm, cost = _algorithm_and_cost(method)
+    except ValueError:
+        return True
+    policy_algorithm, policy_cost = _algorithm_and_cost(policy_method())
+    return algorithm != policy_algorithm or cost < policy_cost
@@ -0,0 +1,153 @@
+"""
+Receipt ingest: normalized archival copies and previews of receipt photos.
+
+Phone photos of receipts are several megabytes each. Uploads are stored as-is
+first so the request returns quickly; a background job (web/utils/media_jobs.py)
+then replaces the receipt with a normalized copy and adds a small preview:
+
+- JPEGs are decoded with Image.draft(), which lets libjpeg scale by 1/2, 1/4
+  or 1/8 while decoding, so a 12-megapixel photo is never fully decoded.
+- The image is turned upright (EXIF orientation), downscaled to at most
+  RECEIPT_MAX_DIMENSION pixels and re-encoded as JPEG or WebP. Nothing from the
+  original metadata (EXIF with GPS position, camera details, XMP, ICC) is kept.
+- The preview is stored next to the archival blob (blobstore.preview_key()).
+
+Both locations are recorded on the transaction (receipt, receipt_preview).
+Files that Pillow cannot read (e.g. PDF receipts) are left untouched.
+Receipts run on their own pool (RECEIPT_WORKERS), apart from video transcodes.
+A receipt image without a preview is unfinished work, so receipts whose job was
+lost with its process are picked up again by the media worker, or by the first
+request after a restart in thread mode.
+scripts/normalize_receipts.py processes receipts uploaded before this existed.
+"""
+
+import os
+import tempfile
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import select
+
+from web.models import db, Blob, FinanceTransaction
+from web.utils import blobstore, media_jobs, metrics
+from web.utils.storage import get_storage
+
+PREVIEW_QUALITY = 75
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+
+
+def _flatten(image):
+    """RGB copy of image; transparent areas become white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def normalize_image(source_path, archive_path, preview_path, max_dimension, preview_dimension,
+                    image_format='JPEG', quality=85):
+    """
+    Write a downscaled, metadata-free archival copy and a preview of an image.
+
+    Raises UnidentifiedImageError if source_path is not an image Pillow can read.
+    """
+    with Image.open(source_path) as original:
+        # Only JPEG supports draft mode; it picks the smallest DCT scale >= the requested size
+        original.draft('RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(original)
+        image = _flatten(image)
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+
+    # A fresh image carries no info dict, so no EXIF/ICC/XMP can leak into the output
+    clean = Image.new('RGB', image.size)
+    clean.paste(image)
+    clean.save(archive_path, image_format, quality=quality, optimize=image_format == 'JPEG')
+
+    preview = clean.copy()
+    preview.thumbnail((preview_dimension, preview_dimension), Image.LANCZOS)
+    preview.save(preview_path, 'JPEG', quality=PREVIEW_QUALITY, optimize=True)
+    return clean.size
+
+
+def _download_name(receipt_path, extension):
+    name = os.path.basename(receipt_path or '') or 'receipt'
+    return os.path.splitext(name)[0] + extension
+
+
+def ingest_receipt(transaction_id):
+    """Replace a transaction's receipt image with its normalized copy and record the preview"""
+    transaction = db.session.get(FinanceTransaction, transaction_id)
+    if transaction is None or transaction.receipt_blob_id is None or transaction.receipt_preview:
+        return
+    original = db.session.get(Blob, transaction.receipt_blob_id)
+    config = current_app.config
+    image_format = config.get('RECEIPT_FORMAT', 'JPEG').upper()
+    extension, mime_type = FORMATS[image_format]
+
+    storage = get_storage()
+    fd, archive_path = tempfile.mkstemp(suffix=extension, dir=storage.temp_dir())
+    os.close(fd)
+    fd, preview_path = tempfile.mkstemp(suffix='.jpg', dir=storage.temp_dir())
+    os.close(fd)
+    try:
+        try:
+            with metrics.thumbnail_duration_seconds.time(kind='receipt'):
+                with blobstore.local_copy(original) as source_path:
+                    normalize_image(
+                        source_path, archive_path, preview_path,
+                        config.get('RECEIPT_MAX_DIMENSION', 2000), config.get('RECEIPT_PREVIEW_DIMENSION', 480),
+                        image_format, config.get('RECEIPT_QUALITY', 85)
+                    )
+        except (UnidentifiedImageError, Image.DecompressionBombError):
+            metrics.thumbnails_total.inc(kind='receipt', result='skipped')
+            return
+        except Exception:
+            metrics.thumbnails_total.inc(kind='receipt', result='failure')
+            raise
+
+        with open(archive_path, 'rb') as archive_file:
+            archive = blobstore.store(archive_file, mime_type=mime_type)
+
+        def build_preview(path):
+            os.replace(preview_path, path)
+            return True
+
+        blobstore.put_derived(blobstore.preview_key(archive.sha256), build_preview, suffix='.jpg', content_type='image/jpeg')
+
+        # The receipt may have been replaced while we were working on the old one
+        db.session.refresh(transaction, with_for_update=True)
+        if transaction.receipt_blob_id != original.id:
+            db.session.rollback()
+            return
+        transaction.receipt = f"uploads/blobs/{archive.sha256}/{_download_name(transaction.receipt, extension)}"
+        transaction.receipt_blob_id = archive.id  # the original blob is released on commit
+        transaction.receipt_preview = f"uploads/previews/{archive.sha256}.jpg"
+        db.session.commit()
+        metrics.thumbnails_total.inc(kind='receipt', result='success')
+    finally:
+        for path in (archive_path, preview_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def pending_jobs():
+    """(transaction id, receipt blob id) for every receipt image without a preview"""
+    return [tuple(row) for row in db.session.execute(
+        select(FinanceTransaction.id, FinanceTransaction.receipt_blob_id)
+        .join(Blob, Blob.id == FinanceTransaction.receipt_blob_id)
+        .where(FinanceTransaction.receipt_preview.is_(None), Blob.mime_type.like('image/%'))
+        .order_by(FinanceTransaction.id)
+    )]
+
+
+def submit(transaction_id):
+    """Ingest a committed transaction's receipt in the background"""
+    return media_jobs.submit('receipts', transaction_id)
+
+
+media_jobs.register('receipts', ingest_receipt, pending_jobs, workers_setting='RECEIPT_WORKERS')
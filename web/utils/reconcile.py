@@ -0,0 +1,182 @@
+"""
+Upload/database consistency checks.
+
+Two stores are compared against the rows that reference them:
+
+    blobs    Objects in the storage backend versus Blob rows. Objects without a
+             row are orphans (e.g. written by a process that died before its
+             transaction ended); rows without an object are missing. Blob rows
+             nobody references and drifted ref_count values are reported too.
+    legacy   Files under static/uploads (uploads from before the blob store)
+             versus the Certificate, EmployeeDocument, StudyVideo and finance
+             receipt paths that still point at them.
+
+Both sides are loaded in bulk (one directory walk or object listing, a few
+column-only queries) and compared with set operations. Anything younger than
+the grace period is skipped, so uploads in flight are never touched.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select, union_all, update
+
+from web.models import db, Blob, Certificate, EmployeeDocument, StudyVideo, FinanceTransaction
+from web.utils import blobstore
+from web.utils.storage import get_storage
+
+DEFAULT_GRACE_SECONDS = 3600
+LEGACY_UPLOAD_PREFIX = 'static/uploads/'
+
+
+def legacy_upload_root():
+    return os.path.join(current_app.root_path, 'static', 'uploads')
+
+
+def _legacy_relpath(path):
+    """Path relative to static/uploads for a stored file path or URL, else None"""
+    if not path:
+        return None
+    path = path.replace('\\', '/')
+    index = path.find(LEGACY_UPLOAD_PREFIX)
+    if index < 0:
+        return None
+    return path[index + len(LEGACY_UPLOAD_PREFIX):]
+
+
+def _scan_files(root):
+    """{relative path: modified timestamp} for every file under root"""
+    files = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    relpath = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    files[relpath] = entry.stat(follow_symlinks=False).st_mtime
+    return files
+
+
+def _expected_legacy_files():
+    """(files rows point at, optional companion files such as thumbnails) relative to static/uploads"""
+    expected, optional = set(), set()
+    for model in (Certificate, EmployeeDocument):
+        rows = db.session.execute(
+            select(model.file_path, model.filename).where(model.blob_id.is_(None))
+        ).all()
+        for file_path, filename in rows:
+            relpath = _legacy_relpath(file_path)
+            if relpath:
+                expected.add(relpath)
+                optional.add(f'{os.path.dirname(relpath)}/thumb_{filename}'.lstrip('/'))
+
+    for file_path, thumbnail_path, blob_id in db.session.execute(
+        select(StudyVideo.file_path, StudyVideo.thumbnail_path, StudyVideo.blob_id)
+    ).all():
+        if blob_id is None and _legacy_relpath(file_path):
+            expected.add(_legacy_relpath(file_path))
+        if _legacy_relpath(thumbnail_path):
+            optional.add(_legacy_relpath(thumbnail_path))
+
+    receipts = db.session.execute(
+        select(FinanceTransaction.receipt).where(FinanceTransaction.receipt_blob_id.is_(None))
+    ).scalars()
+    expected.update(filter(None, map(_legacy_relpath, receipts)))
+    return expected, optional
+
+
+def check_legacy_uploads(grace_seconds=DEFAULT_GRACE_SECONDS):
+    """Orphaned and missing files under static/uploads"""
+    root = legacy_upload_root()
+    files = _scan_files(root)
+    expected, optional = _expected_legacy_files()
+    cutoff = time.time() - grace_seconds
+    orphans = sorted(path for path in files.keys() - expected - optional if files[path] < cutoff)
+    return {
+        'root': root,
+        'files': len(files),
+        'orphans': orphans,
+        'missing': sorted(expected - files.keys()),
+    }
+
+
+def _actual_reference_counts():
+    """{blob id: number of rows referencing it} across all referencing tables"""
+    references = union_all(
+        select(Certificate.blob_id.label('blob_id')).where(Certificate.blob_id.isnot(None)),
+        select(EmployeeDocument.blob_id).where(EmployeeDocument.blob_id.isnot(None)),
+        select(StudyVideo.blob_id).where(StudyVideo.blob_id.isnot(None)),
+        select(FinanceTransaction.receipt_blob_id).where(FinanceTransaction.receipt_blob_id.isnot(None)),
+    ).subquery()
+    return dict(db.session.execute(
+        select(references.c.blob_id, func.count()).group_by(references.c.blob_id)
+    ).all())
+
+
+def check_blobs(grace_seconds=DEFAULT_GRACE_SECONDS):
+    """Orphaned and missing blob objects, unreferenced blob rows and ref_count drift"""
+    rows = db.session.execute(select(Blob.id, Blob.sha256, Blob.ref_count, Blob.created_at)).all()
+    known = {row.sha256 for row in rows}
+    cutoff = time.time() - grace_seconds
+
+    present, orphans, stale_temp = set(), [], []
+    objects = 0
+    for key, size, modified in get_storage().iter_objects():
+        objects += 1
+        if key.startswith('tmp/'):
+            if modified < cutoff:
+                stale_temp.append(key)
+            continue
+        sha256 = blobstore.sha256_of_key(key)
+        if sha256 in known:
+            if key == blobstore.blob_key(sha256):
+                present.add(sha256)
+        elif modified < cutoff:
+            orphans.append(key)
+
+    created_cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    actual = _actual_reference_counts()
+    unreferenced = [
+        row.sha256 for row in rows
+        if not actual.get(row.id) and row.created_at and row.created_at < created_cutoff
+    ]
+    drift = {row.id: actual.get(row.id, 0) for row in rows if row.ref_count != actual.get(row.id, 0)}
+    return {
+        'objects': objects,
+        'orphans': sorted(orphans),
+        'stale_temp': sorted(stale_temp),
+        'missing': sorted(known - present),
+        'unreferenced': sorted(unreferenced),
+        'ref_count_drift': drift,
+    }
+
+
+def repair_blobs(report):
+    """Fix ref counts, drop unreferenced blob rows and delete orphaned objects from check_blobs()"""
+    for blob_id, count in report['ref_count_drift'].items():
+        db.session.execute(update(Blob).where(Blob.id == blob_id).values(ref_count=count))
+    if report['unreferenced']:
+        db.session.execute(
+            delete(Blob).where(Blob.sha256.in_(report['unreferenced'])).where(Blob.ref_count <= 0)
+        )
+        # The objects go once the delete is committed (see web/models/blob.py)
+        db.session.info.setdefault('blob_files_to_delete', set()).update(report['unreferenced'])
+    db.session.commit()
+
+    storage = get_storage()
+    for key in report['orphans'] + report['stale_temp']:
+        storage.delete(key)
+
+
+def remove_legacy_orphans(report):
+    """Delete the orphaned files found by check_legacy_uploads()"""
+    blobstore.remove_local_files(os.path.join(report['root'], path) for path in report['orphans'])
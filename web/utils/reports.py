@@ -0,0 +1,243 @@
+"""
+Server-side inventory report PDFs built with reportlab.
+
+Reports are rendered from flat listing rows (no ORM objects), grouped by a
+lookup column, and written in page-sized table chunks: a single huge platypus
+Table is re-split on every page break, which gets quadratically slower with the
+number of rows. Generated files are cached on disk per data version, so
+repeated exports of unchanged data are served straight from the cache.
+"""
+
+import glob
+import io
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+
+from PIL import Image as PILImage
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+ORGANIZATION_NAME = 'Lonoy Agriventures Corp.'
+ORGANIZATION_ADDRESS = 'Brgy. Lonoy, Sapian, Capiz'
+ROWS_PER_TABLE = 40  # roughly one page; keeps table splitting linear
+LOGO_MAX_PIXELS = 256  # the source logo is ~1000px; embedding it as-is bloats every report
+
+DEPARTMENT_TITLES = {
+    'tvet': 'Technical-Vocational Education and Training (TVET)',
+    'lpaf': 'Livelihood Programs and Activities Fund (LPAF)',
+}
+
+# Columns per report: (header, row key, relative width, align right, wrap text)
+TVET_COLUMNS = [
+    ('Category', 'category_name', 1.2, False, True),
+    ('Item', 'item', 2.0, False, True),
+    ('Specification', 'specification', 3.0, False, True),
+    ('Qty Req', 'quantity_required', 0.7, True, False),
+    ('Qty On Site', 'quantity_on_site', 0.8, True, False),
+    ('Diff', 'difference', 0.6, True, False),
+    ('Inspection Remark', 'inspection_remark', 1.3, False, True),
+    ('Qty Y1', 'quantity_y1', 0.6, True, False),
+    ('Qty Y2', 'quantity_y2', 0.6, True, False),
+]
+
+LPAF_COLUMNS = [
+    ('Item Name', 'item_name', 2.0, False, True),
+    ('Description', 'description', 3.0, False, True),
+    ('Status', 'status_name', 1.2, False, True),
+    ('Item Code', 'item_code', 1.0, False, False),
+]
+
+# Supported groupings per department: group_by -> (row key, heading label, unassigned label)
+TVET_GROUPS = {
+    'competency': ('competency_name', 'Core Competency', 'Unassigned Competency'),
+    'folder': ('folder_name', 'Folder', 'Unassigned Folder'),
+    'category': ('category_name', 'Category', 'Unassigned Category'),
+}
+
+LPAF_GROUPS = {
+    'production': ('production_name', 'Production', 'Unassigned Production'),
+    'folder': ('folder_name', 'Folder', 'Unassigned Folder'),
+    'status': ('status_name', 'Status', 'Unassigned Status'),
+}
+
+_styles = getSampleStyleSheet()
+CELL_STYLE = ParagraphStyle('cell', parent=_styles['Normal'], fontSize=8, leading=10)
+TITLE_STYLE = ParagraphStyle('title', parent=_styles['Heading2'], alignment=TA_CENTER, spaceAfter=2)
+SUBTITLE_STYLE = ParagraphStyle('subtitle', parent=_styles['Normal'], alignment=TA_CENTER, fontSize=10)
+GROUP_STYLE = ParagraphStyle('group', parent=_styles['Heading4'], spaceBefore=10, spaceAfter=4)
+
+TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E0E0E0')),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+
+def _escape(text):
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _cell(row, key, wrap):
+    value = row[key]
+    if value is None:
+        value = ''
+    if key == 'difference' and isinstance(value, int) and value >= 0:
+        value = f'+{value}'
+    return Paragraph(_escape(value), CELL_STYLE) if wrap and value else str(value)
+
+
+@lru_cache(maxsize=4)
+def _logo_png(logo_path, mtime):
+    """Downscaled copy of the logo as PNG bytes (cached per file version)"""
+    with PILImage.open(logo_path) as logo:
+        logo.thumbnail((LOGO_MAX_PIXELS, LOGO_MAX_PIXELS))
+        buffer = io.BytesIO()
+        logo.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def logo_png(logo_path):
+    """Downscaled logo as PNG bytes, or None if there is no logo file"""
+    if not logo_path or not os.path.exists(logo_path):
+        return None
+    return _logo_png(logo_path, os.path.getmtime(logo_path))
+
+
+def _header(department, title, logo_path):
+    story = []
+    text = [
+        Paragraph(ORGANIZATION_NAME, TITLE_STYLE),
+        Paragraph(f'<b>{DEPARTMENT_TITLES[department]}</b>', SUBTITLE_STYLE),
+        Paragraph(ORGANIZATION_ADDRESS, SUBTITLE_STYLE),
+    ]
+    logo = ''
+    logo_bytes = logo_png(logo_path)
+    if logo_bytes:
+        logo = Image(io.BytesIO(logo_bytes), width=22 * mm, height=21 * mm)
+    header = Table([[logo, text, '']], colWidths=['20%', '60%', '20%'], rowHeights=[28 * mm])
+    header.setStyle(TableStyle([
+        ('BOX', (0, 0), (-1, -1), 0.8, colors.black),
+        ('LINEAFTER', (0, 0), (1, 0), 0.8, colors.black),
+        ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    story.append(header)
+    story.append(Spacer(1, 6 * mm))
+    story.append(Paragraph(title, TITLE_STYLE))
+    story.append(Paragraph(f'Generated {datetime.now().strftime("%Y-%m-%d %H:%M")}', SUBTITLE_STYLE))
+    return story
+
+
+def _group_tables(rows, columns, group, available_width):
+    """Yield flowables for each group: a heading followed by page-sized table chunks"""
+    group_key, group_label, unassigned = group
+    total_weight = sum(c[2] for c in columns)
+    col_widths = [available_width * c[2] / total_weight for c in columns]
+    header_row = [c[0] for c in columns]
+    right_aligned = [i for i, c in enumerate(columns) if c[3]]
+
+    style = TableStyle(TABLE_STYLE.getCommands() + [
+        ('ALIGN', (i, 0), (i, -1), 'RIGHT') for i in right_aligned
+    ])
+
+    for group_name, group_rows in groupby(rows, key=lambda r: r[group_key] or unassigned):
+        yield Paragraph(f'{group_label}: {_escape(group_name)}', GROUP_STYLE)
+        chunk = []
+        for row in group_rows:
+            chunk.append([_cell(row, c[1], c[4]) for c in columns])
+            if len(chunk) == ROWS_PER_TABLE:
+                yield _table(header_row, chunk, col_widths, style)
+                chunk = []
+        if chunk:
+            yield _table(header_row, chunk, col_widths, style)
+
+
+def _table(header_row, body, col_widths, style):
+    table = Table([header_row] + body, colWidths=col_widths, repeatRows=1)
+    table.setStyle(style)
+    return table
+
+
+def _signatures(prepared_by, approved_by):
+    table = Table(
+        [[Paragraph(f'<b>Prepared by:</b> {_escape(prepared_by)}', CELL_STYLE),
+          Paragraph(f'<b>Approved by:</b> {_escape(approved_by)}', CELL_STYLE)]],
+        colWidths=['50%', '50%']
+    )
+    return [Spacer(1, 10 * mm), table]
+
+
+def build_inventory_report(output, department, rows, group_by, logo_path=None,
+                           prepared_by='', approved_by=''):
+    """
+    Render an inventory report PDF.
+
+    Args:
+        output: File path or binary file object to write to
+        department: 'tvet' or 'lpaf'
+        rows: Iterable of listing row mappings, already ordered by the group column
+        group_by: Grouping key, see TVET_GROUPS / LPAF_GROUPS
+    """
+    if department == 'tvet':
+        columns, group, pagesize = TVET_COLUMNS, TVET_GROUPS[group_by], landscape(A4)
+    else:
+        columns, group, pagesize = LPAF_COLUMNS, LPAF_GROUPS[group_by], A4
+
+    doc = SimpleDocTemplate(
+        output, pagesize=pagesize,
+        leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=12 * mm,
+        title=f'{department.upper()} Inventory Report', author=ORGANIZATION_NAME
+    )
+
+    def draw_page_number(canvas, document):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawRightString(pagesize[0] - 10 * mm, 6 * mm, f'Page {document.page}')
+        canvas.restoreState()
+
+    story = _header(department, f'{department.upper()} Inventory Report', logo_path)
+    story.extend(_group_tables(rows, columns, group, doc.width))
+    story.extend(_signatures(prepared_by, approved_by))
+    doc.build(story, onFirstPage=draw_page_number, onLaterPages=draw_page_number)
+
+
+def cached_report_path(cache_dir, key, version, build):
+    """
+    Return the path of the cached PDF for (key, version), building it if needed.
+
+    build(path) must write the PDF to path. Files for older versions of the same
+    key are removed once the new one is in place.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'{key}_v{version}.pdf')
+    if os.path.exists(path):
+        return path
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.pdf.tmp')
+    os.close(fd)
+    try:
+        build(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    for stale in glob.glob(os.path.join(cache_dir, f'{key}_v*.pdf')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return path
@@ -0,0 +1,137 @@
+"""
+JSON response helpers for the API list endpoints.
+
+Uses orjson when it is installed (falls back to the stdlib json module) and
+compresses large bodies with brotli or gzip depending on what the client accepts.
+"""
+
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, current_app, request
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+DEFAULT_COMPRESS_MIN_SIZE = 1024  # bytes
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def _default(value):
+    """Serialize types the JSON encoders don't handle natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Encode payload to UTF-8 JSON bytes using the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _negotiate_encoding():
+    """Pick the best content encoding the client accepts, or None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=current_app.config.get('JSON_BROTLI_QUALITY', 4))
+    return gzip.compress(body, compresslevel=current_app.config.get('JSON_GZIP_LEVEL', 6))
+
+
+def json_response(payload, status=200):
+    """
+    Build a JSON response, compressed when the body is large enough.
+
+    Drop-in replacement for jsonify() on endpoints that return big lists.
+    """
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+
+    min_size = current_app.config.get('JSON_COMPRESS_MIN_SIZE', DEFAULT_COMPRESS_MIN_SIZE)
+    if len(body) < min_size:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding:
+        response.set_data(_compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _column_formatter(fmt):
+    """
+    Return a formatter for one column that formats each distinct value only once.
+
+    Date columns repeat heavily (finance rows share a handful of dates per
+    month), so caching per column avoids most strftime/isoformat calls.
+    """
+    cache = {}
+
+    def format_value(value):
+        if value is None:
+            return None
+        try:
+            return cache[value]
+        except KeyError:
+            formatted = value.isoformat() if fmt == 'iso' else value.strftime(fmt)
+            cache[value] = formatted
+            return formatted
+
+    return format_value
+
+
+def serialize_rows(rows, formats=None, defaults=None):
+    """
+    Serialize query result rows into a list of dicts, column by column.
+
+    Args:
+        rows: SQLAlchemy Row objects (from db.session.query(...) / select()) or dicts
+        formats: Mapping of column name -> strftime format or 'iso' for date/datetime columns
+        defaults: Mapping of column name -> value used when the column is None/empty
+
+    Returns:
+        list: One dict per row
+    """
+    formats = formats or {}
+    defaults = defaults or {}
+    if not rows:
+        return []
+
+    mappings = [row if isinstance(row, dict) else row._mapping for row in rows]
+    keys = list(mappings[0].keys())
+    columns = {}
+    for key in keys:
+        values = [m[key] for m in mappings]
+        if key in formats:
+            format_value = _column_formatter(formats[key])
+            values = [format_value(v) for v in values]
+        elif isinstance(next((v for v in values if v is not None), None), Decimal):
+            values = [float(v) if v is not None else None for v in values]
+        if key in defaults:
+            default = defaults[key]
+            values = [v if v else default for v in values]
+        columns[key] = values
+
+    return [dict(zip(keys, row_values)) for row_values in zip(*columns.values())]
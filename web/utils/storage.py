@@ -0,0 +1,309 @@
+"""
+Pluggable storage for uploaded media.
+
+STORAGE_BACKEND selects the driver:
+
+    local  Files under BLOB_STORE_DIR (default). Downloads go through send_file,
+           which handles conditional and Range requests.
+    s3     Any S3-compatible object store (AWS S3, MinIO, ...), configured with
+           STORAGE_S3_BUCKET, STORAGE_S3_ENDPOINT_URL, STORAGE_S3_ACCESS_KEY,
+           STORAGE_S3_SECRET_KEY, STORAGE_S3_REGION and STORAGE_S3_PREFIX.
+           Downloads redirect to a presigned URL, or are streamed through the
+           app (with Range support) when STORAGE_S3_PROXY_DOWNLOADS is set.
+           Requires boto3.
+
+Keys are relative, '/'-separated paths such as 'ab/cd/<sha256>'.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from flask import Response, current_app, redirect, request, send_file
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = Exception
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalStorage:
+    """Files under a root directory on the local filesystem"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+
+    def temp_dir(self):
+        """Scratch directory on the same filesystem, so put_file() is a rename"""
+        directory = os.path.join(self.root, 'tmp')
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def put(self, key, fileobj, content_type=None):
+        """Stream fileobj to key (written to a temp file, then renamed into place)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.temp_dir())
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+            self.put_file(key, tmp_path, content_type)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_file(self, key, local_path, content_type=None):
+        """Move a local file to key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(local_path, path)
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def read_range(self, key, start, length):
+        """Yield length bytes from offset start in chunks"""
+        with self.open(key) as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key):
+        path = self.path(key)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._prune(os.path.dirname(path))
+
+    def _prune(self, directory):
+        """Remove emptied shard directories so scans don't keep walking them"""
+        while directory != self.root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def delete_prefix(self, prefix):
+        """Delete every object whose key starts with prefix (a 'directory' ending in '/')"""
+        path = self.path(prefix.rstrip('/'))
+        shutil.rmtree(path, ignore_errors=True)
+        self._prune(os.path.dirname(path))
+
+    def iter_objects(self):
+        """Yield (key, size, modified timestamp) for every stored object"""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        key = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                        yield key, stat.st_size, stat.st_mtime
+
+    @contextmanager
+    def local_copy(self, key):
+        """Path of a local file holding the object (the file itself for this driver)"""
+        yield self.path(key)
+
+    def send(self, key, mimetype=None, download_name=None, as_attachment=False, etag=True, max_age=None):
+        return send_file(self.path(key), mimetype=mimetype, download_name=download_name,
+                         as_attachment=as_attachment, conditional=True, etag=etag, max_age=max_age)
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket"""
+
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None, region=None,
+                 prefix='', presign_expires=3600, proxy_downloads=False):
+        if boto3 is None:
+            raise RuntimeError('boto3 is required for STORAGE_BACKEND=s3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.presign_expires = presign_expires
+        self.proxy_downloads = proxy_downloads
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            region_name=region or None
+        )
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def temp_dir(self):
+        return tempfile.gettempdir()
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head['ContentLength']
+
+    def put(self, key, fileobj, content_type=None):
+        """Stream fileobj to key (multipart upload for large objects)"""
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, self._key(key), ExtraArgs=extra)
+
+    def put_file(self, key, local_path, content_type=None):
+        """Upload a local file to key and remove the local copy"""
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(local_path, self.bucket, self._key(key), ExtraArgs=extra)
+        os.remove(local_path)
+
+    def open(self, key):
+        """Streaming body of the object"""
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def read_range(self, key, start, length):
+        """Yield length bytes from offset start using a ranged GET"""
+        if length <= 0:
+            return
+        body = self.client.get_object(
+            Bucket=self.bucket, Key=self._key(key), Range=f'bytes={start}-{start + length - 1}'
+        )['Body']
+        try:
+            for chunk in body.iter_chunks(CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def delete_prefix(self, prefix):
+        """Delete every object whose key starts with prefix, 1000 keys per request"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            objects = [{'Key': item['Key']} for item in page.get('Contents', [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+
+    def iter_objects(self):
+        """Yield (key, size, modified timestamp) for every object under the prefix"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):], item['Size'], item['LastModified'].timestamp()
+
+    @contextmanager
+    def local_copy(self, key):
+        """Download the object to a temp file for tools that need a path (PIL, OpenCV)"""
+        suffix = os.path.splitext(key)[1]
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix, dir=self.temp_dir())
+        os.close(fd)
+        try:
+            self.client.download_file(self.bucket, self._key(key), tmp_path)
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+    def presigned_url(self, key, mimetype=None, download_name=None, as_attachment=False):
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if mimetype:
+            params['ResponseContentType'] = mimetype
+        if download_name:
+            disposition = 'attachment' if as_attachment else 'inline'
+            params['ResponseContentDisposition'] = f'{disposition}; filename="{download_name}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=self.presign_expires)
+
+    def send(self, key, mimetype=None, download_name=None, as_attachment=False, etag=True, max_age=None):
+        if not self.proxy_downloads:
+            return redirect(self.presigned_url(key, mimetype, download_name, as_attachment))
+        return _ranged_response(self, key, mimetype, download_name, as_attachment, etag)
+
+
+def _ranged_response(storage, key, mimetype, download_name, as_attachment, etag):
+    """Stream an object through the app, answering single-range requests with 206"""
+    total = storage.size(key)
+    byte_range = request.range
+    start, length, status = 0, total, 200
+    if byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+        range_for_length = byte_range.range_for_length(total)
+        if range_for_length is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{total}'
+            return response
+        start, stop = range_for_length
+        length, status = stop - start, 206
+
+    response = Response(storage.read_range(key, start, length), status=status,
+                        mimetype=mimetype or 'application/octet-stream', direct_passthrough=True)
+    response.headers['Content-Length'] = str(length)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{total}'
+    if isinstance(etag, str):
+        response.set_etag(etag)
+    if download_name:
+        response.headers.set('Content-Disposition', 'attachment' if as_attachment else 'inline',
+                             filename=download_name)
+    return response
+
+
+def create_storage(config):
+    """Build the storage driver selected by STORAGE_BACKEND"""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['BLOB_STORE_DIR'])
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['STORAGE_S3_BUCKET'],
+            endpoint_url=config.get('STORAGE_S3_ENDPOINT_URL'),
+            access_key=config.get('STORAGE_S3_ACCESS_KEY'),
+            secret_key=config.get('STORAGE_S3_SECRET_KEY'),
+            region=config.get('STORAGE_S3_REGION'),
+            prefix=config.get('STORAGE_S3_PREFIX', ''),
+            presign_expires=config.get('STORAGE_S3_PRESIGN_EXPIRES', 3600),
+            proxy_downloads=config.get('STORAGE_S3_PROXY_DOWNLOADS', False)
+        )
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+
+
+def get_storage():
+    """Storage driver of the current app (created on first use)"""
+    storage = current_app.extensions.get('storage')
+    if storage is None:
+        storage = current_app.extensions['storage'] = create_storage(current_app.config)
+    return storage
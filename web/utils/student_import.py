@@ -0,0 +1,173 @@
+"""
+Bulk student enrollment from CSV or XLSX.
+
+Rows are streamed from the file and handled in batches of BATCH_SIZE: each
+batch is validated, checked for students already enrolled in the same batch
+(one query per batch) and inserted with bulk_insert_mappings(). All batches
+share one transaction, so by default a file with any invalid row saves
+nothing; fix the reported rows and upload it again. With skip_invalid the
+valid rows are saved and the invalid ones reported.
+
+Students already enrolled (same name in the same batch, ignoring case and
+spacing) and repeated rows are skipped, so re-importing a file is harmless.
+"""
+
+import re
+
+from sqlalchemy import func, select, tuple_
+
+from web.models import db, Student
+from web.utils.imports import ImportFileError, chunked, find_column, normalize_header, open_table
+
+BATCH_SIZE = 500
+
+COLUMNS = {
+    'batch': ('batch', 'batch no', 'batch code', 'batch name'),
+    'name': ('name', 'full name', 'student name', 'trainee', 'trainee name'),
+    'age': ('age',),
+    'address': ('address', 'home address'),
+    'contact_no': ('contact no', 'contact no.', 'contact number', 'contact', 'phone', 'mobile', 'mobile no'),
+}
+REQUIRED = ('name', 'age', 'address', 'contact_no')
+
+# Column sizes of the students table
+MAX_LENGTHS = {'batch': 50, 'name': 100, 'contact_no': 20}
+CONTACT_CHARACTERS = re.compile(r'^\+?[\d\s()\-./]+$')
+
+
+class RowError(ValueError):
+    pass
+
+
+def _key(batch, name):
+    # Matches lower(trim(...)) in the database for names stored by this importer
+    return (' '.join(batch.split()).lower(), ' '.join(name.split()).lower())
+
+
+def _parse_row(row, columns, default_batch):
+    values = {field: row.get(column, '') if column else '' for field, column in columns.items()}
+    values['batch'] = values['batch'] or default_batch or ''
+
+    missing = [field.replace('_', ' ') for field in ('batch',) + REQUIRED if not values[field]]
+    if missing:
+        raise RowError(f"Missing {', '.join(missing)}")
+    for field, max_length in MAX_LENGTHS.items():
+        if len(values[field]) > max_length:
+            raise RowError(f"{field.replace('_', ' ').capitalize()} is longer than {max_length} characters")
+
+    try:
+        age = int(float(values['age']))
+        if age != float(values['age']) or age <= 0 or age > 150:
+            raise ValueError()
+    except ValueError:
+        raise RowError(f"Age must be a whole number between 1 and 150, not {values['age']}")
+
+    contact_no = ' '.join(values['contact_no'].split())
+    digits = sum(character.isdigit() for character in contact_no)
+    if not CONTACT_CHARACTERS.match(contact_no) or not 7 <= digits <= 15:
+        raise RowError(f"Contact no. must be a phone number (7 to 15 digits), not {values['contact_no']}")
+
+    return {
+        'batch': values['batch'],
+        'name': ' '.join(values['name'].split()),
+        'age': age,
+        'address': values['address'],
+        'contact_no': contact_no,
+    }
+
+
+def import_rows(rows, headers, default_batch=None, skip_invalid=False, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Enroll students from (line_number, {header: value}) rows with normalized headers.
+
+    Returns {'imported', 'valid', 'duplicates', 'invalid', 'saved', 'rows'} where
+    rows holds one {'line', 'status', 'message'} entry per data row; saved tells
+    whether anything was committed. Valid rows are reported as 'imported' when
+    saved and as 'valid' otherwise (dry run, or invalid rows without skip_invalid).
+    """
+    columns = {field: find_column(headers, aliases) for field, aliases in COLUMNS.items()}
+    missing = [field.replace('_', ' ') for field in REQUIRED if not columns[field]]
+    if not columns['batch'] and not default_batch:
+        missing.insert(0, 'batch')
+    if missing:
+        raise ImportFileError(f"Missing column(s): {', '.join(missing)}")
+
+    results = []
+    counts = {'imported': 0, 'duplicate': 0, 'invalid': 0}
+    seen = set()
+    try:
+        for chunk in chunked(rows, batch_size):
+            parsed = []
+            for line, row in chunk:
+                try:
+                    parsed.append((line, _parse_row(row, columns, default_batch)))
+                except RowError as e:
+                    results.append({'line': line, 'status': 'invalid', 'message': str(e)})
+                    counts['invalid'] += 1
+
+            keys = {_key(mapping['batch'], mapping['name']) for _, mapping in parsed}
+            enrolled = set()
+            if keys:
+                normalized_batch, normalized_name = func.lower(func.trim(Student.batch)), func.lower(func.trim(Student.name))
+                enrolled = {
+                    _key(batch, name) for batch, name in db.session.execute(
+                        select(Student.batch, Student.name)
+                        .where(tuple_(normalized_batch, normalized_name).in_(list(keys)))
+                    )
+                }
+
+            new_rows = []
+            for line, mapping in parsed:
+                key = _key(mapping['batch'], mapping['name'])
+                if key in enrolled or key in seen:
+                    message = 'Already enrolled in this batch' if key in enrolled else 'Repeats an earlier row of this file'
+                    results.append({'line': line, 'status': 'duplicate', 'message': message})
+                    counts['duplicate'] += 1
+                else:
+                    seen.add(key)
+                    new_rows.append(mapping)
+                    results.append({'line': line, 'status': 'imported', 'message': ''})
+                    counts['imported'] += 1
+            if new_rows and not dry_run:
+                db.session.bulk_insert_mappings(Student, new_rows)
+
+        saved = not dry_run and counts['imported'] > 0 and (skip_invalid or not counts['invalid'])
+        if saved:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if not saved:
+        # Nothing was written; valid rows would be imported once the file is fixed
+        for result in results:
+            if result['status'] == 'imported':
+                result['status'] = 'valid'
+    results.sort(key=lambda result: result['line'])
+    return {
+        'imported': counts['imported'] if saved else 0,
+        'valid': counts['imported'],
+        'duplicates': counts['duplicate'],
+        'invalid': counts['invalid'],
+        'saved': saved,
+        'rows': results,
+    }
+
+
+def import_students(stream, filename, default_batch=None, skip_invalid=False, dry_run=False):
+    """Enroll students from an uploaded CSV/XLSX file (see import_rows())"""
+    headers, rows = open_table(stream, filename)
+    return import_rows(rows, headers, default_batch=default_batch, skip_invalid=skip_invalid, dry_run=dry_run)
+
+
+def rows_from_dicts(records):
+    """(headers, rows) for import_rows() from plain dicts keyed by column name"""
+    records = list(records)
+    headers = sorted({normalize_header(key) for record in records for key in record})
+    rows = (
+        (line, {normalize_header(key): str(value).strip() for key, value in record.items() if value is not None})
+        for line, record in enumerate(records, start=1)
+    )
+    return headers, rows
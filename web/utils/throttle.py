@@ -0,0 +1,170 @@
+"""
+Token-bucket throttle for login attempts.
+
+Every attempt takes one token from the bucket of its username and client IP
+pair and one from the bucket of its client IP. Buckets hold up to `burst` tokens
+and refill at `per_minute` tokens per minute; an attempt that finds either bucket
+empty is rejected before the user lookup and the (deliberately expensive)
+password hash check, so a flood of bad logins cannot keep every worker busy
+hashing. The username bucket is per client IP so that bad logins from one
+address cannot lock the account out for everyone else.
+
+Behind a reverse proxy the client IP comes from X-Forwarded-For, which is only
+trusted with TRUSTED_PROXY_HOPS set (see create_app()); otherwise every client
+shares the proxy's address and its buckets.
+
+Two backends:
+
+- 'memory': a dict per process. Cheap, but each server worker counts on its own,
+  so the effective limit is multiplied by the number of workers.
+- 'database': rows in login_throttle_buckets, updated in a short transaction of
+  their own, shared by all workers and hosts using the same database.
+
+Set LOGIN_THROTTLE_BACKEND to 'off' to disable throttling.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from web.models import db
+from web.models.login_throttle import LoginThrottleBucket
+
+Limit = namedtuple('Limit', 'burst per_minute')
+
+MAX_MEMORY_BUCKETS = 10000
+
+
+def _refill(tokens, updated_at, limit, now):
+    return min(float(limit.burst), tokens + (now - updated_at) * limit.per_minute / 60.0)
+
+
+def _retry_after(tokens, limit):
+    return (1.0 - tokens) * 60.0 / limit.per_minute
+
+
+class MemoryBuckets:
+    """Buckets held in this process only"""
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, limits, now=None):
+        """
+        Take a token from every bucket in limits ({key: Limit}) if all of them have
+        one; returns 0 on success or the seconds until the attempt would be allowed.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            levels = {}
+            for key, limit in limits.items():
+                tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+                levels[key] = _refill(tokens, updated_at, limit, now)
+            wait = max((_retry_after(tokens, limits[key]) for key, tokens in levels.items() if tokens < 1), default=0)
+            if wait:
+                return wait
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > MAX_MEMORY_BUCKETS:
+                self._prune(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _prune(self, now):
+        # A bucket idle for an hour is full again under any sensible limit
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            if now - updated_at > 3600:
+                del self._buckets[key]
+
+
+class DatabaseBuckets:
+    """Buckets in the database, shared by every process"""
+
+    def acquire(self, limits, now=None):
+        now = time.time() if now is None else now
+        try:
+            return self._acquire(limits, now)
+        except IntegrityError:
+            # Another process created one of the buckets first; its row is there now
+            return self._acquire(limits, now)
+
+    def _acquire(self, limits, now):
+        table = LoginThrottleBucket.__table__
+        with db.engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.key, table.c.tokens, table.c.updated_at)
+                .where(table.c.key.in_(list(limits)))
+                .with_for_update()
+            ).all()
+            stored = {row.key: (row.tokens, row.updated_at) for row in rows}
+            levels = {}
+            for key, limit in limits.items():
+                tokens, updated_at = stored.get(key, (limit.burst, now))
+                levels[key] = _refill(tokens, updated_at, limit, now)
+            wait = max((_retry_after(tokens, limits[key]) for key, tokens in levels.items() if tokens < 1), default=0)
+            if wait:
+                return wait
+
+            for key, tokens in levels.items():
+                if key in stored:
+                    connection.execute(update(table).where(table.c.key == key).values(tokens=tokens - 1, updated_at=now))
+                else:
+                    connection.execute(insert(table).values(key=key, tokens=tokens - 1, updated_at=now))
+            if len(stored) < len(limits):
+                # New buckets are being created; drop the ones that have been full for a while
+                connection.execute(delete(table).where(table.c.updated_at < now - 3600))
+            return 0
+
+    def reset(self, key):
+        table = LoginThrottleBucket.__table__
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.key == key))
+
+
+def get_buckets():
+    """Throttle backend of the current app, or None when throttling is off"""
+    if 'login_throttle' not in current_app.extensions:
+        backend = current_app.config.get('LOGIN_THROTTLE_BACKEND', 'memory')
+        if backend == 'off':
+            buckets = None
+        elif backend == 'memory':
+            buckets = MemoryBuckets()
+        elif backend == 'database':
+            buckets = DatabaseBuckets()
+        else:
+            raise ValueError(f'Unknown LOGIN_THROTTLE_BACKEND: {backend}')
+        current_app.extensions['login_throttle'] = buckets
+    return current_app.extensions['login_throttle']
+
+
+def _user_key(username, ip_address):
+    # Fits LoginThrottleBucket.key (200) with the longest IPv6 address (45)
+    return f'user:{ip_address or "unknown"}:{username.strip().lower()[:140]}'
+
+
+def check_login(username, ip_address):
+    """Take a token for this attempt; returns 0 if it may proceed, else seconds to wait"""
+    buckets = get_buckets()
+    if buckets is None:
+        return 0
+    config = current_app.config
+    limits = {
+        _user_key(username, ip_address): Limit(config['LOGIN_THROTTLE_USER_BURST'], config['LOGIN_THROTTLE_USER_PER_MINUTE']),
+        f'ip:{ip_address or "unknown"}': Limit(config['LOGIN_THROTTLE_IP_BURST'], config['LOGIN_THROTTLE_IP_PER_MINUTE']),
+    }
+    return buckets.acquire(limits)
+
+
+def login_succeeded(username, ip_address):
+    """Refill the username's bucket so earlier typos do not count against the next login"""
+    buckets = get_buckets()
+    if buckets is not None:
+        buckets.reset(_user_key(username, ip_address))
@@ -0,0 +1,323 @@
+"""
+Background transcoding of study videos with a local ffmpeg binary.
+
+Every blob-backed study video gets these renditions (StudyVideoRendition rows):
+
+    mp4      H.264/AAC, at most MP4_MAX_HEIGHT lines, with the moov atom up front
+             (faststart) so playback starts before the whole file is downloaded.
+             Sources that are already H.264/AAC MP4 are only remuxed.
+    hls      A VOD HLS ladder (HLS_LADDER, capped at the source height) with
+             aligned keyframes, so players on slow links can switch to a lower
+             bitrate.
+    preview  A seek-preview sprite sheet and WebVTT index (web/utils/video_previews.py).
+             Built with OpenCV, so it doesn't need ffmpeg.
+
+Outputs are stored next to the source blob (<key>.mp4, <key>.hls/...), so a
+re-upload of the same video reuses them and they are deleted with the blob.
+Jobs run on the media pool (web/utils/media_jobs.py); their status is kept in
+the database, where the media worker finds pending renditions on its own.
+Renditions left 'processing' by a worker that died are reset to pending when
+the media worker starts again (or on the first request in thread mode).
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from web.models import db, StudyVideo, StudyVideoRendition
+from web.utils import blobstore, media_jobs, metrics, video_previews
+from web.utils.storage import get_storage
+
+MP4_MAX_HEIGHT = 720
+HLS_SEGMENT_SECONDS = 6
+# (height, video bitrate, max rate, buffer size, audio bitrate)
+HLS_LADDER = (
+    (360, '800k', '856k', '1200k', '96k'),
+    (720, '2800k', '2996k', '4200k', '128k'),
+    (1080, '5000k', '5350k', '7500k', '192k'),
+)
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+    '.vtt': 'text/vtt',
+    '.jpg': 'image/jpeg',
+}
+FFMPEG_KINDS = (StudyVideoRendition.MP4, StudyVideoRendition.HLS)
+ERROR_TAIL = 2000  # characters of ffmpeg stderr kept on a failed rendition
+
+
+@lru_cache(maxsize=None)
+def _which(binary):
+    return shutil.which(binary)
+
+
+def enabled():
+    """True if transcoding is switched on and the ffmpeg binary is available"""
+    config = current_app.config
+    return config.get('VIDEO_TRANSCODING', True) and _which(config['FFMPEG_BINARY']) is not None
+
+
+def probe(path):
+    """Duration, size and codecs of a media file, from ffprobe"""
+    result = media_jobs.run_process(
+        [current_app.config['FFPROBE_BINARY'], '-v', 'error', '-print_format', 'json',
+         '-show_format', '-show_streams', path],
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'ffprobe failed: {result.stderr[-ERROR_TAIL:]}')
+    data = json.loads(result.stdout or '{}')
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise RuntimeError('No video stream found')
+    duration = data.get('format', {}).get('duration') or video.get('duration')
+    return {
+        'duration': float(duration) if duration else None,
+        'width': int(video.get('width') or 0),
+        'height': int(video.get('height') or 0),
+        'video_codec': video.get('codec_name'),
+        'pix_fmt': video.get('pix_fmt'),
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'format_name': data.get('format', {}).get('format_name', ''),
+    }
+
+
+def _ffmpeg(args, timeout):
+    result = media_jobs.run_process(
+        [current_app.config['FFMPEG_BINARY'], '-hide_banner', '-loglevel', 'error', '-y', *args],
+        timeout=timeout
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'ffmpeg failed: {result.stderr[-ERROR_TAIL:]}')
+
+
+def build_mp4(source, output, info, timeout):
+    """Write a faststart H.264/AAC MP4 of source to output"""
+    remux = (
+        info['video_codec'] == 'h264' and info['pix_fmt'] in ('yuv420p', None)
+        and info['audio_codec'] in ('aac', None)
+        and 'mp4' in info['format_name'] and info['height'] <= MP4_MAX_HEIGHT
+    )
+    args = ['-i', source, '-map', '0:v:0', '-map', '0:a:0?']
+    if remux:
+        args += ['-c', 'copy']
+    else:
+        if info['height'] > MP4_MAX_HEIGHT:
+            args += ['-vf', f'scale=-2:{MP4_MAX_HEIGHT}']
+        args += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+                 '-c:a', 'aac', '-b:a', '128k', '-ac', '2']
+    _ffmpeg(args + ['-movflags', '+faststart', output], timeout)
+
+
+def hls_variants(info):
+    """Ladder rungs that don't upscale the source; small sources get the lowest rung at their own height"""
+    variants = [rung for rung in HLS_LADDER if rung[0] <= info['height']]
+    if not variants:
+        height = max(info['height'] - info['height'] % 2, 2)
+        variants = [(height,) + HLS_LADDER[0][1:]]
+    return variants
+
+
+def build_hls(source, out_dir, info, timeout):
+    """Write master.m3u8 plus one playlist and segment set per variant (v0/, v1/, ...) to out_dir"""
+    variants = hls_variants(info)
+    has_audio = info['audio_codec'] is not None
+    split = f'[0:v]split={len(variants)}' + ''.join(f'[s{i}]' for i in range(len(variants)))
+    scales = ';'.join(f'[s{i}]scale=-2:{rung[0]}[v{i}]' for i, rung in enumerate(variants))
+    args = ['-i', source, '-filter_complex', f'{split};{scales}']
+    for i, (height, bitrate, maxrate, bufsize, audio_bitrate) in enumerate(variants):
+        args += ['-map', f'[v{i}]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', bitrate,
+                 f'-maxrate:v:{i}', maxrate, f'-bufsize:v:{i}', bufsize]
+        if has_audio:
+            args += ['-map', 'a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', audio_bitrate, f'-ac:a:{i}', '2']
+    stream_map = ' '.join(f'v:{i},a:{i}' if has_audio else f'v:{i}' for i in range(len(variants)))
+    args += [
+        '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        # Keyframes on segment boundaries in every variant, so players can switch between them
+        '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})', '-sc_threshold', '0',
+        '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(out_dir, 'v%v', 'seg_%04d.ts'),
+        '-master_pl_name', 'master.m3u8', '-var_stream_map', stream_map,
+        os.path.join(out_dir, 'v%v', 'index.m3u8'),
+    ]
+    _ffmpeg(args, timeout)
+
+
+def mp4_key(sha256):
+    return blobstore.blob_key(sha256) + blobstore.MP4_SUFFIX
+
+
+def hls_prefix(sha256):
+    return blobstore.blob_key(sha256) + blobstore.HLS_PREFIX
+
+
+def _store_mp4(source, info, sha256, work_dir, timeout):
+    key = mp4_key(sha256)
+    storage = get_storage()
+    if not storage.exists(key):
+        output = os.path.join(work_dir, 'video.mp4')
+        build_mp4(source, output, info, timeout)
+        storage.put_file(key, output, content_type='video/mp4')
+    return key
+
+
+def _store_hls(source, info, sha256, work_dir, timeout):
+    prefix = hls_prefix(sha256)
+    master_key = prefix + 'master.m3u8'
+    storage = get_storage()
+    if not storage.exists(master_key):
+        out_dir = os.path.join(work_dir, 'hls')
+        os.makedirs(out_dir)
+        build_hls(source, out_dir, info, timeout)
+        master = os.path.join(out_dir, 'master.m3u8')
+        # Segments and variant playlists first: the master playlist marks a complete ladder
+        for directory, _, files in os.walk(out_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                if path != master:
+                    relpath = os.path.relpath(path, out_dir).replace(os.sep, '/')
+                    storage.put_file(prefix + relpath, path,
+                                     content_type=CONTENT_TYPES.get(os.path.splitext(name)[1]))
+        storage.put_file(master_key, master, content_type=CONTENT_TYPES['.m3u8'])
+    return master_key
+
+
+def preview_key(sha256, name):
+    """Storage key of a preview file ('sprite.jpg' or 'sprite.vtt')"""
+    suffix = {'sprite.jpg': blobstore.SPRITE_SUFFIX, 'sprite.vtt': blobstore.SPRITE_VTT_SUFFIX}[name]
+    return blobstore.blob_key(sha256) + suffix
+
+
+def _store_preview(source, info, sha256, work_dir, timeout):
+    vtt_key = preview_key(sha256, 'sprite.vtt')
+    storage = get_storage()
+    if not storage.exists(vtt_key):
+        sprite = os.path.join(work_dir, 'sprite.jpg')
+        vtt = os.path.join(work_dir, 'sprite.vtt')
+        # Cues point at the sprite relative to the VTT URL (see uploaded_study_video_preview)
+        with open(vtt, 'w', encoding='utf-8') as f:
+            f.write(video_previews.build_sprite(source, sprite, 'sprite.jpg'))
+        storage.put_file(preview_key(sha256, 'sprite.jpg'), sprite, content_type='image/jpeg')
+        storage.put_file(vtt_key, vtt, content_type='text/vtt')
+    return vtt_key
+
+
+BUILDERS = {
+    StudyVideoRendition.MP4: _store_mp4,
+    StudyVideoRendition.HLS: _store_hls,
+    StudyVideoRendition.PREVIEW: _store_preview,
+}
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def transcode_video(video_id):
+    """Build every rendition of a video that isn't ready yet, recording progress as it goes"""
+    video = db.session.get(StudyVideo, video_id)
+    if video is None or video.blob is None:
+        return
+    todo = [rendition for rendition in video.renditions if rendition.status != StudyVideoRendition.READY]
+    if not todo:
+        return
+    for rendition in todo:
+        rendition.status = StudyVideoRendition.PROCESSING
+        rendition.error = None
+    db.session.commit()
+
+    timeout = current_app.config.get('TRANSCODE_TIMEOUT', 6 * 3600)
+    sha256 = video.blob.sha256
+    work_dir = tempfile.mkdtemp(prefix='transcode-', dir=get_storage().temp_dir())
+    try:
+        with blobstore.local_copy(video.blob) as source:
+            info = None
+            if any(rendition.kind in FFMPEG_KINDS for rendition in todo):
+                try:
+                    info = probe(source)
+                except media_jobs.Interrupted:
+                    raise
+                except Exception as e:
+                    for rendition in todo:
+                        if rendition.kind in FFMPEG_KINDS:
+                            rendition.status = StudyVideoRendition.FAILED
+                            rendition.error = str(e)[-ERROR_TAIL:]
+                    db.session.commit()
+                    todo = [rendition for rendition in todo if rendition.kind not in FFMPEG_KINDS]
+                else:
+                    if not video.duration and info['duration']:
+                        video.duration = _format_duration(info['duration'])
+
+            for rendition in todo:
+                try:
+                    with metrics.transcode_duration_seconds.time(kind=rendition.kind):
+                        rendition.storage_key = BUILDERS[rendition.kind](source, info, sha256, work_dir, timeout)
+                    rendition.status = StudyVideoRendition.READY
+                    metrics.transcodes_total.inc(kind=rendition.kind, result='success')
+                except media_jobs.Interrupted:
+                    raise
+                except Exception as e:
+                    rendition.status = StudyVideoRendition.FAILED
+                    rendition.error = str(e)[-ERROR_TAIL:]
+                    metrics.transcodes_total.inc(kind=rendition.kind, result='failure')
+                db.session.commit()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def available_kinds():
+    """Rendition kinds this server can build (the ffmpeg ones only when ffmpeg is available)"""
+    if enabled():
+        return StudyVideoRendition.KINDS
+    return tuple(kind for kind in StudyVideoRendition.KINDS if kind not in FFMPEG_KINDS)
+
+
+def request_renditions(video):
+    """Add pending rendition rows to a video; call submit() once they are committed"""
+    existing = {rendition.kind for rendition in video.renditions}
+    for kind in available_kinds():
+        if kind not in existing:
+            video.renditions.append(StudyVideoRendition(kind=kind, status=StudyVideoRendition.PENDING))
+
+
+def pending_jobs():
+    """(video id, newest pending rendition id) for every video with pending renditions"""
+    return [tuple(row) for row in db.session.execute(
+        select(StudyVideoRendition.video_id, func.max(StudyVideoRendition.id))
+        .where(StudyVideoRendition.status == StudyVideoRendition.PENDING)
+        .group_by(StudyVideoRendition.video_id)
+        .order_by(StudyVideoRendition.video_id)
+    )]
+
+
+def reset_interrupted(exclude=(), stale_before=None):
+    """
+    Put renditions left 'processing' by a job that never finished back to
+    pending, except those of the videos in exclude or updated after stale_before.
+    """
+    query = update(StudyVideoRendition).where(StudyVideoRendition.status == StudyVideoRendition.PROCESSING)
+    if exclude:
+        query = query.where(StudyVideoRendition.video_id.not_in(exclude))
+    if stale_before is not None:
+        query = query.where(StudyVideoRendition.updated_at < stale_before)
+    result = db.session.execute(query.values(status=StudyVideoRendition.PENDING),
+                                execution_options={'synchronize_session': False})
+    db.session.commit()
+    return result.rowcount
+
+
+def submit(video_id):
+    """Transcode a video on the background media pool"""
+    return media_jobs.submit('transcode', video_id)
+
+
+media_jobs.register('transcode', transcode_video, pending_jobs, reset_interrupted)
@@ -0,0 +1,176 @@
+"""
+Seek-preview sprite sheets and poster frames for study videos.
+
+One frame every `interval` seconds is scaled to a small tile and the tiles are
+packed into a single JPEG, with a WebVTT file mapping each time range to its
+tile (sprite.jpg#xywh=x,y,w,h). Players show hover previews from these two
+small files without touching the video itself.
+
+Frames are read in a single sequential pass: grab() advances the decoder
+without converting the frame, and only the frames we keep are retrieve()d.
+Seeking with CAP_PROP_POS_FRAMES instead restarts decoding from the previous
+keyframe for every tile, which is many times slower on long-GOP codecs.
+
+Posters: instead of the frame at 1 second (usually black or a fade-in for
+recorded lectures), select_poster_frame() samples a few candidate frames across
+the video, scores them all at once on a small grayscale stack (exposure,
+contrast, Laplacian sharpness) and returns the best one. Sampling stops when the
+time budget runs out, and the best frame found so far is used.
+"""
+
+import math
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+PREVIEW_INTERVAL = 10  # seconds between tiles for short videos
+MAX_TILES = 100  # longer videos spread this many tiles evenly
+TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_QUALITY = 70
+
+POSTER_CANDIDATES = 12
+POSTER_TIME_BUDGET = 1.5  # seconds spent sampling candidates
+POSTER_SAMPLE_WIDTH = 160  # candidates are scored at this width
+POSTER_MAX_WIDTH = 400
+# Mean luminance outside this range means a (nearly) black or white frame
+POSTER_DARK, POSTER_BRIGHT = 24.0, 232.0
+
+
+def _timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+
+
+def read_tiles(video_path, interval=PREVIEW_INTERVAL, max_tiles=MAX_TILES, tile_width=TILE_WIDTH):
+    """
+    Read evenly spaced frames in one pass; returns (list of (time, tile), duration).
+
+    Tiles are RGB arrays of tile_width pixels wide, all the same size.
+    """
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise RuntimeError(f'Could not open video: {video_path}')
+    try:
+        fps = video.get(cv2.CAP_PROP_FPS) or 25.0
+        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / fps if total_frames > 0 else None
+        if duration:
+            interval = max(interval, duration / max_tiles)
+        step = max(1, int(round(interval * fps)))
+
+        tiles = []
+        tile_size = None
+        index = 0
+        while len(tiles) < max_tiles and video.grab():
+            if index % step == 0:
+                success, frame = video.retrieve()
+                if success:
+                    if tile_size is None:
+                        height, width = frame.shape[:2]
+                        tile_height = max(2, int(round(height * tile_width / width)))
+                        tile_size = (tile_width, tile_height)
+                    tile = cv2.resize(frame, tile_size, interpolation=cv2.INTER_AREA)
+                    tiles.append((index / fps, cv2.cvtColor(tile, cv2.COLOR_BGR2RGB)))
+            index += 1
+        return tiles, duration or index / fps
+    finally:
+        video.release()
+
+
+def build_sprite(video_path, sprite_path, sprite_url, interval=PREVIEW_INTERVAL, columns=SPRITE_COLUMNS):
+    """
+    Write the sprite sheet JPEG to sprite_path and return the WebVTT text.
+
+    sprite_url is how the VTT cues refer to the image (relative to the VTT URL).
+    """
+    tiles, duration = read_tiles(video_path, interval)
+    if not tiles:
+        raise RuntimeError('No frames could be read')
+
+    tile_height, tile_width = tiles[0][1].shape[:2]
+    columns = min(columns, len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = np.zeros((rows * tile_height, columns * tile_width, 3), dtype=np.uint8)
+    cues = ['WEBVTT', '']
+    for i, (start, tile) in enumerate(tiles):
+        x, y = (i % columns) * tile_width, (i // columns) * tile_height
+        sheet[y:y + tile_height, x:x + tile_width] = tile
+        end = tiles[i + 1][0] if i + 1 < len(tiles) else max(duration, start + 0.001)
+        cues.append(f'{_timestamp(start)} --> {_timestamp(end)}')
+        cues.append(f'{sprite_url}#xywh={x},{y},{tile_width},{tile_height}')
+        cues.append('')
+
+    Image.fromarray(sheet).save(sprite_path, 'JPEG', quality=SPRITE_QUALITY, optimize=True)
+    return '\n'.join(cues)
+
+
+def score_frames(frames):
+    """
+    Score a (K, H, W) stack of grayscale frames; higher is a better poster.
+
+    Every metric is computed for the whole stack in one array operation:
+    exposure (mean luminance near mid-grey), contrast (variance) and sharpness
+    (variance of the Laplacian). Contrast and sharpness are normalised against
+    the best candidate, and black, white or flat frames are pushed to the bottom.
+    """
+    frames = frames.astype(np.float32)
+    luminance = frames.mean(axis=(1, 2))
+    variance = frames.var(axis=(1, 2))
+    laplacian = (
+        4 * frames[:, 1:-1, 1:-1]
+        - frames[:, :-2, 1:-1] - frames[:, 2:, 1:-1]
+        - frames[:, 1:-1, :-2] - frames[:, 1:-1, 2:]
+    )
+    sharpness = laplacian.var(axis=(1, 2))
+
+    exposure = 1.0 - np.abs(luminance - 128.0) / 128.0
+    contrast = variance / max(float(variance.max()), 1e-6)
+    detail = sharpness / max(float(sharpness.max()), 1e-6)
+    score = 0.3 * exposure + 0.3 * contrast + 0.4 * detail
+    unusable = (luminance < POSTER_DARK) | (luminance > POSTER_BRIGHT) | (variance < 25.0)
+    return np.where(unusable, score - 1.0, score)
+
+
+def select_poster_frame(video_path, candidates=POSTER_CANDIDATES, time_budget=POSTER_TIME_BUDGET):
+    """
+    Best-looking frame among candidates spread over 5%..95% of the video, as a BGR
+    array at most POSTER_MAX_WIDTH wide (None if no frame could be read).
+    """
+    deadline = time.perf_counter() + time_budget
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        return None
+    try:
+        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames > 1:
+            positions = np.linspace(total_frames * 0.05, total_frames * 0.95, candidates).astype(int)
+        else:
+            positions = [0]
+
+        posters, samples = [], []
+        for position in positions:
+            if samples and time.perf_counter() > deadline:
+                break
+            video.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            success, frame = video.read()
+            if not success:
+                continue
+            height, width = frame.shape[:2]
+            if width > POSTER_MAX_WIDTH:
+                frame = cv2.resize(frame, (POSTER_MAX_WIDTH, int(height * POSTER_MAX_WIDTH / width)),
+                                   interpolation=cv2.INTER_AREA)
+            sample_size = (POSTER_SAMPLE_WIDTH, max(3, int(height * POSTER_SAMPLE_WIDTH / width)))
+            sample = cv2.resize(frame, sample_size, interpolation=cv2.INTER_AREA)
+            posters.append(frame)
+            samples.append(cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY))
+        if not posters:
+            return None
+        return posters[int(np.argmax(score_frames(np.stack(samples))))]
+    finally:
+        video.release()